@@ -1,33 +1,27 @@
-import shutil
-import os
 from typing import List
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.models.document import Document, DocStatus
 from app.models.user import User
-from app.worker import process_document
+from app.core.jobs import PROCESS_DOCUMENT, CLONE_DOCUMENT, enqueue
 from app.api.deps import get_current_user
+from app.core.checkpoints import CheckpointStore
+from app.core.storage import UploadStore
+from app.core.config import settings
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 @router.post("/", response_model=dict)
 def upload_document(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user) 
 ):
     user_id = current_user.id
     
-    file_location = os.path.join(UPLOAD_DIR, file.filename)
-    
     try:
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        stored = UploadStore().save(file.file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
 
@@ -35,19 +29,47 @@ def upload_document(
     db_doc = Document(
         user_id=user_id,
         filename=file.filename,
-        file_path=file_location,
+        file_path=stored.path,
+        file_hash=stored.sha256,
+        file_size=stored.size,
         content_type=file.content_type,
         status=DocStatus.PENDING
     )
+
+    # Identical file already processed: reuse its text, fingerprint and vectors
+    source = _find_processed_copy(db, stored.sha256)
+    if source is not None:
+        db_doc.extracted_text = source.extracted_text
+        db_doc.meta_data = _reused_meta(source)
+
     db.add(db_doc)
     db.commit()
     db.refresh(db_doc)
 
-    # Trigger Background Task
-    background_tasks.add_task(process_document, db_doc.id)
+    # Queue processing for the ingest workers
+    if source is not None:
+        enqueue(CLONE_DOCUMENT, db_doc.id, source.id)
+    else:
+        enqueue(PROCESS_DOCUMENT, db_doc.id)
 
     return {"message": "File uploaded successfully", "document_id": db_doc.id, "status": "pending"}
 
+def _find_processed_copy(db: Session, file_hash: str):
+    candidates = db.query(Document).filter(
+        Document.file_hash == file_hash,
+        Document.status == DocStatus.INDEXED
+    ).order_by(Document.id)
+    return next((doc for doc in candidates if CheckpointStore.is_done(doc, CheckpointStore.INDEXED)), None)
+
+def _reused_meta(source: Document) -> dict:
+    meta = {
+        key: value for key, value in (source.meta_data or {}).items()
+        if key not in ("checkpoints", "error")
+    }
+    meta["duplicate_of"] = source.id
+    meta["checkpoints"] = {CheckpointStore.EXTRACTED: {}, CheckpointStore.FINGERPRINTED: {}}
+    return meta
+
 @router.get("/", response_model=List[dict])
 def list_documents(
     db: Session = Depends(get_db),
@@ -76,6 +98,38 @@ def get_document(document_id: int, db: Session = Depends(get_db)):
         "extracted_text_preview": doc.extracted_text[:200] if doc.extracted_text else None
     }
 
+@router.post("/{document_id}/reprocess", response_model=dict)
+def reprocess_document(
+    document_id: int,
+    force: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    doc = db.query(Document).filter(Document.id == document_id).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    if doc.user_id != current_user.id and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to reprocess this document")
+
+    # Resumes after the last completed stage; force=true starts over from extraction
+    if force:
+        # Re-extraction may yield fewer chunks: old points past the new count would stay searchable
+        try:
+            from app.db.vector import VectorDB
+            VectorDB().delete_document(doc.id)
+        except Exception as e:
+            print(f"Error deleting vectors: {e}")
+            raise HTTPException(status_code=503, detail="Could not remove the document's indexed chunks, try again")
+        CheckpointStore().reset(doc)
+        doc.index_seq = None # No chunks left in the index to hold scan marks back
+    doc.status = DocStatus.PENDING
+    db.commit()
+
+    enqueue(PROCESS_DOCUMENT, doc.id)
+
+    return {"message": "Document queued for processing", "document_id": doc.id, "status": "pending"}
+
 @router.delete("/{document_id}", response_model=dict)
 def delete_document(
     document_id: int,
@@ -89,12 +143,13 @@ def delete_document(
     if doc.user_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to delete this document")
 
-    # Delete file from filesystem
-    if os.path.exists(doc.file_path):
-        try:
-            os.remove(doc.file_path)
-        except OSError:
-            pass # File might already be gone
+    # Delete file from filesystem, unless another document has the same content
+    shared = doc.file_hash and db.query(Document).filter(
+        Document.file_hash == doc.file_hash,
+        Document.id != doc.id
+    ).first()
+    if not shared:
+        UploadStore().remove(doc.file_path)
 
     # 1. Delete Vectors from Qdrant
     try:
@@ -104,6 +159,15 @@ def delete_document(
     except Exception as e:
         print(f"Error deleting vectors: {e}")
 
+    CheckpointStore().clear(document_id)
+
+    if settings.LSH_ENABLED:
+        try:
+            from app.core.lsh_index import LshIndex
+            LshIndex.get_instance().remove(document_id)
+        except Exception as e:
+            print(f"Error removing document from the LSH index: {e}")
+
     # 2. Delete associated Scans (Manual Cascade)
     from app.models.scan import Scan, ScanMatch
     # First, delete matches associated with scans of this document
@@ -1,18 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.models.scan import Scan, ScanStatus
 from app.models.document import Document
 from app.api.deps import get_current_user
 from app.models.user import User
-from app.worker import run_scan_task
+from app.core.jobs import RUN_SCAN, enqueue
 
 router = APIRouter()
 
 @router.post("/", response_model=dict)
 def initiate_scan(
-    payload: dict, # {document_id: int}
-    background_tasks: BackgroundTasks,
+    payload: dict, # {document_id: int, force: bool (optional, bypasses the result cache and near-duplicate shortcut)}
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -34,8 +33,8 @@ def initiate_scan(
     db.commit()
     db.refresh(scan)
 
-    # Trigger Background Task
-    background_tasks.add_task(run_scan_task, scan.id)
+    # Queue the scan for the scan workers
+    enqueue(RUN_SCAN, scan.id, bool(payload.get("force", False)))
 
     return {"message": "Scan initiated", "scan_id": scan.id, "status": "queued"}
 
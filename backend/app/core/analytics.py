@@ -1,12 +1,12 @@
 import math
-import torch
 from typing import List, Dict, Any
-from transformers import GPT2LMHeadModel, GPT2TokenizerFast
+from app.core.registry import ManagedModel
 
-class PerplexityAnalyzer:
+class PerplexityAnalyzer(ManagedModel):
     _instance = None
     _model = None
     _tokenizer = None
+    registry_name = "perplexity"
 
     @classmethod
     def get_instance(cls):
@@ -18,19 +18,21 @@ class PerplexityAnalyzer:
         self.model_id = model_id
         # Lazy load model to prevent startup lag
     
-    def _load_model(self):
-        if self._model is None:
-            print(f"Loading Perplexity Model ({self.model_id})...")
-            try:
-                import gc
-                gc.collect()
-                self._tokenizer = GPT2TokenizerFast.from_pretrained(self.model_id)
-                self._model = GPT2LMHeadModel.from_pretrained(self.model_id)
-                self._model.eval()
-                print("Perplexity Model loaded.")
-            except Exception as e:
-                print(f"Failed to load Perplexity Model: {e}")
-                raise e
+    def _load(self):
+        print(f"Loading Perplexity Model ({self.model_id})...")
+        from transformers import GPT2LMHeadModel, GPT2TokenizerFast
+        try:
+            self._tokenizer = GPT2TokenizerFast.from_pretrained(self.model_id)
+            model = GPT2LMHeadModel.from_pretrained(self.model_id)
+            model.eval()
+            print("Perplexity Model loaded.")
+            return model
+        except Exception as e:
+            print(f"Failed to load Perplexity Model: {e}")
+            raise e
+
+    def warm_up(self):
+        self.calculate_scores("This is a short warm up sentence. It has two sentences.")
 
     def calculate_scores(self, text: str) -> Dict[str, float]:
         """
@@ -39,10 +41,10 @@ class PerplexityAnalyzer:
         if not text or len(text.strip()) == 0:
             return {"perplexity": 0.0, "burstiness": 0.0}
 
-        self._load_model()
+        model = self.load()
         
         # 1. Calculate Perplexity
-        perplexity = self._calculate_perplexity(text)
+        perplexity = self._calculate_perplexity(model, text)
         
         # 2. Calculate Burstiness
         burstiness = self._calculate_burstiness(text)
@@ -52,13 +54,60 @@ class PerplexityAnalyzer:
             "burstiness": round(burstiness, 2)
         }
 
-    def _calculate_perplexity(self, text: str) -> float:
+    def calculate_window_scores(self, texts: List[str], batch_size: int = 8) -> List[Dict[str, float]]:
+        """
+        Perplexity and burstiness for many windows of text.
+        Windows are padded into batches so the model runs one forward pass per
+        batch instead of one per window.
+        """
+        if not texts:
+            return []
+
+        import torch
+        model = self.load()
+        tokenizer = self._tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        perplexities = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            encodings = tokenizer(
+                batch,
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+                max_length=model.config.n_positions
+            )
+            with torch.no_grad():
+                logits = model(encodings.input_ids, attention_mask=encodings.attention_mask).logits
+
+            # Token i predicts token i+1; padding positions are masked out
+            shift_logits = logits[:, :-1, :]
+            shift_labels = encodings.input_ids[:, 1:]
+            shift_mask = encodings.attention_mask[:, 1:].to(logits.dtype)
+            nll = torch.nn.functional.cross_entropy(
+                shift_logits.transpose(1, 2), shift_labels, reduction="none"
+            )
+            mean_nll = (nll * shift_mask).sum(dim=1) / shift_mask.sum(dim=1).clamp(min=1)
+            perplexities.extend(torch.exp(mean_nll).tolist())
+
+        return [
+            {
+                "perplexity": round(float(perplexity), 2),
+                "burstiness": round(self._calculate_burstiness(text), 2)
+            }
+            for text, perplexity in zip(texts, perplexities)
+        ]
+
+    def _calculate_perplexity(self, model, text: str) -> float:
         """
         Calculates perplexity using GPT-2.
         Lower perplexity = More likely to be AI.
         """
+        import torch
         encodings = self._tokenizer(text, return_tensors="pt")
-        max_length = self._model.config.n_positions
+        max_length = model.config.n_positions
         stride = 512
         seq_len = encodings.input_ids.size(1)
 
@@ -72,7 +121,7 @@ class PerplexityAnalyzer:
             target_ids[:, :-trg_len] = -100
 
             with torch.no_grad():
-                outputs = self._model(input_ids, labels=target_ids)
+                outputs = model(input_ids, labels=target_ids)
                 neg_log_likelihood = outputs.loss
 
             nlls.append(neg_log_likelihood)
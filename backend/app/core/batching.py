@@ -0,0 +1,91 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+from app.core.config import settings
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching for a batched inference function.
+    Concurrent callers submit their own small lists; a background thread
+    collects requests for up to `max_wait_ms` (or until `max_batch` items are
+    waiting), runs one batched call and hands each caller its slice of the
+    results. Used by EmbeddingModel so concurrent jobs in a worker process
+    share large forward passes instead of running many small ones.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List], List],
+        max_batch: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        name: str = "micro-batcher"
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch or settings.EMBEDDING_MAX_BATCH
+        self.max_wait = (settings.EMBEDDING_BATCH_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.name = name
+        self._queue: "queue.Queue[Tuple[List, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.stats = {"requests": 0, "batches": 0, "items": 0}
+
+    def submit(self, items: List) -> Future:
+        future: Future = Future()
+        if not items:
+            future.set_result([])
+            return future
+        self._ensure_thread()
+        self._queue.put((list(items), future))
+        return future
+
+    def run(self, items: List) -> List:
+        """Blocks until the batch containing `items` has run; returns their results."""
+        return self.submit(items).result()
+
+    def _ensure_thread(self):
+        # Threads don't survive fork: a forked worker starts its own
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        requests = self._queue
+        while True:
+            pending = [requests.get()]
+            count = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while count < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                count += len(pending[-1][0])
+            self._process(pending)
+
+    def _process(self, pending: List[Tuple[List, Future]]):
+        items = [item for request_items, _ in pending for item in request_items]
+        try:
+            results = self.batch_fn(items)
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        self.stats["requests"] += len(pending)
+        self.stats["batches"] += 1
+        self.stats["items"] += len(items)
+
+        offset = 0
+        for request_items, future in pending:
+            future.set_result(results[offset:offset + len(request_items)])
+            offset += len(request_items)
@@ -0,0 +1,166 @@
+import os
+import json
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from app.core.config import settings
+
+class CheckpointStore:
+    """
+    Per-document stage checkpoints, so a retried or reprocessed document
+    resumes after its last completed stage instead of starting over.
+    Small stage outputs (extracted text, fingerprint) live on the Document
+    record and completed stages are listed in meta_data["checkpoints"]; the
+    chunk list and vectors, which can be large, go to sidecar files under
+    CHECKPOINT_DIR until the document is indexed.
+    """
+    EXTRACTED = "extracted"
+    FINGERPRINTED = "fingerprinted"
+    CHUNKED = "chunked"
+    EMBEDDED = "embedded"
+    INDEXED = "indexed"
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or settings.CHECKPOINT_DIR
+
+    # --- Stage markers (stored on the Document) ---
+
+    @staticmethod
+    def is_done(doc, stage: str) -> bool:
+        return stage in ((doc.meta_data or {}).get("checkpoints") or {})
+
+    @staticmethod
+    def mark(doc, stage: str, **info: Any):
+        # Reassign meta_data so SQLAlchemy sees the JSON change
+        meta = dict(doc.meta_data or {})
+        checkpoints = dict(meta.get("checkpoints") or {})
+        checkpoints[stage] = info
+        meta["checkpoints"] = checkpoints
+        meta.pop("error", None)
+        doc.meta_data = meta
+
+    @staticmethod
+    def unmark(doc, *stages: str):
+        meta = dict(doc.meta_data or {})
+        checkpoints = dict(meta.get("checkpoints") or {})
+        for stage in stages:
+            checkpoints.pop(stage, None)
+        meta["checkpoints"] = checkpoints
+        doc.meta_data = meta
+
+    def reset(self, doc):
+        """Forgets every checkpoint, so the next run starts from extraction."""
+        meta = dict(doc.meta_data or {})
+        meta.pop("checkpoints", None)
+        doc.meta_data = meta
+        self.clear(doc.id)
+
+    @staticmethod
+    def info(doc, stage: str) -> dict:
+        return ((doc.meta_data or {}).get("checkpoints") or {}).get(stage) or {}
+
+    # --- Sidecar files (chunks and vectors) ---
+    # Both are written and read in windows, so a book-length document never
+    # has all of its chunks or vectors in memory at once.
+
+    def _path(self, document_id: int, suffix: str) -> str:
+        return os.path.join(self.root, f"{document_id}.{suffix}")
+
+    def save_chunks(self, document_id: int, chunks: Iterable[str]) -> int:
+        """Streams chunks to a JSON-lines sidecar; returns how many were written."""
+        count = 0
+        def write(f):
+            nonlocal count
+            for chunk in chunks:
+                f.write(json.dumps(chunk) + "\n")
+                count += 1
+        self._write(self._path(document_id, "chunks.jsonl"), write, mode="w")
+        return count
+
+    def iter_chunk_windows(self, document_id: int, size: int) -> Iterator[List[str]]:
+        with open(self._path(document_id, "chunks.jsonl")) as f:
+            window = []
+            for line in f:
+                window.append(json.loads(line))
+                if len(window) == size:
+                    yield window
+                    window = []
+            if window:
+                yield window
+
+    def chunk_count(self, document_id: int) -> Optional[int]:
+        try:
+            with open(self._path(document_id, "chunks.jsonl")) as f:
+                return sum(1 for _ in f)
+        except OSError:
+            return None
+
+    def save_vectors(self, document_id: int, count: int, batches: Iterable):
+        """
+        Writes `count` vectors, arriving in batches, into a .npy sidecar
+        through a memory map (created when the first batch gives the size).
+        """
+        import numpy as np
+        path = self._path(document_id, "vectors.npy")
+        def write(tmp_path):
+            vectors = None
+            row = 0
+            for batch in batches:
+                batch = np.asarray(batch, dtype=np.float32)
+                if vectors is None:
+                    vectors = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(count, batch.shape[1]))
+                vectors[row:row + len(batch)] = batch
+                row += len(batch)
+            if row != count:
+                raise ValueError(f"Expected {count} vectors, got {row}")
+            if vectors is not None:
+                vectors.flush()
+                del vectors
+        self._write_path(path, write)
+
+    def load_vectors(self, document_id: int) -> Optional["np.ndarray"]:
+        """The vectors, memory-mapped read-only."""
+        import numpy as np
+        try:
+            return np.load(self._path(document_id, "vectors.npy"), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    def embedded_count(self, document_id: int) -> Optional[int]:
+        """Number of embedded chunks, or None if either sidecar is missing or they disagree."""
+        count = self.chunk_count(document_id)
+        vectors = self.load_vectors(document_id)
+        if count is None or vectors is None or len(vectors) != count:
+            return None
+        return count
+
+    def iter_embedded(self, document_id: int, size: int) -> Iterator[Tuple[List[str], "np.ndarray"]]:
+        """(chunks, vectors) windows of at most `size` chunks."""
+        vectors = self.load_vectors(document_id)
+        row = 0
+        for chunks in self.iter_chunk_windows(document_id, size):
+            yield chunks, vectors[row:row + len(chunks)]
+            row += len(chunks)
+
+    def clear(self, document_id: int):
+        for suffix in ("chunks.jsonl", "vectors.npy"):
+            try:
+                os.remove(self._path(document_id, suffix))
+            except OSError:
+                pass
+
+    def _write(self, path: str, write, mode: str):
+        def write_file(tmp_path):
+            with open(tmp_path, mode) as f:
+                write(f)
+        self._write_path(path, write_file)
+
+    def _write_path(self, path: str, write):
+        # Write to a temp file and rename, so a crash never leaves a torn checkpoint
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        try:
+            write(tmp_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
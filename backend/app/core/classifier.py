@@ -0,0 +1,55 @@
+from typing import Dict, Any, List
+from app.core.config import settings
+from app.core.registry import ManagedModel
+
+class AIClassifier(ManagedModel):
+    """
+    RoBERTa Large OpenAI detector. Classifies text as 'Real' (human) or 'Fake' (AI).
+    Loaded once per process instead of building a new pipeline for every scan.
+    """
+    _instance = None
+    _model = None
+    registry_name = "ai_classifier"
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, model_id: str = "roberta-large-openai-detector"):
+        self.model_id = model_id
+
+    def _load(self):
+        if settings.INFERENCE_BACKEND == "onnx":
+            from app.core import onnx_backend
+            model = onnx_backend.load(
+                "ai_classifier", self.model_id,
+                lambda directory: onnx_backend.build_text_classifier(self._load_torch(), directory)
+            )
+            if model is not None:
+                return model
+        return self._load_torch()
+
+    def _load_torch(self):
+        # Note: First run will download the model (~1.4GB)
+        print(f"Loading AI classifier ({self.model_id})...")
+        from transformers import pipeline
+        model = pipeline("text-classification", model=self.model_id)
+        print("AI classifier loaded.")
+        return model
+
+    def warm_up(self):
+        self.classify("This is a short warm up sentence for the classifier.")
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Returns {'label': 'Fake' | 'Real', 'score': float}"""
+        classifier = self.load()
+        return classifier(text)[0]
+
+    def classify_batch(self, texts: List[str], batch_size: int = 8) -> List[Dict[str, Any]]:
+        """Classifies many texts in batched forward passes (truncated to the model limit)."""
+        if not texts:
+            return []
+        classifier = self.load()
+        return classifier(texts, batch_size=batch_size, truncation=True)
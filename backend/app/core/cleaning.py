@@ -1,5 +1,5 @@
-import re
-import string
+from typing import Iterable, Iterator, List
+from app.core.normalize import clean_line, tokenize
 
 class TextCleaner:
     @staticmethod
@@ -10,28 +10,35 @@ class TextCleaner:
         # 1. Normalize whitespace (replace tabs, newlines, multiple spaces with single space)
         # We might want to keep newlines for paragraph structure, but for basic matching, single line is often easier.
         # Let's keep paragraphs separated by newline, but clean within them.
-        
-        lines = text.split('\n')
-        cleaned_lines = []
-        for line in lines:
-            line = line.strip()
-            if line:
-                # Remove control characters
-                line = "".join(ch for ch in line if ch.isprintable())
-                # Normalize spaces
-                line = re.sub(r'\s+', ' ', line)
-                cleaned_lines.append(line)
-        
-        return "\n".join(cleaned_lines)
+        return "\n".join(TextCleaner.iter_clean([text]))
+
+    @staticmethod
+    def iter_clean(pieces: Iterable[str]) -> Iterator[str]:
+        """
+        Cleaned lines of text arriving in pieces (e.g. pages);
+        "\n".join of them equals clean("".join(pieces)).
+        """
+        partial: List[str] = [] # Start of a line continued in the next piece
+        for piece in pieces:
+            lines = piece.split('\n')
+            if len(lines) == 1:
+                partial.append(piece)
+                continue
+            lines[0] = "".join(partial) + lines[0]
+            partial = [lines.pop()]
+            for line in lines:
+                line = clean_line(line)
+                if line is not None:
+                    yield line
+
+        line = clean_line("".join(partial))
+        if line is not None:
+            yield line
 
     @staticmethod
     def normalize_for_matching(text: str) -> str:
         """
-        Aggressive normalization for lexical matching (lowercase, remove punctuation).
+        Aggressive normalization for lexical matching: the canonical tokens
+        (lowercase, every non-word character removed) joined by spaces.
         """
-        text = text.lower()
-        # Remove punctuation
-        text = text.translate(str.maketrans('', '', string.punctuation))
-        # Normalize whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
+        return " ".join(tokenize(text))
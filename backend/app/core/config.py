@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "PlagiaScan"
@@ -9,11 +9,95 @@ class Settings(BaseSettings):
     # DATABASE_URL: str = "sqlite:///./plagiascan.db"
     
     REDIS_URL: str = "redis://localhost:6379/0" 
+
+    # Job queue (Celery). Defaults to REDIS_URL; "sqla+sqlite:///queue.db" is a
+    # durable local broker without Redis, "memory://" for tests
+    QUEUE_BROKER_URL: Optional[str] = None
+    QUEUE_ALWAYS_EAGER: bool = False # Run jobs inline instead of in workers (tests)
+    QUEUE_MAX_RETRIES: int = 3 # Retries for transient errors (DB / Qdrant / network)
+    QUEUE_RETRY_BACKOFF: int = 5 # Base seconds of exponential retry backoff
+
+    # Document pipeline (extraction -> embedding -> indexing queues)
+    PIPELINE_MAX_QUEUE_DEPTH: int = 50 # Downstream backlog at which a stage stops handing off
+    PIPELINE_BACKPRESSURE_DELAY: int = 5 # Seconds before a held-back job is retried
+    PIPELINE_WINDOW_CHUNKS: int = 256 # Chunks embedded / upserted at a time; bounds worker memory
+    EMBEDDING_BATCH_SIZE: int = 64 # Texts per forward pass
+    EMBEDDING_MICRO_BATCHING: bool = True # Merge concurrent encode requests into shared batches
+    EMBEDDING_BATCH_WAIT_MS: float = 5 # How long to collect requests before running a batch
+    EMBEDDING_MAX_BATCH: int = 256 # Run as soon as this many texts are waiting
+    EMBEDDING_CACHE_ENABLED: bool = True # Reuse vectors of chunk texts seen before
+    EMBEDDING_CACHE_DIR: str = "embedding_cache"
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = 20000 # Per-process LRU tier (~1.5 KB per 384-d vector)
+    EMBEDDING_CACHE_DISK_ITEMS: int = 1000000 # Memory-mapped disk tier shared by workers, not evicted once full (0 = off)
+    UPLOAD_DIR: str = "uploads" # Content-addressed: <dir>/ab/cd/<sha256>
+    CHECKPOINT_DIR: str = "checkpoints" # Sidecar chunk/vector checkpoints of documents being processed
+
+    # PDF extraction: big PDFs are split into page ranges extracted in a process pool
+    PDF_WORKERS: int = 0 # Pool size (0 = CPU count, 1 = no pool)
+    PDF_PARALLEL_MIN_PAGES: int = 50 # Smaller PDFs are extracted inline
+    PDF_PAGES_PER_TASK: int = 25
+
+    # OCR of scanned PDF pages and images (needs tesseract and poppler installed)
+    OCR_ENABLED: bool = True
+    OCR_DPI: int = 300
+    OCR_LANG: str = "eng"
+    OCR_WORKERS: int = 0 # Concurrent tesseract processes per worker (0 = CPU count)
+    OCR_MAX_PAGES: int = 200 # Per document; later scanned pages are left empty
+    OCR_PAGE_TIMEOUT: int = 120 # Seconds to rasterize or OCR one page
+    OCR_CACHE_DIR: str = "ocr_cache" # OCR text keyed by page image hash
     
     QDRANT_URL: str = "http://localhost:6333"
     # QDRANT_URL: str = ":memory:" # or path to local file
     QDRANT_API_KEY: Optional[str] = None
+    QDRANT_SEARCH_BATCH_SIZE: int = 64 # Query vectors per batch search request
     
+    # Model registry
+    MODEL_PRELOAD: str = "" # Comma-separated models to load at startup ("all" for every model)
+    MODEL_WARMUP: bool = False # Run a tiny inference after preloading
+    MODEL_PRELOAD_BEFORE_FORK: bool = False # Preload in the Celery parent so pool processes share weights copy-on-write
+    MODEL_MEMORY_LIMIT_MB: int = 0 # Evict least recently used models above this RSS (0 = no limit)
+    MODEL_IDLE_TIMEOUT: int = 0 # Unload models idle for this many seconds (0 = never)
+
+    # Shared inference server (python -m app.core.inference_server). When set,
+    # API and worker processes call it instead of loading their own models
+    INFERENCE_SERVER_SOCKET: Optional[str] = None # Unix socket path, e.g. /run/plagiascan/inference.sock
+    INFERENCE_SERVER_AUTHKEY: Optional[str] = None # Required with the socket: random secret shared by server and clients
+    INFERENCE_SERVER_TIMEOUT: float = 300 # Seconds to wait for a response
+
+    # Inference backend for the embedding model and AI classifier: "torch", or
+    # "onnx" for int8-quantized ONNX Runtime models (exported on first use,
+    # falls back to torch if the export drifts past tolerance)
+    INFERENCE_BACKEND: str = "torch"
+    ONNX_MODEL_DIR: str = "onnx_models"
+    ONNX_THREADS: int = 0 # Intra-op threads per session (0 = ONNX Runtime default)
+    ONNX_EMBEDDING_TOLERANCE: float = 0.02 # Max 1 - cosine similarity vs the PyTorch embeddings
+    ONNX_CLASSIFIER_TOLERANCE: float = 0.05 # Max probability difference vs the PyTorch classifier
+
+    # Per-stage timeouts (seconds) for the concurrent AI-detection stages
+    AI_STAGE_TIMEOUTS: Dict[str, float] = {"roberta": 120, "perplexity": 120, "web_search": 60, "llm": 180}
+
+    # AI detection coverage: "head" scores the first 2000 chars, "windowed"
+    # scores the whole document in AI_WINDOW_CHARS windows
+    AI_DETECTION_MODE: str = "head"
+    AI_WINDOW_CHARS: int = 2000 # ~512 tokens, the RoBERTa limit
+    AI_WINDOW_STRIDE: int = 2000
+    AI_WINDOW_BATCH_SIZE: int = 8
+    AI_MAX_WINDOWS: int = 200 # Evenly sampled beyond this (0 = no limit)
+
+    # Scan result cache (reuse results of unchanged rescans)
+    SCAN_CACHE_ENABLED: bool = True
+    SCAN_CACHE_TTL_SECONDS: int = 7 * 24 * 3600 # Web sources change over time (0 = no expiry)
+    SCAN_INCREMENTAL_ENABLED: bool = True # Rescans search only documents indexed since the last scan
+
+    # Near-duplicate prefilter: MinHash LSH index of document fingerprints
+    LSH_ENABLED: bool = True
+    LSH_INDEX_DIR: str = "lsh_index" # Shared by the workers and the API
+    LSH_BANDS: int = 16 # 16 bands of 8 values: documents above ~0.7 Jaccard are found
+    LSH_DELTA_MAX: int = 4096 # Appended rows before they are merged into the sorted main segment
+    LSH_COPY_THRESHOLD: float = 0.9 # Estimated Jaccard above which a scan reports a whole-document copy
+
+    PROGRESS_WRITE_INTERVAL: float = 1.0 # Min seconds between scan progress DB writes
+
     SECRET_KEY: str = "supersecretkey" # Change in production
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
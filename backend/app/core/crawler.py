@@ -1,14 +1,15 @@
 import asyncio
 import logging
-from typing import Optional, Dict
-from playwright.async_api import async_playwright, Browser, BrowserContext
+from typing import Optional, Dict, TYPE_CHECKING
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, BrowserContext
 
 logger = logging.getLogger(__name__)
 
 class AsyncCrawler:
     _instance = None
-    _browser: Optional[Browser] = None
-    _context: Optional[BrowserContext] = None
+    _browser: Optional["Browser"] = None
+    _context: Optional["BrowserContext"] = None
     _lock = asyncio.Lock()
 
     @classmethod
@@ -22,6 +23,7 @@ class AsyncCrawler:
         async with self._lock:
             if self._browser is None:
                 logger.info("Starting Playwright Browser...")
+                from playwright.async_api import async_playwright
                 self.playwright = await async_playwright().start()
                 self._browser = await self.playwright.chromium.launch(headless=True)
                 self._context = await self._browser.new_context(
@@ -1,37 +1,64 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional, Tuple
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from app.core.progress import ProgressReporter
 from app.models.document import Document
 from app.models.scan import Scan, ScanStatus
-from app.core.ml import Chunker, EmbeddingModel
+from app.core.ml import Chunker, EmbeddingModel, text_windows
+from app.core.registry import ModelRegistry
+from app.core.stages import Stage, StageExecutor
+from app.core.scan_cache import ScanCache
+from app.core.errors import TRANSIENT_ERRORS
+from app.core.config import settings
 from app.db.vector import VectorDB
 
 class DetectionEngine:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, session_factory: Optional[Callable[[], Session]] = None):
         self.db = db
+        self.session_factory = session_factory
         self.vector_db = VectorDB()
         self.chunker = Chunker()
         self.embedding_model = EmbeddingModel.get_instance()
-        import time
-        self.time = time
+        self._progress = None
 
     def _update_progress(self, scan_id: int, progress: int, message: str):
-        try:
-            # Use direct update to avoid session sync issues and ensure immediate commit
-            from sqlalchemy import update
-            stmt = (
-                update(Scan)
-                .where(Scan.id == scan_id)
-                .values(progress=progress, current_step=message)
-            )
-            self.db.execute(stmt)
-            self.db.commit()
-            
-            # Artificial delay for UX smoothness
-            self.time.sleep(0.5)
-        except Exception as e:
-            print(f"Failed to update progress: {e}")
+        # Progress is kept in memory and written at a throttled rate on the
+        # reporter's own session; the frontend is responsible for smoothing.
+        if self._progress is None or self._progress.scan_id != scan_id:
+            self._progress = ProgressReporter(scan_id, session_factory=self.session_factory)
+        self._progress.update(progress, message)
+
+    def _close_progress(self):
+        if self._progress is not None:
+            self._progress.close()
+            self._progress = None
 
-    def run_scan(self, scan_id: int):
+    # Semantic search parameters (part of the detector configuration)
+    MATCH_LIMIT = 5
+    MATCH_SCORE_THRESHOLD = 0.8
+
+    # Bump when scoring logic changes so cached scan results are invalidated
+    DETECTOR_VERSION = 1
+
+    def detector_config(self) -> Dict[str, Any]:
+        """Everything that affects a scan result besides the text and the corpus."""
+        return {
+            "version": self.DETECTOR_VERSION,
+            "chunk_size": self.chunker.chunk_size,
+            "chunk_overlap": self.chunker.overlap,
+            "match_limit": self.MATCH_LIMIT,
+            "match_score_threshold": self.MATCH_SCORE_THRESHOLD,
+            "ai_detection_mode": settings.AI_DETECTION_MODE,
+            "ai_window_chars": settings.AI_WINDOW_CHARS,
+            "ai_window_stride": settings.AI_WINDOW_STRIDE,
+            "ai_max_windows": settings.AI_MAX_WINDOWS,
+        }
+
+    def run_scan(self, scan_id: int, force: bool = False):
+        """
+        Runs a plagiarism + AI scan. Unless `force` is set, a stored result for
+        the same text, corpus and detector configuration is reused.
+        """
         scan = self.db.query(Scan).filter(Scan.id == scan_id).first()
         if not scan:
             print(f"Scan {scan_id} not found")
@@ -47,15 +74,59 @@ class DetectionEngine:
             if not doc or not doc.extracted_text:
                 raise ValueError("Document has no text to scan")
 
+            # 0. Result cache (exact repeat of an earlier scan)
+            cache_key = None
+            if settings.SCAN_CACHE_ENABLED:
+                cache = ScanCache(self.db)
+                cache_key = cache.build_key(doc, self.detector_config())
+                cached = None if force else cache.lookup(doc, cache_key, exclude_scan_id=scan_id)
+                if cached:
+                    print(f"Scan {scan_id} reused cached result of scan {cached.id}")
+                    self._complete_scan(scan, cached.overall_score, {**cached.report_data, "cached_from": cached.id})
+                    return
+
+            # 0a. Near-duplicate shortcut: a whole-document copy of an indexed
+            # document is reported from the LSH index without a vector search
+            if settings.LSH_ENABLED and not force:
+                duplicates = self._near_duplicates(doc)
+                if duplicates:
+                    source_id, similarity = duplicates[0]
+                    print(f"Scan {scan_id} found a copy of document {source_id} (estimated Jaccard {similarity:.2f})")
+                    total_chunks = len(self.chunker.chunk_text(doc.extracted_text))
+                    self._update_progress(scan_id, 70, "Analyzing AI probability...")
+                    self._complete_scan(scan, round(similarity * 100, 2), {
+                        # The score is the LSH estimate: no chunk was searched, so none is reported matched
+                        "score_estimated": True,
+                        "total_chunks": total_chunks,
+                        "matched_chunks": 0,
+                        "near_duplicate_of": {"source_doc_id": source_id, "estimated_similarity": similarity},
+                        "near_duplicates": [
+                            {"source_doc_id": document_id, "estimated_similarity": score}
+                            for document_id, score in duplicates
+                        ],
+                        "matches": [],
+                        "ai_detection": self._detect_ai_content(doc.extracted_text)
+                    })
+                    return
+
+            # 0b. Incremental rescan: only documents indexed since an earlier
+            # scan of the same text need to be searched
+            base = None
+            high_water_mark = None
+            if cache_key:
+                high_water_mark = cache.index_high_water_mark()
+                if settings.SCAN_INCREMENTAL_ENABLED and not force:
+                    base = cache.incremental_base(doc, cache_key, exclude_scan_id=scan_id)
+
             # 1. Chunking
             self._update_progress(scan_id, 10, "Chunking document...")
             chunks = self.chunker.chunk_text(doc.extracted_text)
             if not chunks:
                 raise ValueError("No chunks generated")
 
-            # 2. Generate Embeddings for Query
+            # 2. Load Embeddings for Query (reuses vectors stored at indexing time)
             self._update_progress(scan_id, 30, "Generating embeddings...")
-            embeddings = self.embedding_model.encode(chunks)
+            embeddings = self._get_embeddings(doc.id, chunks)
 
             # 3. Semantic Search
             self._update_progress(scan_id, 50, "Searching internal database...")
@@ -63,17 +134,25 @@ class DetectionEngine:
             total_similarity = 0.0
             matched_chunks_count = 0
 
-            for i, (chunk, vector) in enumerate(zip(chunks, embeddings)):
-                # Search for similar vectors
-                # Exclude current document from results (filter logic needed in VectorDB)
-                # For MVP, we'll just filter in python
-                results = self.vector_db.search(vector, limit=5, score_threshold=0.8)
-                
+            must = None
+            if base:
+                previous_mark = base.report_data["index_seq_mark"]
+                print(f"Scan {scan_id} is incremental on scan {base.id} (chunks indexed after {previous_mark})")
+                must = {"index_seq": {"gt": previous_mark}}
+
+            # One batched request per QDRANT_SEARCH_BATCH_SIZE chunks instead of one per chunk.
+            # Self-matches are excluded inside Qdrant so they don't take top-k slots.
+            batch_results = self.vector_db.search_batch(
+                embeddings,
+                limit=self.MATCH_LIMIT,
+                score_threshold=self.MATCH_SCORE_THRESHOLD,
+                must=must,
+                must_not={"document_id": doc.id}
+            )
+
+            for i, (chunk, results) in enumerate(zip(chunks, batch_results)):
                 chunk_matches = []
                 for res in results:
-                    if str(res["document_id"]) == str(doc.id):
-                        continue # Skip self-match
-                    
                     chunk_matches.append({
                         "source_doc_id": res["document_id"],
                         "text": res["text"],
@@ -90,6 +169,10 @@ class DetectionEngine:
                     total_similarity += best_match["score"]
                     matched_chunks_count += 1
 
+            if base:
+                matches = self._merge_matches(base.report_data.get("matches", []), matches)
+                matched_chunks_count = len(matches)
+
             # 4. Score Calculation (Simple Average of Matched Chunks)
             # This is a naive score. A better score would consider coverage.
             overall_score = 0.0
@@ -99,39 +182,122 @@ class DetectionEngine:
 
             # 5. AI Detection (Heuristic)
             self._update_progress(scan_id, 70, "Analyzing AI probability...")
-            ai_analysis = self._detect_ai_content(doc.extracted_text)
+            if base and base.report_data.get("ai_detection"):
+                # Same text and detector configuration as the base scan
+                ai_analysis = base.report_data["ai_detection"]
+            else:
+                ai_analysis = self._detect_ai_content(doc.extracted_text)
 
             # 6. Update Scan Result
             self._update_progress(scan_id, 90, "Finalizing report...")
-            scan.overall_score = round(overall_score, 2)
-            scan.report_data = {
+            report_data = {
                 "total_chunks": len(chunks),
                 "matched_chunks": matched_chunks_count,
                 "matches": matches,
                 "ai_detection": ai_analysis
             }
-            scan.status = ScanStatus.COMPLETED
-            scan.progress = 100
-            scan.current_step = "Completed"
-            self.db.commit()
+            if cache_key:
+                report_data["cache_key"] = cache_key
+                report_data["index_seq_mark"] = high_water_mark
+            if base:
+                report_data["incremental_from"] = base.id
+            self._complete_scan(scan, round(overall_score, 2), report_data)
             print(f"Scan {scan_id} completed. Score: {overall_score}")
 
         except Exception as e:
             print(f"Scan failed: {e}")
+            self._close_progress()
             scan.status = ScanStatus.FAILED
             scan.report_data = {"error": str(e)}
             self.db.commit()
             import traceback
             traceback.print_exc()
+            if isinstance(e, TRANSIENT_ERRORS):
+                raise # Retried by the job queue
+
+    def _complete_scan(self, scan: Scan, overall_score: float, report_data: Dict[str, Any]):
+        scan.overall_score = overall_score
+        scan.report_data = report_data
+        scan.status = ScanStatus.COMPLETED
+        scan.progress = 100
+        scan.current_step = "Completed"
+        scan.completed_at = func.now()
+        self._close_progress()
+        self.db.commit()
+
+    def _merge_matches(self, previous: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Merges new chunk matches into a previous scan's matches, keeping the
+        best match per chunk. Previous matches against documents that have
+        since been deleted are dropped.
+        """
+        source_ids = {m["best_match"]["source_doc_id"] for m in previous}
+        existing_ids = self._existing_document_ids(source_ids)
+        merged = {
+            m["chunk_index"]: m
+            for m in previous
+            if m["best_match"]["source_doc_id"] in existing_ids
+        }
+        for m in new:
+            current = merged.get(m["chunk_index"])
+            if current is None or m["best_match"]["score"] > current["best_match"]["score"]:
+                merged[m["chunk_index"]] = m
+        return [merged[i] for i in sorted(merged)]
+
+    def _near_duplicates(self, doc: Document) -> List[Tuple[int, float]]:
+        """
+        Existing documents whose MinHash signature estimates a Jaccard
+        similarity of at least LSH_COPY_THRESHOLD with `doc`, best first.
+        """
+        try:
+            from app.core.lsh_index import LshIndex
+            signature = (doc.meta_data or {}).get("minhash_signature")
+            if not signature:
+                return []
+            candidates = LshIndex.get_instance().query(
+                signature, threshold=settings.LSH_COPY_THRESHOLD, exclude={doc.id}
+            )
+            # The index may still list a document whose deletion failed to update it
+            existing_ids = self._existing_document_ids([document_id for document_id, _ in candidates])
+            return [(document_id, score) for document_id, score in candidates if document_id in existing_ids]
+        except Exception as e:
+            print(f"LSH lookup failed, running the full scan: {e}")
+            return []
+
+    def _existing_document_ids(self, document_ids) -> set:
+        if not document_ids:
+            return set()
+        rows = self.db.query(Document.id).filter(Document.id.in_(list(document_ids))).all()
+        return {row[0] for row in rows}
+
+    def _get_embeddings(self, document_id: int, chunks: List[str]) -> List[List[float]]:
+        """
+        Returns chunk embeddings, reading the vectors indexed by process_document
+        back from Qdrant and only encoding chunks that are not stored.
+        """
+        try:
+            embeddings = self.vector_db.get_chunk_vectors(document_id, chunks)
+        except Exception as e:
+            print(f"Failed to load stored vectors: {e}")
+            embeddings = [None] * len(chunks)
+
+        missing = [i for i, vector in enumerate(embeddings) if vector is None]
+        if missing:
+            print(f"Encoding {len(missing)} of {len(chunks)} chunks (not found in index)")
+            encoded = self.embedding_model.encode([chunks[i] for i in missing])
+            for i, vector in zip(missing, encoded):
+                embeddings[i] = vector
+
+        return embeddings
 
     def _detect_ai_content(self, text: str) -> Dict[str, Any]:
         """
         ML-Based AI Detection using RoBERTa
         Uses a pre-trained Transformer model to classify text as Real vs Fake (AI).
+        RoBERTa, perplexity, web search and the LLM check don't depend on each
+        other, so they run concurrently and the ensemble combines their results.
         """
         try:
-            from transformers import pipeline
-            
             # Truncate text to 512 tokens (model limit) to avoid errors
             # A rough char limit of 2000 is safe for 512 tokens
             truncated_text = text[:2000]
@@ -139,127 +305,228 @@ class DetectionEngine:
             if len(truncated_text) < 50:
                  return {"ai_probability": 0, "label": "Insufficient Data"}
 
-            # Initialize pipeline (lazy load would be better for performance, but this is safer for now)
-            # Using RoBERTa Large for better accuracy (Upgrade from Base)
-            # Note: First run will download the model (~1.4GB)
-            classifier = pipeline("text-classification", model="roberta-large-openai-detector")
-            
-            result = classifier(truncated_text)[0]
-            # result is like {'label': 'Fake', 'score': 0.99} or {'label': 'Real', 'score': 0.99}
-            
-            label = result['label'] # 'Fake' (AI) or 'Real' (Human)
-            score = result['score']
-            
-            ai_prob = 0.0
-            if label == 'Fake':
-                ai_prob = round(score * 100, 2)
+            timeouts = settings.AI_STAGE_TIMEOUTS
+            windowed = settings.AI_DETECTION_MODE == "windowed"
+            if windowed:
+                # Whole-document coverage: score every window in batched passes
+                spans = self._ai_windows(text)
+                windows = [text[start:end] for start, end in spans]
+                model_stages = [
+                    Stage("roberta", self._run_roberta_windows, windows, timeout=timeouts.get("roberta")),
+                    Stage("perplexity", self._run_perplexity_windows, windows, timeout=timeouts.get("perplexity")),
+                ]
             else:
-                ai_prob = round((1 - score) * 100, 2)
-                
-            display_label = "Human"
-            if ai_prob > 90:
-                display_label = "AI Generated"
-            elif ai_prob > 60:
-                display_label = "Likely AI"
-            elif ai_prob > 40:
-                display_label = "Mixed / Unsure"
+                model_stages = [
+                    Stage("roberta", self._run_roberta, truncated_text, timeout=timeouts.get("roberta")),
+                    Stage("perplexity", self._run_perplexity, truncated_text, timeout=timeouts.get("perplexity")),
+                ]
+
+            results = StageExecutor().run(model_stages + [
+                # Search using the first 1000 chars or so to save time/bandwidth
+                Stage("web_search", self._run_web_search, truncated_text[:1000], timeout=timeouts.get("web_search")),
+                Stage("llm", self._run_llm, text, timeout=timeouts.get("llm")),
+            ])
+
+            # RoBERTa is the backbone of the ensemble; without it there's no verdict
+            if not results["roberta"].ok:
+                raise results["roberta"].error
+
+            if results["perplexity"].ok:
+                analytics_scores = results["perplexity"].value
             else:
-                display_label = "Human"
-
-            # Advanced Analytics (Perplexity & Burstiness)
-            try:
-                from app.core.analytics import PerplexityAnalyzer
-                analyzer = PerplexityAnalyzer.get_instance()
-                analytics_scores = analyzer.calculate_scores(truncated_text)
-                perplexity = analytics_scores["perplexity"]
-                burstiness = analytics_scores["burstiness"]
-            except Exception as e:
-                print(f"Analytics failed: {e}")
-                perplexity = 0.0
-                burstiness = 0.0
-
-            # Web Plagiarism Search
+                print(f"Analytics failed: {results['perplexity'].error}")
+                empty_scores = {"perplexity": 0.0, "burstiness": 0.0}
+                analytics_scores = [empty_scores] * len(spans) if windowed else empty_scores
+
             web_sources = []
-            try:
-                from app.core.web_search import WebSearcher
-                searcher = WebSearcher.get_instance()
-                # Search using the first 500 chars or so to save time/bandwidth
-                web_sources = searcher.search_and_compare(truncated_text[:1000])
-            except Exception as e:
-                print(f"Web Search failed: {e}")
-
-            # --- ENSEMBLE LOGIC START ---
-            # 1. Normalize Scores to 0-100 Scale (where 100 = AI, 0 = Human)
-            
-            # Perplexity: Low (< 30) is AI, High (> 100) is Human
-            if perplexity < 30:
-                perp_ai_score = 100
-            elif perplexity < 60:
-                perp_ai_score = 80
-            elif perplexity < 100:
-                perp_ai_score = 40
+            if results["web_search"].ok:
+                web_sources = results["web_search"].value
             else:
-                perp_ai_score = 0
-                
-            # Burstiness: Low (< 0.4) is AI, High (> 0.7) is Human
-            if burstiness < 0.4:
-                burst_ai_score = 100
-            elif burstiness < 0.6:
-                burst_ai_score = 60
-            elif burstiness < 0.8:
-                burst_ai_score = 30
-            else:
-                burst_ai_score = 0
-                
-            # 2. Weighted Average
-            # Weights: RoBERTa (60%), Perplexity (20%), Burstiness (20%)
-            # Note: ai_prob from RoBERTa is already 0-100
-            
-            w_roberta = 0.6
-            w_perp = 0.2
-            w_burst = 0.2
-            
-            final_ai_score = (ai_prob * w_roberta) + (perp_ai_score * w_perp) + (burst_ai_score * w_burst)
-            final_ai_score = round(final_ai_score, 2)
-            
-            # 3. Determine Label based on Final Score
-            if final_ai_score > 85:
-                display_label = "AI Generated"
-            elif final_ai_score > 60:
-                display_label = "Likely AI"
-            elif final_ai_score > 40:
-                display_label = "Mixed / Unsure"
-            else:
-                display_label = "Human"
-            # --- ENSEMBLE LOGIC END ---
+                print(f"Web Search failed: {results['web_search'].error}")
 
-            # 4. Experimental LLM Check (Mistral-7B)
             llm_result = {}
-            try:
-                from app.core.llm_checker import LLMChecker
-                llm = LLMChecker.get_instance()
-                if llm._model:
-                    print("DEBUG: Running Mistral-7B Analysis...")
-                    llm_result = llm.analyze_text(text)
-            except Exception as e:
-                print(f"LLM Check skipped: {e}")
-
-            return {
-                "ai_probability": final_ai_score,
-                "label": display_label,
-                "details": {
-                    "model": "Ensemble (RoBERTa Large + Mistral-7B + Web)",
-                    "raw_roberta_score": ai_prob,
-                    "perplexity": perplexity,
-                    "burstiness": burstiness,
-                    "perp_ai_contribution": perp_ai_score,
-                    "burst_ai_contribution": burst_ai_score,
-                    "web_matches": web_sources,
-                    "llm_analysis": llm_result
-                }
-            }
+            if results["llm"].ok:
+                llm_result = results["llm"].value
+            else:
+                print(f"LLM Check skipped: {results['llm'].error}")
+
+            if windowed:
+                analysis = self._aggregate_windows(spans, results["roberta"].value, analytics_scores)
+            else:
+                analysis = self._ensemble(
+                    results["roberta"].value,
+                    analytics_scores["perplexity"],
+                    analytics_scores["burstiness"]
+                )
+            analysis["details"].update({
+                "web_matches": web_sources,
+                "llm_analysis": llm_result,
+                "stage_seconds": {name: result.seconds for name, result in results.items()}
+            })
+            return analysis
             
         except Exception as e:
             print(f"ML Detection failed: {e}")
             # Fallback to heuristic if ML fails (e.g. model download error)
             return {"ai_probability": 0, "label": "Error", "details": {"error": str(e)}}
+
+    def _run_roberta(self, text: str) -> float:
+        """Returns RoBERTa's AI probability on a 0-100 scale."""
+        # Using RoBERTa Large for better accuracy (Upgrade from Base)
+        # Loaded once per process by the model registry
+        classifier = ModelRegistry.get_instance().get("ai_classifier")
+        return self._roberta_probability(classifier.classify(text))
+
+    def _run_roberta_windows(self, windows: List[str]) -> List[float]:
+        classifier = ModelRegistry.get_instance().get("ai_classifier")
+        results = classifier.classify_batch(windows, batch_size=settings.AI_WINDOW_BATCH_SIZE)
+        return [self._roberta_probability(result) for result in results]
+
+    @staticmethod
+    def _roberta_probability(result: Dict[str, Any]) -> float:
+        # result is like {'label': 'Fake', 'score': 0.99} or {'label': 'Real', 'score': 0.99}
+        label = result['label'] # 'Fake' (AI) or 'Real' (Human)
+        score = result['score']
+        
+        if label == 'Fake':
+            return round(score * 100, 2)
+        return round((1 - score) * 100, 2)
+
+    def _run_perplexity(self, text: str) -> Dict[str, float]:
+        # Advanced Analytics (Perplexity & Burstiness)
+        analyzer = ModelRegistry.get_instance().get("perplexity")
+        return analyzer.calculate_scores(text)
+
+    def _run_perplexity_windows(self, windows: List[str]) -> List[Dict[str, float]]:
+        analyzer = ModelRegistry.get_instance().get("perplexity")
+        return analyzer.calculate_window_scores(windows, batch_size=settings.AI_WINDOW_BATCH_SIZE)
+
+    def _ai_windows(self, text: str) -> List[Tuple[int, int]]:
+        spans = text_windows(text, settings.AI_WINDOW_CHARS, settings.AI_WINDOW_STRIDE)
+        max_windows = settings.AI_MAX_WINDOWS
+        if max_windows and len(spans) > max_windows:
+            # Sample evenly across the document so coverage stays end to end
+            step = (len(spans) - 1) / max(max_windows - 1, 1)
+            spans = [spans[round(i * step)] for i in range(max_windows)]
+        return spans
+
+    def _aggregate_windows(
+        self,
+        spans: List[Tuple[int, int]],
+        roberta_scores: List[float],
+        analytics_scores: List[Dict[str, float]]
+    ) -> Dict[str, Any]:
+        """
+        Scores each window with the ensemble and combines them into a
+        length-weighted document score. Per-window results let the report
+        highlight the sections that look AI-written.
+        """
+        windows = []
+        for i, ((start, end), ai_prob, scores) in enumerate(zip(spans, roberta_scores, analytics_scores)):
+            window = self._ensemble(ai_prob, scores["perplexity"], scores["burstiness"])
+            windows.append({
+                "index": i,
+                "start": start,
+                "end": end,
+                "ai_probability": window["ai_probability"],
+                "label": window["label"],
+                "raw_roberta_score": ai_prob,
+                "perplexity": scores["perplexity"],
+                "burstiness": scores["burstiness"]
+            })
+
+        weights = [end - start for start, end in spans]
+        total_weight = sum(weights) or 1
+
+        def weighted_mean(values):
+            return round(sum(v * w for v, w in zip(values, weights)) / total_weight, 2)
+
+        analysis = self._ensemble(
+            weighted_mean(roberta_scores),
+            weighted_mean([scores["perplexity"] for scores in analytics_scores]),
+            weighted_mean([scores["burstiness"] for scores in analytics_scores])
+        )
+        ai_chars = sum(w for window, w in zip(windows, weights) if window["ai_probability"] > 60)
+        analysis["details"].update({
+            "mode": "windowed",
+            "windows": windows,
+            "max_window_ai_probability": max((w["ai_probability"] for w in windows), default=0),
+            "ai_text_fraction": round(ai_chars / total_weight * 100, 2)
+        })
+        return analysis
+
+    def _run_web_search(self, text: str) -> List[Dict[str, Any]]:
+        # Web Plagiarism Search
+        from app.core.web_search import WebSearcher
+        searcher = WebSearcher.get_instance()
+        return searcher.search_and_compare(text)
+
+    def _run_llm(self, text: str) -> Dict[str, Any]:
+        # Experimental LLM Check (Mistral-7B). The model loads on first use,
+        # here or in the inference server, so both modes run the same check
+        llm = ModelRegistry.get_instance().get("llm")
+        print("DEBUG: Running Mistral-7B Analysis...")
+        result = llm.analyze_text(text)
+        if "error" in result:
+            print(f"LLM Check unavailable: {result['error']}")
+            return {}
+        return result
+
+    def _ensemble(self, ai_prob: float, perplexity: float, burstiness: float) -> Dict[str, Any]:
+        # --- ENSEMBLE LOGIC START ---
+        # 1. Normalize Scores to 0-100 Scale (where 100 = AI, 0 = Human)
+        
+        # Perplexity: Low (< 30) is AI, High (> 100) is Human
+        if perplexity < 30:
+            perp_ai_score = 100
+        elif perplexity < 60:
+            perp_ai_score = 80
+        elif perplexity < 100:
+            perp_ai_score = 40
+        else:
+            perp_ai_score = 0
+            
+        # Burstiness: Low (< 0.4) is AI, High (> 0.7) is Human
+        if burstiness < 0.4:
+            burst_ai_score = 100
+        elif burstiness < 0.6:
+            burst_ai_score = 60
+        elif burstiness < 0.8:
+            burst_ai_score = 30
+        else:
+            burst_ai_score = 0
+            
+        # 2. Weighted Average
+        # Weights: RoBERTa (60%), Perplexity (20%), Burstiness (20%)
+        # Note: ai_prob from RoBERTa is already 0-100
+        
+        w_roberta = 0.6
+        w_perp = 0.2
+        w_burst = 0.2
+        
+        final_ai_score = (ai_prob * w_roberta) + (perp_ai_score * w_perp) + (burst_ai_score * w_burst)
+        final_ai_score = round(final_ai_score, 2)
+        
+        # 3. Determine Label based on Final Score
+        if final_ai_score > 85:
+            display_label = "AI Generated"
+        elif final_ai_score > 60:
+            display_label = "Likely AI"
+        elif final_ai_score > 40:
+            display_label = "Mixed / Unsure"
+        else:
+            display_label = "Human"
+        # --- ENSEMBLE LOGIC END ---
+
+        return {
+            "ai_probability": final_ai_score,
+            "label": display_label,
+            "details": {
+                "model": "Ensemble (RoBERTa Large + Mistral-7B + Web)",
+                "raw_roberta_score": ai_prob,
+                "perplexity": perplexity,
+                "burstiness": burstiness,
+                "perp_ai_contribution": perp_ai_score,
+                "burst_ai_contribution": burst_ai_score
+            }
+        }
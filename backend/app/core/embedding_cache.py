@@ -0,0 +1,271 @@
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from app.core.config import settings
+
+class EmbeddingCache:
+    """
+    Chunk-level embedding cache keyed by a hash of the model name and chunk
+    text, so resubmitted drafts and shared boilerplate are encoded once.
+    Two tiers:
+      - memory: per-process LRU of the most recently used vectors
+      - disk: vectors appended to a float32 file read through np.memmap, with
+        a SQLite index (key -> row) shared by every worker process
+    Hit / miss counters are kept in memory and added to the SQLite index
+    every COUNTER_FLUSH_SECONDS, so `stats()` reports hit rates across all
+    workers without a write per lookup (per process without a disk tier).
+    The disk tier isn't evicted: once it holds `disk_capacity` vectors, new
+    ones are only kept in memory, and `stats()` reports it full with the
+    number of vectors it turned away.
+    """
+    # Keys per SQL statement, below SQLite's bound-variable limit
+    SQL_BATCH = 500
+    COUNTER_FLUSH_SECONDS = 10.0
+
+    def __init__(
+        self,
+        model_name: str,
+        directory: Optional[str] = None,
+        memory_items: Optional[int] = None,
+        disk_items: Optional[int] = None
+    ):
+        self.model_name = model_name
+        self.memory_capacity = settings.EMBEDDING_CACHE_MEMORY_ITEMS if memory_items is None else memory_items
+        self.disk_capacity = settings.EMBEDDING_CACHE_DISK_ITEMS if disk_items is None else disk_items
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.directory = os.path.join(directory or settings.EMBEDDING_CACHE_DIR, slug)
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.index_path = os.path.join(self.directory, "index.db")
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._dim: Optional[int] = None
+        self._mmap: Optional[np.memmap] = None
+        self._memory_hits = 0
+        self._pending_counts: Dict[str, int] = {}
+        self._counts_flushed_at = time.monotonic()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vector for each text, or None where it isn't cached."""
+        keys = [self.key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+            memory_hits = sum(v is not None for v in results)
+
+            missing = {key for key, v in zip(keys, results) if v is None}
+            from_disk = self._disk_get(missing) if missing else {}
+            for i, key in enumerate(keys):
+                if results[i] is None and key in from_disk:
+                    results[i] = from_disk[key]
+                    self._remember(key, from_disk[key])
+
+            disk_hits = sum(1 for key in keys if key in from_disk)
+            self._memory_hits += memory_hits
+            self._count(memory_hits=memory_hits, disk_hits=disk_hits, misses=len(keys) - memory_hits - disk_hits)
+        return [v.tolist() if v is not None else None for v in results]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        if not texts:
+            return
+        array = np.asarray(vectors, dtype=np.float32)
+        keys = [self.key(text) for text in texts]
+        with self._lock:
+            for key, vector in zip(keys, array):
+                self._remember(key, vector)
+            self._disk_put(keys, array)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._flush_counts()
+            counters = self._counters()
+            disk_items = self._disk_items()
+            memory_bytes = sum(v.nbytes for v in self._memory.values())
+        hits = counters.get("memory_hits", 0) + counters.get("disk_hits", 0)
+        lookups = hits + counters.get("misses", 0)
+        return {
+            "model": self.model_name,
+            "lookups": lookups,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "memory": {
+                # Per process: every worker keeps its own LRU tier
+                "items": len(self._memory),
+                "capacity": self.memory_capacity,
+                "mb": round(memory_bytes / 2**20, 2),
+                "hits": self._memory_hits,
+            },
+            "disk": {
+                "items": disk_items,
+                "capacity": self.disk_capacity,
+                "mb": round(self._disk_bytes() / 2**20, 2),
+                "hits": counters.get("disk_hits", 0),
+                "full": self.disk_capacity > 0 and disk_items >= self.disk_capacity,
+                "rejected": counters.get("disk_rejected", 0),
+            },
+            "misses": counters.get("misses", 0),
+        }
+
+    # --- Memory tier ---
+
+    def _remember(self, key: str, vector: np.ndarray):
+        if self.memory_capacity <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_capacity:
+            self._memory.popitem(last=False)
+
+    # --- Disk tier ---
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self.disk_capacity <= 0:
+            return None
+        if self._conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def _dimension(self, conn: sqlite3.Connection) -> Optional[int]:
+        if self._dim is None:
+            row = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+            self._dim = row[0] if row else None
+        return self._dim
+
+    def _disk_get(self, keys) -> Dict[str, np.ndarray]:
+        try:
+            conn = self._connection()
+            if conn is None or self._dimension(conn) is None:
+                return {}
+            rows = self._rows_of(conn, list(keys))
+            if not rows:
+                return {}
+            vectors = self._mapped(max(rows.values()) + 1)
+            if vectors is None:
+                return {}
+            return {key: np.array(vectors[row]) for key, row in rows.items()}
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"Embedding cache read failed: {e}")
+            return {}
+
+    def _rows_of(self, conn: sqlite3.Connection, keys: List[str]) -> Dict[str, int]:
+        rows = {}
+        for start in range(0, len(keys), self.SQL_BATCH):
+            part = keys[start:start + self.SQL_BATCH]
+            placeholders = ",".join("?" * len(part))
+            rows.update(conn.execute(f"SELECT key, row FROM entries WHERE key IN ({placeholders})", part).fetchall())
+        return rows
+
+    def _mapped(self, rows_needed: int) -> Optional[np.memmap]:
+        # Re-map only when other processes have appended past the mapped end
+        if self._mmap is None or self._mmap.shape[0] < rows_needed:
+            row_bytes = self._dim * 4
+            rows = os.path.getsize(self.vectors_path) // row_bytes
+            if rows < rows_needed:
+                return None
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dim))
+        return self._mmap
+
+    def _disk_put(self, keys: List[str], array: np.ndarray):
+        try:
+            conn = self._connection()
+            if conn is None:
+                return
+            # IMMEDIATE serializes writers across processes, so row allocation can't race
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                dim = self._dimension(conn)
+                if dim is None:
+                    dim = self._dim = array.shape[1]
+                    conn.execute("INSERT INTO meta (name, value) VALUES ('dim', ?)", (dim,))
+                if array.shape[1] != dim:
+                    raise ValueError(f"Vector size {array.shape[1]} doesn't match cached size {dim}")
+
+                known = self._rows_of(conn, keys)
+                new = {}
+                for key, vector in zip(keys, array):
+                    if key not in known:
+                        new[key] = vector
+                next_row = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                room = max(self.disk_capacity - next_row, 0)
+                if len(new) > room:
+                    if not room:
+                        print(f"Embedding cache disk tier is full ({self.disk_capacity} vectors), new vectors are kept in memory only")
+                    self._count(disk_rejected=len(new) - room)
+                    new = dict(list(new.items())[:room])
+                if new:
+                    # Rows of a crashed write are never indexed and get overwritten
+                    with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                        f.seek(next_row * dim * 4)
+                        f.write(np.stack(list(new.values())).astype(np.float32).tobytes())
+                    conn.executemany(
+                        "INSERT INTO entries (key, row) VALUES (?, ?)",
+                        [(key, next_row + i) for i, key in enumerate(new)]
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"Embedding cache write failed: {e}")
+
+    def _count(self, **counts: int):
+        for name, value in counts.items():
+            if value:
+                self._pending_counts[name] = self._pending_counts.get(name, 0) + value
+        if time.monotonic() - self._counts_flushed_at >= self.COUNTER_FLUSH_SECONDS:
+            self._flush_counts()
+
+    def _flush_counts(self):
+        self._counts_flushed_at = time.monotonic()
+        if not self._pending_counts:
+            return
+        try:
+            conn = self._connection()
+            if conn is None:
+                return # No disk tier: the counters stay in memory
+            conn.executemany(
+                "INSERT INTO meta (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(self._pending_counts.items())
+            )
+            self._pending_counts = {}
+        except sqlite3.Error as e:
+            print(f"Embedding cache stats update failed: {e}")
+
+    def _counters(self) -> Dict[str, int]:
+        try:
+            conn = self._connection()
+            if conn is None:
+                return dict(self._pending_counts)
+            return dict(conn.execute("SELECT name, value FROM meta WHERE name != 'dim'").fetchall())
+        except sqlite3.Error:
+            return {}
+
+    def _disk_items(self) -> int:
+        try:
+            conn = self._connection()
+            return conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] if conn else 0
+        except sqlite3.Error:
+            return 0
+
+    def _disk_bytes(self) -> int:
+        try:
+            return os.path.getsize(self.vectors_path)
+        except OSError:
+            return 0
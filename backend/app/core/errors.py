@@ -0,0 +1,16 @@
+from sqlalchemy.exc import OperationalError
+
+def _transient_errors() -> tuple:
+    """
+    Errors worth retrying a job for: the database, Qdrant or the network was
+    briefly unavailable. Anything else is a real failure of the document.
+    """
+    errors = [ConnectionError, TimeoutError, OperationalError]
+    try:
+        from qdrant_client.http.exceptions import ResponseHandlingException
+        errors.append(ResponseHandlingException)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+TRANSIENT_ERRORS = _transient_errors()
@@ -0,0 +1,77 @@
+"""
+Startup import profile: per-module import time of a module (app.main by
+default), measured with `python -X importtime` in a fresh interpreter, and
+which heavy stacks it pulls in. The API should load none of them at boot.
+
+    python -m app.core.import_profile [module] [--top N]
+"""
+import os
+import sys
+import json
+import subprocess
+from typing import Any, Dict, List
+
+# Stacks that belong in workers / the inference server, not API startup
+HEAVY_MODULES = (
+    "torch", "transformers", "sentence_transformers", "onnxruntime", "llama_cpp",
+    "playwright", "qdrant_client", "reportlab", "datasketch", "scipy",
+    "magic", "pytesseract", "pypdf", "docx", "celery",
+)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def profile(module: str = "app.main") -> Dict[str, Any]:
+    code = (
+        f"import sys, json; import {module}; "
+        f"print(json.dumps(sorted(m for m in {list(HEAVY_MODULES)!r} if m in sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+
+    modules = []
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        modules.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(fields[0]) / 1000,
+            "cumulative_ms": int(fields[1]) / 1000,
+        })
+
+    top_level = [m for m in modules if m["depth"] == 0]
+    return {
+        "module": module,
+        "total_ms": round(sum(m["cumulative_ms"] for m in top_level), 1),
+        "target_ms": next((m["cumulative_ms"] for m in top_level if m["module"] == module), None),
+        "modules": sorted(modules, key=lambda m: m["cumulative_ms"], reverse=True),
+        "heavy": json.loads(result.stdout.strip().splitlines()[-1]),
+    }
+
+def main(argv: List[str]) -> int:
+    top = 25
+    if "--top" in argv:
+        i = argv.index("--top")
+        top = int(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    report = profile(argv[0] if argv else "app.main")
+
+    print(f"Importing {report['module']}: {report['target_ms']:.0f} ms ({report['total_ms']:.0f} ms with interpreter startup)")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for m in report["modules"][:top]:
+        print(f"{m['cumulative_ms']:>14.1f} {m['self_ms']:>9.1f}  {'  ' * m['depth']}{m['module']}")
+    if report["heavy"]:
+        print(f"Heavy modules loaded at import: {', '.join(report['heavy'])}")
+        return 1
+    print("No heavy modules loaded at import.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
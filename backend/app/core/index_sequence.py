@@ -0,0 +1,40 @@
+"""
+Index sequence: a counter taken each time a document's chunks are written to
+the vector index, stamped on the document and on its Qdrant points
+("index_seq"). Unlike document ids it follows indexing order, so a document
+that is retried, reprocessed or finishes out of id order still gets a number
+above every mark recorded before its points were written.
+"""
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.document import Document, DocStatus, IndexSequence
+
+def stamp(db: Session, doc: Document) -> int:
+    """
+    Takes the next sequence number for `doc`. The caller commits before
+    writing points, so the document counts as in flight until it is indexed.
+    """
+    # The row lock serializes writers until commit, so numbers are committed in order
+    db.query(IndexSequence).filter(IndexSequence.id == 1).update(
+        {IndexSequence.value: IndexSequence.value + 1}, synchronize_session=False
+    )
+    doc.index_seq = db.query(IndexSequence.value).filter(IndexSequence.id == 1).scalar()
+    return doc.index_seq
+
+def high_water_mark(db: Session) -> int:
+    """
+    Largest sequence number H such that the points of every write stamped
+    <= H are complete in the index. Writes in flight (stamped but not yet
+    indexed, including failed ones awaiting a retry) hold the mark below them;
+    a document that fails for good has its stamp cleared by the worker.
+    """
+    # Counter first: a write stamped after this read is above the mark either way
+    last = db.query(IndexSequence.value).filter(IndexSequence.id == 1).scalar() or 0
+    in_flight = (
+        db.query(func.min(Document.index_seq))
+        .filter(Document.index_seq.isnot(None), Document.status != DocStatus.INDEXED)
+        .scalar()
+    )
+    if in_flight is not None:
+        return min(last, in_flight - 1)
+    return last
@@ -0,0 +1,224 @@
+"""
+Shared inference server: one process owns the models (embedding, AI
+classifier, perplexity, LLM) and serves every API and worker process over a
+Unix socket, so adding workers doesn't add copies of the weights.
+
+    python -m app.core.inference_server
+
+Clients use it when INFERENCE_SERVER_SOCKET is set: `ModelRegistry.get`
+returns a RemoteModel proxy and EmbeddingModel.encode forwards its calls.
+Concurrent list requests from all clients are micro-batched on the server.
+"""
+import os
+import sys
+import threading
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.batching import MicroBatcher
+
+# Methods clients may call on each model
+REMOTE_METHODS = {
+    "embedding": {"encode"},
+    "ai_classifier": {"classify", "classify_batch"},
+    "perplexity": {"calculate_scores", "calculate_window_scores"},
+    "llm": {"analyze_text"},
+}
+
+# List-in / list-out methods merged across clients into shared forward passes
+BATCHED_METHODS = {
+    ("ai_classifier", "classify_batch"),
+    ("perplexity", "calculate_window_scores"),
+}
+
+# Models that aren't safe to call from several threads at once
+SERIALIZED_MODELS = {"llm"}
+
+# True inside the server process, so its own model calls run locally
+_serving = False
+
+class RemoteInferenceError(RuntimeError):
+    """The inference server raised while handling a request."""
+
+def enabled() -> bool:
+    return bool(settings.INFERENCE_SERVER_SOCKET) and not _serving
+
+def _authkey() -> bytes:
+    # Requests are pickles: whoever holds the key can run code in the server
+    if not settings.INFERENCE_SERVER_AUTHKEY:
+        raise RuntimeError("INFERENCE_SERVER_AUTHKEY must be set to use the inference server")
+    return settings.INFERENCE_SERVER_AUTHKEY.encode("utf-8")
+
+class InferenceServer:
+    def __init__(self, address: Optional[str] = None, registry=None):
+        from app.core.registry import ModelRegistry
+        self.address = address or settings.INFERENCE_SERVER_SOCKET
+        self.registry = registry or ModelRegistry.get_instance()
+        self._listener: Optional[Listener] = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._batchers: Dict[Tuple[str, str], MicroBatcher] = {}
+        self._model_locks: Dict[str, threading.Lock] = {name: threading.Lock() for name in SERIALIZED_MODELS}
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.remove(self.address) # Stale socket of a previous run
+        os.makedirs(os.path.dirname(self.address) or ".", exist_ok=True)
+        self._listener = Listener(self.address, family="AF_UNIX", authkey=_authkey())
+        print(f"Inference server listening on {self.address}")
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._closed:
+                    break
+                print(f"Inference server rejected a connection: {e}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def close(self):
+        self._closed = True
+        # Wake up the blocked accept()
+        try:
+            Client(self.address, family="AF_UNIX", authkey=_authkey()).close()
+        except Exception:
+            pass
+        if self._listener is not None:
+            self._listener.close()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    model, method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response = ("ok", self.dispatch(model, method, args, kwargs))
+                except Exception as e:
+                    response = ("error", type(e).__name__, str(e))
+                conn.send(response)
+
+    def dispatch(self, model: str, method: str, args: tuple = (), kwargs: Optional[dict] = None) -> Any:
+        kwargs = kwargs or {}
+        if model == "registry" and method == "report":
+            return self.registry.report()
+        if method != "is_loaded" and method not in REMOTE_METHODS.get(model, ()):
+            raise AttributeError(f"{model}.{method} can't be called remotely")
+
+        if method == "is_loaded":
+            return self.registry.is_loaded(model)
+        wrapper = self.registry.get(model)
+        if (model, method) in BATCHED_METHODS:
+            return self._batcher(model, method).run(args[0])
+        model_lock = self._model_locks.get(model)
+        if model_lock is None:
+            return getattr(wrapper, method)(*args, **kwargs)
+        with model_lock:
+            return getattr(wrapper, method)(*args, **kwargs)
+
+    def _batcher(self, model: str, method: str) -> MicroBatcher:
+        with self._lock:
+            batcher = self._batchers.get((model, method))
+            if batcher is None:
+                def run(items):
+                    wrapper = self.registry.get(model)
+                    return getattr(wrapper, method)(items, batch_size=settings.AI_WINDOW_BATCH_SIZE)
+                batcher = self._batchers[(model, method)] = MicroBatcher(run, name=f"{model}-batcher")
+            return batcher
+
+class InferenceClient:
+    """One connection per thread to the inference server, reconnecting after failures."""
+
+    def __init__(self, address: Optional[str] = None, timeout: Optional[float] = None):
+        self.address = address or settings.INFERENCE_SERVER_SOCKET
+        self.timeout = settings.INFERENCE_SERVER_TIMEOUT if timeout is None else timeout
+        self._local = threading.local()
+
+    def call(self, model: str, method: str, *args, **kwargs) -> Any:
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.send((model, method, args, kwargs))
+                if not conn.poll(self.timeout):
+                    self._drop() # The late response would be read by the next call
+                    raise TimeoutError(f"Inference server didn't answer {model}.{method} in {self.timeout}s")
+                response = conn.recv()
+                break
+            except TimeoutError:
+                raise
+            except (EOFError, OSError) as e:
+                # The server restarted: reconnect once, then let the job queue retry
+                self._drop()
+                if attempt:
+                    raise ConnectionError(f"Inference server unavailable: {e}") from e
+
+        if response[0] == "error":
+            raise RemoteInferenceError(f"{response[1]}: {response[2]}")
+        return response[1]
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = Client(self.address, family="AF_UNIX", authkey=_authkey())
+            except OSError as e:
+                raise ConnectionError(f"Inference server unavailable at {self.address}: {e}") from e
+            self._local.conn = conn
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+class RemoteModel:
+    """Stands in for a model wrapper in client processes; calls run on the server."""
+
+    def __init__(self, name: str, client: Optional[InferenceClient] = None):
+        self.name = name
+        self._client = client or get_client()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._client.call(self.name, "is_loaded")
+
+    def __getattr__(self, method: str):
+        if method.startswith("_") or method not in REMOTE_METHODS.get(self.name, ()):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self._client.call(self.name, method, *args, **kwargs)
+
+_client: Optional[InferenceClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> InferenceClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = InferenceClient()
+        return _client
+
+def main() -> int:
+    global _serving
+    if not settings.INFERENCE_SERVER_SOCKET:
+        print("Set INFERENCE_SERVER_SOCKET to the Unix socket path to serve on.")
+        return 2
+    if not settings.INFERENCE_SERVER_AUTHKEY:
+        print("Set INFERENCE_SERVER_AUTHKEY to a random secret shared with the API and workers.")
+        return 2
+    _serving = True
+    server = InferenceServer()
+    if settings.MODEL_PRELOAD:
+        server.registry.warm_up()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
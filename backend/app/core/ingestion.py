@@ -1,19 +1,28 @@
 import os
-from typing import Optional
-import magic
-from pypdf import PdfReader
-import docx
-from bs4 import BeautifulSoup
-import pytesseract
-from PIL import Image
+import threading
+from collections import deque
+from typing import Iterator, List, Optional
+from app.core.config import settings
+
+# Parser libraries are imported where used, so importing this module is cheap
 
 class TextExtractor:
     @staticmethod
     def extract(file_path: str, content_type: str) -> str:
+        # Joined once at the end: linear in the text size
+        return "".join(TextExtractor.iter_extract(file_path, content_type))
+
+    @staticmethod
+    def iter_extract(file_path: str, content_type: str) -> Iterator[str]:
+        """
+        Streams a document's text as it is extracted: PDFs page by page,
+        other formats as a single piece.
+        """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
 
         try:
+            import magic
             mime = magic.Magic(mime=True)
             detected_type = mime.from_file(file_path)
         except Exception as e:
@@ -27,8 +36,13 @@ class TextExtractor:
         print(f"Detected type: {detected_type} for {file_path}")
 
         if 'pdf' in detected_type:
-            return TextExtractor._extract_pdf(file_path)
-        elif 'wordprocessingml' in detected_type or 'msword' in detected_type:
+            yield from TextExtractor._iter_pdf(file_path)
+        else:
+            yield TextExtractor._extract_by_type(file_path, detected_type)
+
+    @staticmethod
+    def _extract_by_type(file_path: str, detected_type: str) -> str:
+        if 'wordprocessingml' in detected_type or 'msword' in detected_type:
             return TextExtractor._extract_docx(file_path)
         elif 'html' in detected_type or 'xml' in detected_type:
             return TextExtractor._extract_html(file_path)
@@ -51,33 +65,59 @@ class TextExtractor:
 
     @staticmethod
     def _extract_pdf(file_path: str) -> str:
-        text = ""
+        return "".join(TextExtractor._iter_pdf(file_path))
+
+    @staticmethod
+    def _iter_pdf(file_path: str) -> Iterator[str]:
+        """Text of each non-empty page followed by a newline, in page order."""
         try:
-            reader = PdfReader(file_path)
-            for page in reader.pages:
-                page_text = page.extract_text()
+            # Scanned pages (no text layer) fall back to OCR
+            from app.core.ocr import fill_scanned_pages
+            for page_text in fill_scanned_pages(file_path, TextExtractor.iter_pdf_pages(file_path)):
                 if page_text:
-                    text += page_text + "\n"
-            
-            # Fallback to OCR if text is empty (scanned PDF)
-            if not text.strip():
-                # Note: This requires converting PDF pages to images first.
-                # For MVP, we'll skip complex PDF-to-Image OCR and just return empty
-                # or implement a simple warning.
-                # To do this properly, we'd need pdf2image library.
-                pass
-                
+                    yield page_text + "\n"
         except Exception as e:
             print(f"Error extracting PDF: {e}")
-        return text
+
+    @staticmethod
+    def iter_pdf_pages(file_path: str) -> Iterator[str]:
+        """
+        Yields the text of every page, in order. PDFs with at least
+        PDF_PARALLEL_MIN_PAGES pages are split into ranges of
+        PDF_PAGES_PER_TASK pages extracted in a process pool; at most two
+        ranges per worker are in flight, so memory stays bounded.
+        """
+        from pypdf import PdfReader
+        reader = PdfReader(file_path)
+        page_count = len(reader.pages)
+        pool = _pdf_pool() if page_count >= settings.PDF_PARALLEL_MIN_PAGES else None
+        if pool is None:
+            for page in reader.pages:
+                yield page.extract_text() or ""
+            return
+        del reader
+
+        step = max(settings.PDF_PAGES_PER_TASK, 1)
+        max_in_flight = 2 * _pdf_workers()
+        # A consumer stopping early leaves at most max_in_flight ranges to finish unread
+        pending = deque()
+        for start in range(0, page_count, step):
+            end = min(start + step, page_count)
+            pending.append((_submit(pool, file_path, start, end), start, end))
+            if len(pending) >= max_in_flight:
+                yield from _range_result(file_path, *pending.popleft())
+        while pending:
+            yield from _range_result(file_path, *pending.popleft())
 
     @staticmethod
     def _extract_docx(file_path: str) -> str:
+        import docx
         doc = docx.Document(file_path)
         return "\n".join([para.text for para in doc.paragraphs])
 
     @staticmethod
     def _extract_html(file_path: str) -> str:
+        from bs4 import BeautifulSoup
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
             soup = BeautifulSoup(f, 'html.parser')
             return soup.get_text(separator='\n')
@@ -99,7 +139,72 @@ class TextExtractor:
     @staticmethod
     def _extract_image(file_path: str) -> str:
         try:
-            return pytesseract.image_to_string(Image.open(file_path))
+            from PIL import Image, ImageSequence
+            from app.core.ocr import ocr_images
+            # Multi-page TIFFs: every frame is OCRed, across the OCR pool
+            with Image.open(file_path) as image:
+                frames = [frame.copy() for _, frame in zip(range(settings.OCR_MAX_PAGES), ImageSequence.Iterator(image))]
+            return "\n".join(text for text in ocr_images(frames) if text)
         except Exception as e:
             print(f"OCR Error: {e}")
             return ""
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """Text of pages [start, end); runs in the PDF process pool."""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+_pool = None
+_pool_pid: Optional[int] = None
+_pool_unavailable = False
+_pool_lock = threading.Lock()
+
+def _pdf_workers() -> int:
+    return settings.PDF_WORKERS or os.cpu_count() or 1
+
+def _pdf_pool():
+    """
+    billiard's process pool (Celery's fork of multiprocessing): unlike
+    multiprocessing's, it can start children from the daemonic processes of
+    Celery's prefork pool, where extraction workers run.
+    """
+    global _pool, _pool_pid, _pool_unavailable
+    workers = _pdf_workers()
+    if workers <= 1 or _pool_unavailable:
+        return None
+    with _pool_lock:
+        # A pool doesn't survive fork: forked workers create their own
+        if _pool is None or _pool_pid != os.getpid():
+            try:
+                import billiard
+                # spawn: forking a process that runs threads (Celery, torch) isn't safe
+                _pool = billiard.get_context("spawn").Pool(processes=workers)
+            except (ImportError, AssertionError, OSError) as e:
+                print(f"PDF process pool unavailable ({e}). Extracting pages serially.")
+                _pool_unavailable = True
+                return None
+            _pool_pid = os.getpid()
+        return _pool
+
+def _submit(pool, file_path: str, start: int, end: int):
+    global _pool_unavailable
+    try:
+        return pool.apply_async(_extract_pdf_pages, (file_path, start, end))
+    except (AssertionError, OSError, ValueError) as e:
+        # e.g. the pool was closed: extract inline
+        print(f"PDF process pool unavailable ({e}). Extracting pages serially.")
+        _pool_unavailable = True
+        return None
+
+def _range_result(file_path: str, result, start: int, end: int) -> List[str]:
+    global _pool
+    if result is not None:
+        from billiard.exceptions import WorkerLostError
+        try:
+            return result.get()
+        except WorkerLostError as e:
+            print(f"PDF process pool failed ({e}). Extracting pages {start}-{end} serially.")
+            with _pool_lock:
+                _pool = None
+    return _extract_pdf_pages(file_path, start, end)
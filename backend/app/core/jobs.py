@@ -0,0 +1,62 @@
+import threading
+from app.core.config import settings
+
+# Jobs are queued in a broker and run by separate worker processes, never
+# inside the API process. Document processing is a pipeline of stages, each on
+# its own queue so it can be scaled on its own (see docs/architecture.md):
+#   extraction (W_OCR): celery -A app.worker.celery_app worker -Q extraction -c 4
+#   embedding  (W_EMB): celery -A app.worker.celery_app worker -Q embedding -P threads -c 4
+#   indexing   (W_EMB): celery -A app.worker.celery_app worker -Q indexing -c 2
+#   scans      (W_MAT): celery -A app.worker.celery_app worker -Q scans -c 1
+
+# Task names, so the API can enqueue jobs without importing app.worker (and
+# with it the whole processing stack)
+PROCESS_DOCUMENT = "app.worker.process_document"
+EMBED_DOCUMENT = "app.worker.embed_document"
+INDEX_DOCUMENT = "app.worker.index_document"
+CLONE_DOCUMENT = "app.worker.clone_document"
+RUN_SCAN = "app.worker.run_scan_task"
+
+_celery_app = None
+_celery_app_lock = threading.Lock()
+
+def get_celery_app():
+    """
+    The Celery app, created on first use: importing celery costs the API
+    startup time, and the API only needs it once it enqueues a job.
+    """
+    global _celery_app
+    with _celery_app_lock:
+        if _celery_app is None:
+            from celery import Celery
+            celery_app = Celery("plagiascan", broker=settings.QUEUE_BROKER_URL or settings.REDIS_URL)
+            celery_app.conf.update(
+                task_routes={
+                    PROCESS_DOCUMENT: {"queue": "extraction"},
+                    EMBED_DOCUMENT: {"queue": "embedding"},
+                    INDEX_DOCUMENT: {"queue": "indexing"},
+                    CLONE_DOCUMENT: {"queue": "indexing"},
+                    RUN_SCAN: {"queue": "scans"},
+                },
+                task_default_queue="default",
+                # Durability: a job is acknowledged only after it finishes, so jobs of a
+                # worker that dies or restarts are redelivered instead of lost
+                task_acks_late=True,
+                task_reject_on_worker_lost=True,
+                worker_prefetch_multiplier=1,
+                task_ignore_result=True,
+                # Runs tasks inline (no broker or workers), for tests
+                task_always_eager=settings.QUEUE_ALWAYS_EAGER,
+                task_eager_propagates=True,
+            )
+            _celery_app = celery_app
+        return _celery_app
+
+def enqueue(task_name: str, *args):
+    """Sends a job to its queue by task name."""
+    celery_app = get_celery_app()
+    if celery_app.conf.task_always_eager:
+        # Inline runs (tests, QUEUE_ALWAYS_EAGER) need the task code itself
+        import app.worker
+        return celery_app.tasks[task_name].delay(*args)
+    return celery_app.send_task(task_name, args=args)
@@ -1,16 +1,14 @@
 import logging
 import os
-from huggingface_hub import hf_hub_download
-try:
-    from llama_cpp import Llama
-except ImportError:
-    Llama = None
+from app.core.registry import ManagedModel
 
 logger = logging.getLogger(__name__)
 
-class LLMChecker:
+class LLMChecker(ManagedModel):
     _instance = None
     _model = None
+    _unavailable = False
+    registry_name = "llm"
     
     # Model details
     REPO_ID = "TheBloke/Mistral-7B-Instruct-v0.2-GGUF"
@@ -22,10 +20,18 @@ class LLMChecker:
             cls._instance = cls()
         return cls._instance
 
-    def __init__(self):
-        if Llama is None:
+    def _load(self):
+        # Don't retry a download/load that already failed in this process
+        if self._unavailable:
+            return None
+
+        try:
+            from llama_cpp import Llama
+        except ImportError:
             logger.warning("llama-cpp-python not installed. LLM Check disabled.")
-            return
+            self._unavailable = True
+            return None
+        from huggingface_hub import hf_hub_download
 
         try:
             logger.info(f"Downloading/Loading LLM: {self.FILENAME}...")
@@ -35,22 +41,25 @@ class LLMChecker:
             # n_gpu_layers=-1 tries to offload all to GPU. 
             # If no GPU support compiled, it ignores it.
             # n_ctx=2048 is standard context window.
-            self._model = Llama(
+            model = Llama(
                 model_path=model_path,
                 n_ctx=2048,
                 n_gpu_layers=0, # Force CPU to avoid GGML assertion failures on some Windows setups
                 verbose=False
             )
             logger.info("LLM loaded successfully.")
+            return model
         except Exception as e:
             logger.error(f"Failed to load LLM: {e}")
-            self._model = None
+            self._unavailable = True
+            return None
 
     def analyze_text(self, text: str) -> dict:
         """
         Analyzes text using Mistral-7B to detect AI generation.
         """
-        if not self._model:
+        model = self.load()
+        if not model:
             return {"error": "LLM not loaded"}
 
         # Truncate text to fit context (approx 1500 tokens to leave room for prompt)
@@ -67,7 +76,7 @@ class LLMChecker:
         JSON Response: [/INST]"""
 
         try:
-            output = self._model(
+            output = model(
                 prompt,
                 max_tokens=200,
                 stop=["</s>"],
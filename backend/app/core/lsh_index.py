@@ -0,0 +1,357 @@
+"""
+Banded MinHash LSH index of document fingerprints, for finding
+near-duplicate documents without a vector search.
+
+Each signature is cut into LSH_BANDS bands and every band is hashed to a
+64-bit key. Two documents become candidates when any band key is equal, and
+candidates are verified on their full signatures (the fraction of equal
+values estimates the Jaccard similarity of their word 3-gram sets).
+
+On disk (LSH_INDEX_DIR, shared by the workers and the API), as numpy arrays:
+  - a compacted main segment: document ids, signatures, and per band the
+    sorted keys with their rows, so a lookup is a binary search per band
+  - an append-only delta file of rows added since the last compaction,
+    scanned linearly and compacted into main after LSH_DELTA_MAX rows
+  - an append-only file of deleted rows
+Writers serialize on a file lock; readers map the main segment and read only
+what was appended to the delta and deletion files since their last query.
+
+    python -m app.core.lsh_index rebuild   # index every fingerprinted document
+"""
+import os
+import sys
+import json
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from app.core.config import settings
+
+# Odd 64-bit multipliers combining a band's values into one key (uint64 wraparound)
+_KEY_MULTIPLIERS = np.array(
+    [pow(0x9E3779B97F4A7C15, k + 1, 2**64) | 1 for k in range(64)], dtype=np.uint64
+)
+
+class LshIndex:
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, directory: Optional[str] = None, bands: Optional[int] = None):
+        self.directory = directory or settings.LSH_INDEX_DIR
+        self._default_bands = bands or settings.LSH_BANDS
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, current: Optional[dict]):
+        self._current = current
+        self._main_ids = self._main_sigs = self._main_keys = self._main_rows = None
+        self._delta_ids = np.zeros(0, dtype=np.int64)
+        self._delta_sigs = None
+        self._delta_keys = None
+        self._delta_offset = 0
+        self._deleted: Set[int] = set()
+        self._deleted_offset = 0
+
+    # --- Public API ---
+
+    def add(self, document_id: int, signature: Iterable[int]):
+        """Indexes (or re-indexes) a document's MinHash signature."""
+        signature = np.asarray(list(signature), dtype=np.uint32)
+        if not self.indexable(signature):
+            return
+        with self._lock, self._write_lock():
+            if self._current is None:
+                self._current = self._load_current() or self._create(len(signature))
+            self._refresh()
+            if len(signature) != self._current["num_perm"]:
+                raise ValueError(f"Signature has {len(signature)} values, index expects {self._current['num_perm']}")
+            self._append_deleted(self._rows_of(document_id))
+            record = np.zeros(1, dtype=self._record_dtype())
+            record["id"] = document_id
+            record["sig"] = signature
+            self._append(self._path("delta"), record.tobytes())
+            self._refresh()
+            if len(self._delta_ids) >= settings.LSH_DELTA_MAX:
+                self._compact()
+
+    def remove(self, document_id: int):
+        if not os.path.exists(os.path.join(self.directory, "CURRENT")):
+            return # Nothing indexed yet
+        with self._lock, self._write_lock():
+            if not self._refresh():
+                return
+            self._append_deleted(self._rows_of(document_id))
+
+    def query(
+        self,
+        signature: Iterable[int],
+        threshold: float = 0.0,
+        exclude: Iterable[int] = ()
+    ) -> List[Tuple[int, float]]:
+        """
+        (document id, estimated Jaccard similarity) of indexed documents that
+        share a band with `signature` and reach `threshold`, best first.
+        """
+        query = np.asarray(list(signature), dtype=np.uint32)
+        if not self.indexable(query):
+            return []
+        with self._lock:
+            if not self._refresh() or len(query) != self._current["num_perm"]:
+                return []
+            keys = self._band_keys(query[None, :])[0]
+
+            candidates = []
+            if self._main_ids is not None and len(self._main_ids):
+                for band, key in enumerate(keys):
+                    band_keys = self._main_keys[band]
+                    start = np.searchsorted(band_keys, key, side="left")
+                    end = np.searchsorted(band_keys, key, side="right")
+                    if end > start:
+                        candidates.append(np.asarray(self._main_rows[band, start:end]))
+            if len(self._delta_ids):
+                hits = np.nonzero((self._delta_keys == keys).any(axis=1))[0]
+                candidates.append(hits + self._main_count())
+            if not candidates:
+                return []
+
+            excluded = set(exclude)
+            best: Dict[int, float] = {}
+            for row in np.unique(np.concatenate(candidates)).tolist():
+                if row in self._deleted:
+                    continue
+                document_id, row_signature = self._row(row)
+                if document_id in excluded:
+                    continue
+                similarity = float(np.count_nonzero(row_signature == query)) / len(query)
+                if similarity >= threshold and similarity > best.get(document_id, -1.0):
+                    best[document_id] = similarity
+        return sorted(best.items(), key=lambda item: item[1], reverse=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            if not self._refresh():
+                return {"documents": 0}
+            rows = self._main_count() + len(self._delta_ids)
+            return {
+                "documents": rows - len(self._deleted),
+                "main_rows": self._main_count(),
+                "delta_rows": len(self._delta_ids),
+                "deleted_rows": len(self._deleted),
+                "bands": self._current["bands"],
+                "num_perm": self._current["num_perm"],
+            }
+
+    @staticmethod
+    def indexable(signature: np.ndarray) -> bool:
+        # A text with fewer than three words has the empty signature (all max
+        # hash values), which would match every other short text
+        return len(signature) > 0 and bool((signature != np.iinfo(np.uint32).max).any())
+
+    # --- Keys ---
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        bands = self._current["bands"]
+        rows = signatures.shape[1] // bands
+        banded = signatures[:, :bands * rows].reshape(len(signatures), bands, rows).astype(np.uint64)
+        return (banded * _KEY_MULTIPLIERS[:rows]).sum(axis=2, dtype=np.uint64)
+
+    # --- Files ---
+
+    def _path(self, name: str, generation: Optional[int] = None) -> str:
+        if generation is None:
+            generation = self._current["generation"]
+        return os.path.join(self.directory, f"{generation}.{name}")
+
+    def _record_dtype(self) -> np.dtype:
+        return np.dtype([("id", "<i8"), ("sig", "<u4", (self._current["num_perm"],))])
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_current(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_current(self, current: dict):
+        path = os.path.join(self.directory, "CURRENT")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(current, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _create(self, num_perm: int) -> dict:
+        current = {"generation": 0, "bands": self._default_bands, "num_perm": num_perm}
+        if num_perm % current["bands"]:
+            raise ValueError(f"LSH_BANDS={current['bands']} doesn't divide the {num_perm} signature values")
+        self._write_current(current)
+        return current
+
+    @staticmethod
+    def _append(path: str, data: bytes):
+        # O_APPEND writes of whole records; readers ignore a trailing partial record
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _read_from(path: str, offset: int, record_size: int) -> bytes:
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return b""
+        return data[:len(data) - len(data) % record_size]
+
+    def _refresh(self) -> bool:
+        """Catches up with other processes' writes; False if there is no index yet."""
+        current = self._load_current()
+        if current is None:
+            self._reset(None)
+            return False
+        if current != self._current or self._main_ids is None:
+            self._reset(current)
+            try:
+                self._main_ids = np.load(self._path("ids.npy"), mmap_mode="r")
+                self._main_sigs = np.load(self._path("sigs.npy"), mmap_mode="r")
+                self._main_keys = np.load(self._path("keys.npy"), mmap_mode="r")
+                self._main_rows = np.load(self._path("rows.npy"), mmap_mode="r")
+            except FileNotFoundError:
+                self._main_ids = np.zeros(0, dtype=np.int64) # Not compacted yet
+
+        dtype = self._record_dtype()
+        data = self._read_from(self._path("delta"), self._delta_offset, dtype.itemsize)
+        if data:
+            records = np.frombuffer(data, dtype=dtype)
+            sigs = records["sig"]
+            keys = self._band_keys(sigs)
+            self._delta_ids = np.concatenate([self._delta_ids, records["id"]])
+            self._delta_sigs = sigs if self._delta_sigs is None else np.concatenate([self._delta_sigs, sigs])
+            self._delta_keys = keys if self._delta_keys is None else np.concatenate([self._delta_keys, keys])
+            self._delta_offset += len(data)
+
+        data = self._read_from(self._path("deleted"), self._deleted_offset, 8)
+        if data:
+            self._deleted.update(np.frombuffer(data, dtype="<i8").tolist())
+            self._deleted_offset += len(data)
+        return True
+
+    # --- Rows (main rows first, then delta rows) ---
+
+    def _main_count(self) -> int:
+        return len(self._main_ids) if self._main_ids is not None else 0
+
+    def _row(self, row: int) -> Tuple[int, np.ndarray]:
+        main_count = self._main_count()
+        if row < main_count:
+            return int(self._main_ids[row]), np.asarray(self._main_sigs[row])
+        return int(self._delta_ids[row - main_count]), self._delta_sigs[row - main_count]
+
+    def _rows_of(self, document_id: int) -> List[int]:
+        rows = []
+        if self._main_count():
+            rows.extend(np.nonzero(np.asarray(self._main_ids) == document_id)[0].tolist())
+        if len(self._delta_ids):
+            rows.extend((np.nonzero(self._delta_ids == document_id)[0] + self._main_count()).tolist())
+        return [row for row in rows if row not in self._deleted]
+
+    def _append_deleted(self, rows: List[int]):
+        if rows:
+            self._append(self._path("deleted"), np.asarray(rows, dtype="<i8").tobytes())
+
+    def _compact(self):
+        """Merges the delta into a new main segment, dropping deleted rows (under the write lock)."""
+        if not len(self._delta_ids) and not self._deleted:
+            return
+        total = self._main_count() + len(self._delta_ids)
+        keep = np.ones(total, dtype=bool)
+        keep[[row for row in self._deleted if row < total]] = False
+        live = np.nonzero(keep)[0]
+        main_count = self._main_count()
+        from_main = live[live < main_count]
+        from_delta = live[live >= main_count] - main_count
+
+        ids = np.concatenate([np.asarray(self._main_ids)[from_main], self._delta_ids[from_delta]])
+        delta_sigs = self._delta_sigs if self._delta_sigs is not None else np.zeros((0, self._current["num_perm"]), dtype=np.uint32)
+        sigs_parts = [delta_sigs[from_delta]]
+        if main_count:
+            sigs_parts.insert(0, np.asarray(self._main_sigs)[from_main])
+        sigs = np.concatenate(sigs_parts).astype(np.uint32)
+        band_keys = self._band_keys(sigs).T # (bands, rows)
+        rows = np.argsort(band_keys, axis=1, kind="stable")
+        keys = np.take_along_axis(band_keys, rows, axis=1)
+
+        old_generation = self._current["generation"]
+        current = dict(self._current, generation=old_generation + 1)
+        for name, array in (("ids.npy", ids), ("sigs.npy", sigs), ("keys.npy", keys), ("rows.npy", rows)):
+            path = self._path(name, current["generation"])
+            with open(f"{path}.tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(f"{path}.tmp", path)
+        self._write_current(current)
+
+        # Readers of the old generation notice CURRENT changed and reload
+        for name in ("ids.npy", "sigs.npy", "keys.npy", "rows.npy", "delta", "deleted"):
+            try:
+                os.remove(self._path(name, old_generation))
+            except OSError:
+                pass
+        self._reset(None)
+        self._refresh()
+        print(f"LSH index compacted: {len(ids)} documents")
+
+    def compact(self):
+        with self._lock, self._write_lock():
+            if self._refresh():
+                self._compact()
+
+def rebuild() -> int:
+    """Indexes every fingerprinted document from the database."""
+    from app.db.session import SessionLocal
+    from app.models.document import Document
+    index = LshIndex.get_instance()
+    db = SessionLocal()
+    count = 0
+    try:
+        for document_id, meta in db.query(Document.id, Document.meta_data).yield_per(1000):
+            signature = (meta or {}).get("minhash_signature")
+            if signature:
+                index.add(document_id, signature)
+                count += 1
+    finally:
+        db.close()
+    index.compact()
+    return count
+
+def main(argv: List[str]) -> int:
+    if argv[:1] == ["rebuild"]:
+        print(f"Indexed {rebuild()} documents")
+        return 0
+    if argv[:1] == ["stats"]:
+        print(LshIndex.get_instance().stats())
+        return 0
+    print("Usage: python -m app.core.lsh_index rebuild|stats")
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,4 +1,8 @@
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Tuple
+from app.core.config import settings
+from app.core.registry import ManagedModel
+from app.core.batching import MicroBatcher
+from app.core.embedding_cache import EmbeddingCache
 # from sentence_transformers import SentenceTransformer
 
 class Chunker:
@@ -14,30 +18,71 @@ class Chunker:
         """
         if not text:
             return []
-        
-        chunks = []
+        return list(self.iter_chunks([text]))
+
+    def iter_chunks(self, pieces: Iterable[str]) -> Iterator[str]:
+        """
+        Streaming `chunk_text`: chunks of text arriving in pieces (e.g. pages),
+        identical to chunking the joined text. Only the text not yet chunked
+        is kept, so memory doesn't grow with the document.
+        """
+        stride = self.chunk_size - self.overlap
+        buffer = ""
         start = 0
-        text_len = len(text)
-
-        while start < text_len:
-            end = min(start + self.chunk_size, text_len)
-            chunk = text[start:end]
-            
-            # Adjust end to nearest whitespace to avoid splitting words
-            if end < text_len:
-                last_space = chunk.rfind(' ')
-                if last_space != -1:
-                    end = start + last_space + 1
-                    chunk = text[start:end]
-            
-            chunks.append(chunk.strip())
-            start += self.chunk_size - self.overlap
-            
-        return chunks
-
-class EmbeddingModel:
+        for piece in pieces:
+            buffer += piece
+            # A chunk is final once text past its end has arrived
+            while start + self.chunk_size < len(buffer):
+                yield self._chunk_at(buffer, start, len(buffer))
+                start += stride
+            buffer = buffer[start:]
+            start = 0
+
+        while start < len(buffer):
+            yield self._chunk_at(buffer, start, len(buffer))
+            start += stride
+
+    def _chunk_at(self, text: str, start: int, text_len: int) -> str:
+        end = min(start + self.chunk_size, text_len)
+        chunk = text[start:end]
+
+        # Adjust end to nearest whitespace to avoid splitting words
+        if end < text_len:
+            last_space = chunk.rfind(' ')
+            if last_space != -1:
+                end = start + last_space + 1
+                chunk = text[start:end]
+
+        return chunk.strip()
+
+def text_windows(text: str, window_chars: int, stride: int) -> List[Tuple[int, int]]:
+    """
+    Splits text into (start, end) spans of at most `window_chars` characters,
+    starting every `stride` characters and ending on whitespace where possible.
+    Spans are offsets into the original text so reports can highlight them.
+    """
+    spans = []
+    start = 0
+    text_len = len(text)
+
+    while start < text_len:
+        end = min(start + window_chars, text_len)
+        if end < text_len:
+            last_space = text.rfind(' ', start, end)
+            if last_space > start:
+                end = last_space + 1
+        if text[start:end].strip():
+            spans.append((start, end))
+        if end == text_len:
+            break
+        start = min(start + stride, end)
+
+    return spans
+
+class EmbeddingModel(ManagedModel):
     _instance = None
     _model = None
+    registry_name = "embedding"
 
     @classmethod
     def get_instance(cls):
@@ -49,20 +94,72 @@ class EmbeddingModel:
         self.model_name = model_name
         # Do NOT load model here to prevent blocking startup
         # self._model is already None from class attribute
+        self.batcher = MicroBatcher(self._encode_batch, name="embedding-batcher")
+        self._cache = None
+
+    def _load(self):
+        if settings.INFERENCE_BACKEND == "onnx":
+            from app.core import onnx_backend
+            model = onnx_backend.load(
+                "embedding", self.model_name,
+                lambda directory: onnx_backend.build_sentence_encoder(self._load_torch(), directory)
+            )
+            if model is not None:
+                return model
+        return self._load_torch()
+
+    def _load_torch(self):
+        print(f"Lazy loading embedding model: {self.model_name}...")
+        try:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(self.model_name)
+            print("Model loaded successfully.")
+            return model
+        except Exception as e:
+            print(f"CRITICAL ERROR: Failed to load ML model: {e}")
+            # Fallback or re-raise? For now, let's re-raise but log it.
+            raise e
+
+    def warm_up(self):
+        self.encode(["warm up"])
+
+    @property
+    def cache(self) -> Optional[EmbeddingCache]:
+        if not settings.EMBEDDING_CACHE_ENABLED:
+            return None
+        if self._cache is None:
+            self._cache = EmbeddingCache(self.model_name)
+        return self._cache
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """
+        Encodes texts, reusing cached vectors of chunks seen before (in any
+        document). With EMBEDDING_MICRO_BATCHING, requests from concurrent
+        jobs in this process are merged into shared forward passes.
+        """
+        from app.core import inference_server
+        if inference_server.enabled():
+            return inference_server.get_client().call("embedding", "encode", texts, batch_size)
+
+        cache = self.cache
+        if cache is None:
+            return self._encode_uncached(texts, batch_size)
+
+        vectors = cache.get_many(texts)
+        # Unique misses only: boilerplate often repeats within a document
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            encoded = self._encode_uncached(missing, batch_size)
+            cache.put_many(missing, encoded)
+            by_text = dict(zip(missing, encoded))
+            vectors = [vector if vector is not None else by_text[text] for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def _encode_uncached(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        if settings.EMBEDDING_MICRO_BATCHING and batch_size is None:
+            return self.batcher.run(texts)
+        return self._encode_batch(texts, batch_size)
 
-    def encode(self, texts: List[str]) -> List[List[float]]:
-        if self._model is None:
-            print(f"Lazy loading embedding model: {self.model_name}...")
-            try:
-                import gc
-                gc.collect() # Free up memory before loading
-                
-                from sentence_transformers import SentenceTransformer
-                self._model = SentenceTransformer(self.model_name)
-                print("Model loaded successfully.")
-            except Exception as e:
-                print(f"CRITICAL ERROR: Failed to load ML model: {e}")
-                # Fallback or re-raise? For now, let's re-raise but log it.
-                raise e
-            
-        return self._model.encode(texts).tolist()
+    def _encode_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        model = self.load()
+        return model.encode(texts, batch_size=batch_size or settings.EMBEDDING_BATCH_SIZE).tolist()
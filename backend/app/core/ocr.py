@@ -0,0 +1,175 @@
+"""
+OCR fallback for scanned documents. PDF pages without a text layer are
+rasterized with pdf2image (poppler's pdftoppm) at OCR_DPI and read with
+tesseract. Both run as external programs, so a thread pool of OCR_WORKERS
+driving them is a pool of that many tesseract processes, and it also works in
+daemonic Celery workers, which can't start a multiprocessing pool. Results are
+cached per page image hash, so re-uploads and reprocessing skip tesseract.
+"""
+import os
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional
+from app.core.config import settings
+
+class OcrCache:
+    """OCR text keyed by a hash of the page pixels and language, one file per page."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.OCR_CACHE_DIR
+
+    @staticmethod
+    def key(image) -> str:
+        digest = hashlib.sha256(f"{settings.OCR_LANG}\0{image.mode}\0{image.size}\0".encode("utf-8"))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, text: str):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Several workers may OCR the same page: each writes its own temp file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"OCR cache write failed: {e}")
+
+def ocr_image(image) -> str:
+    cache = OcrCache()
+    key = cache.key(image)
+    text = cache.get(key)
+    if text is None:
+        import pytesseract
+        text = pytesseract.image_to_string(image, lang=settings.OCR_LANG, timeout=settings.OCR_PAGE_TIMEOUT)
+        cache.put(key, text)
+    return text
+
+def ocr_images(images: List) -> List[str]:
+    """OCR text of each image (e.g. the frames of a TIFF), run across the pool."""
+    return list(_executor().map(_ocr_image_safely, images))
+
+def ocr_pdf_page(file_path: str, index: int) -> str:
+    image = _rasterize(file_path, index)
+    return ocr_image(image) if image is not None else ""
+
+def fill_scanned_pages(file_path: str, pages: Iterable[str]) -> Iterator[str]:
+    """
+    Passes the page texts of a PDF through in order, replacing pages that
+    have no text but do have images with their OCR text. At most two pages
+    per OCR worker are in flight and at most OCR_MAX_PAGES pages of one
+    document are OCRed, so a long scan can't hold a worker indefinitely.
+    """
+    if not settings.OCR_ENABLED:
+        yield from pages
+        return
+
+    reader = None
+    budget = settings.OCR_MAX_PAGES
+    max_in_flight = 2 * _workers()
+    pending = deque() # (future or None, text)
+    in_flight = 0
+    try:
+        for index, text in enumerate(pages):
+            future = None
+            if not text.strip() and _unavailable is None:
+                if reader is None:
+                    from pypdf import PdfReader
+                    reader = PdfReader(file_path)
+                if _has_images(reader.pages[index]):
+                    if budget > 0:
+                        future = _executor().submit(_ocr_page_safely, file_path, index)
+                        in_flight += 1
+                    elif budget == 0:
+                        print(f"OCR limit of {settings.OCR_MAX_PAGES} pages reached for {file_path}. Remaining scanned pages are skipped.")
+                    budget -= 1
+            pending.append((future, text))
+
+            while pending and (pending[0][0] is None or in_flight >= max_in_flight):
+                future, text = pending.popleft()
+                if future is not None:
+                    in_flight -= 1
+                    text = future.result()
+                yield text
+        while pending:
+            future, text = pending.popleft()
+            yield future.result() if future is not None else text
+    finally:
+        # Consumer stopped early (or failed): don't leave pages queued
+        for future, _ in pending:
+            if future is not None:
+                future.cancel()
+
+def _has_images(page) -> bool:
+    # Scanners put each page in an image XObject; truly blank pages have none
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources else None
+    if not xobjects:
+        return False
+    return any(
+        xobject.get_object().get("/Subtype") in ("/Image", "/Form")
+        for xobject in xobjects.get_object().values()
+    )
+
+def _rasterize(file_path: str, index: int):
+    from pdf2image import convert_from_path
+    images = convert_from_path(
+        file_path, dpi=settings.OCR_DPI, first_page=index + 1, last_page=index + 1,
+        grayscale=True, timeout=settings.OCR_PAGE_TIMEOUT
+    )
+    return images[0] if images else None
+
+# Set when pdf2image, poppler or tesseract is missing, so OCR isn't retried per page
+_unavailable: Optional[str] = None
+
+def _ocr_page_safely(file_path: str, index: int) -> str:
+    return _safely(ocr_pdf_page, file_path, index, what=f"page {index + 1} of {file_path}")
+
+def _ocr_image_safely(image) -> str:
+    return _safely(ocr_image, image, what="image")
+
+def _safely(fn, *args, what: str) -> str:
+    global _unavailable
+    if _unavailable is not None:
+        return ""
+    try:
+        return fn(*args)
+    except Exception as e:
+        if _is_missing_dependency(e):
+            _unavailable = str(e)
+            print(f"OCR unavailable ({e}). Scanned pages will have no text.")
+        else:
+            print(f"OCR Error on {what}: {e}")
+        return ""
+
+def _is_missing_dependency(e: Exception) -> bool:
+    return isinstance(e, ImportError) or type(e).__name__ in ("TesseractNotFoundError", "PDFInfoNotInstalledError")
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+def _workers() -> int:
+    return max(settings.OCR_WORKERS or os.cpu_count() or 1, 1)
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool, _pool_pid
+    with _pool_lock:
+        # Pool threads don't survive fork: forked workers create their own
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="ocr")
+            _pool_pid = os.getpid()
+        return _pool
@@ -129,6 +129,18 @@ class PDFGenerator:
             elements.append(t)
             elements.append(Spacer(1, 0.5 * inch))
 
+            # --- Near-Duplicate Section (LSH estimate, no chunk-level search) ---
+            near_duplicate = self.scan.report_data.get('near_duplicate_of')
+            if near_duplicate:
+                elements.append(Paragraph("Near-Duplicate Document", self.styles['SectionHeader']))
+                elements.append(Paragraph(
+                    f"<b>Copy of Document {near_duplicate['source_doc_id']}</b><br/>"
+                    f"Estimated similarity: {near_duplicate['estimated_similarity'] * 100:.1f}% "
+                    f"<font color='gray' size='9'>(MinHash estimate, no chunk-by-chunk search was run)</font>",
+                    self.styles['NormalText']
+                ))
+                elements.append(Spacer(1, 0.2 * inch))
+
             # --- Web Matches Section ---
             web_matches = self.scan.report_data.get('ai_detection', {}).get('details', {}).get('web_matches', [])
             if web_matches:
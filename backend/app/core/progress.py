@@ -0,0 +1,92 @@
+import time
+import threading
+from typing import Callable, Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.scan import Scan
+
+class ProgressReporter:
+    """
+    Keeps a scan's progress in memory and writes it to the DB at most once
+    per `min_interval` seconds, using its own short-lived session so progress
+    writes never flush or commit the scan's working session. An update held
+    back by the interval is written by a timer once the interval has passed,
+    so a long stage shows its own step rather than the one before it.
+    """
+
+    def __init__(
+        self,
+        scan_id: int,
+        session_factory: Optional[Callable[[], Session]] = None,
+        min_interval: Optional[float] = None
+    ):
+        self.scan_id = scan_id
+        self.session_factory = session_factory or SessionLocal
+        self.min_interval = settings.PROGRESS_WRITE_INTERVAL if min_interval is None else min_interval
+        self.progress = 0
+        self.message = None
+        self._dirty = False
+        self._closed = False
+        self._last_write = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        # Held for a whole write, so no write is in flight once close() returns
+        self._write_lock = threading.Lock()
+
+    def update(self, progress: int, message: str):
+        with self._lock:
+            if self._closed:
+                return
+            self.progress = progress
+            self.message = message
+            self._dirty = True
+            now = time.monotonic()
+            due = self._last_write is None or now - self._last_write >= self.min_interval
+            if not due and self._timer is None:
+                self._timer = threading.Timer(self._last_write + self.min_interval - now, self._flush_pending)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def _flush_pending(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Writes the latest progress if it hasn't been written yet."""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty or self._closed:
+                    return
+                progress, message = self.progress, self.message
+                self._dirty = False
+                self._last_write = time.monotonic()
+
+            db = self.session_factory()
+            try:
+                db.execute(
+                    update(Scan)
+                    .where(Scan.id == self.scan_id)
+                    .values(progress=progress, current_step=message)
+                )
+                db.commit()
+            except Exception as e:
+                print(f"Failed to update progress: {e}")
+            finally:
+                db.close()
+
+    def close(self):
+        """
+        Drops any unwritten progress. Called once the scan's final state is
+        committed so a late write can't overwrite it.
+        """
+        with self._write_lock, self._lock:
+            self._closed = True
+            self._dirty = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
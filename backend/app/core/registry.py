@@ -0,0 +1,302 @@
+import gc
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (0 if it can't be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+def memory_breakdown() -> Dict[str, float]:
+    """
+    This process's memory in MB, split into pages shared with other processes
+    (e.g. model weights inherited copy-on-write from a preloading parent) and
+    private pages. Empty if /proc/self/smaps_rollup can't be read.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) # kB
+    except OSError:
+        return {}
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1),
+        "private_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+    }
+
+class ManagedModel:
+    """
+    Base class for lazily loaded model wrappers.
+    Subclasses implement `_load()` and call `load()` to get the underlying
+    model; the ModelRegistry sees every load and use, so it can report memory
+    cost and evict idle models. Callers should keep the object returned by
+    `load()` in a local variable: an eviction only drops the wrapper's
+    reference and doesn't break inference already in flight.
+    """
+    registry_name: Optional[str] = None
+    _model = None
+
+    def _load(self) -> Any:
+        raise NotImplementedError
+
+    def load(self) -> Any:
+        model = self._model
+        if model is None:
+            model = ModelRegistry.get_instance()._load_model(self)
+        ModelRegistry.get_instance().touch(self.registry_name)
+        return model
+
+    def unload(self):
+        self._model = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def warm_up(self):
+        """Loads the model and runs a tiny inference so first requests are fast."""
+        self.load()
+
+class _Entry:
+    def __init__(self, name: str, factory: Callable[[], ManagedModel]):
+        self.name = name
+        self.factory = factory
+        self.rss_bytes = 0
+        self.load_seconds = 0.0
+        self.loaded_at: Optional[float] = None
+        self.last_used: Optional[float] = None
+        self.load_count = 0
+
+class ModelRegistry:
+    """
+    Process-wide registry of the ML models (embedding, perplexity, AI
+    classifier, LLM). Models load lazily on first use or eagerly through
+    `warm_up`, and idle models are evicted least-recently-used first when
+    MODEL_MEMORY_LIMIT_MB is exceeded or after MODEL_IDLE_TIMEOUT seconds.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+                    cls._instance._register_defaults()
+        return cls._instance
+
+    def __init__(self):
+        # Ordered least to most recently used
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_locks: Dict[Optional[str], threading.Lock] = {}
+        self._reaper: Optional[threading.Thread] = None
+
+    def _register_defaults(self):
+        def embedding():
+            from app.core.ml import EmbeddingModel
+            return EmbeddingModel.get_instance()
+
+        def perplexity():
+            from app.core.analytics import PerplexityAnalyzer
+            return PerplexityAnalyzer.get_instance()
+
+        def ai_classifier():
+            from app.core.classifier import AIClassifier
+            return AIClassifier.get_instance()
+
+        def llm():
+            from app.core.llm_checker import LLMChecker
+            return LLMChecker.get_instance()
+
+        self.register("embedding", embedding)
+        self.register("perplexity", perplexity)
+        self.register("ai_classifier", ai_classifier)
+        self.register("llm", llm)
+
+    def register(self, name: str, factory: Callable[[], ManagedModel]):
+        with self._lock:
+            self._entries[name] = _Entry(name, factory)
+
+    def names(self) -> List[str]:
+        return list(self._entries.keys())
+
+    def get(self, name: str) -> ManagedModel:
+        """
+        Returns the named model wrapper with its model loaded, or a proxy to
+        the shared inference server when INFERENCE_SERVER_SOCKET is set.
+        """
+        from app.core import inference_server
+        if inference_server.enabled():
+            return inference_server.RemoteModel(name)
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"Unknown model: {name}")
+        wrapper = entry.factory()
+        wrapper.load()
+        return wrapper
+
+    def is_loaded(self, name: str) -> bool:
+        """Whether the named model is loaded in this process, without loading it."""
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"Unknown model: {name}")
+        return entry.factory().is_loaded
+
+    def touch(self, name: Optional[str]):
+        if name is None:
+            return
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.last_used = time.time()
+                self._entries.move_to_end(name)
+
+    def _load_model(self, wrapper: ManagedModel) -> Any:
+        name = wrapper.registry_name
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Only loads of the same model wait on each other
+        with load_lock:
+            if wrapper._model is not None:
+                return wrapper._model
+
+            entry = self._entries.get(name)
+            with self._lock:
+                self._make_room(exclude=name, expected_bytes=entry.rss_bytes if entry else 0)
+
+            gc.collect() # Free up memory before loading
+            rss_before = current_rss_bytes()
+            started = time.perf_counter()
+            model = wrapper._load()
+            wrapper._model = model
+
+            if entry is not None and model is not None:
+                with self._lock:
+                    entry.load_seconds = round(time.perf_counter() - started, 2)
+                    entry.rss_bytes = max(current_rss_bytes() - rss_before, 0)
+                    entry.loaded_at = entry.last_used = time.time()
+                    entry.load_count += 1
+                    self._entries.move_to_end(name)
+                print(f"Loaded model {name} in {entry.load_seconds}s (+{entry.rss_bytes / 2**20:.0f} MB RSS)")
+                self._start_reaper()
+            return model
+
+    def _make_room(self, exclude: Optional[str], expected_bytes: int):
+        """Evicts least recently used models until the memory budget fits."""
+        limit = settings.MODEL_MEMORY_LIMIT_MB * 2**20
+        if limit <= 0:
+            return
+        for entry in list(self._entries.values()):
+            if current_rss_bytes() + expected_bytes <= limit:
+                return
+            if entry.name != exclude:
+                self.unload(entry.name)
+
+    def unload(self, name: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.loaded_at is None:
+                return False
+            wrapper = entry.factory()
+            if not wrapper.is_loaded:
+                entry.loaded_at = None
+                return False
+            wrapper.unload()
+            entry.loaded_at = None
+            gc.collect()
+            print(f"Evicted model {name}")
+            return True
+
+    def evict_idle(self, max_idle_seconds: Optional[float] = None) -> List[str]:
+        """Unloads models that haven't been used for `max_idle_seconds`."""
+        max_idle = settings.MODEL_IDLE_TIMEOUT if max_idle_seconds is None else max_idle_seconds
+        if max_idle <= 0:
+            return []
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for entry in list(self._entries.values()):
+                if entry.loaded_at is not None and now - (entry.last_used or 0) >= max_idle:
+                    if self.unload(entry.name):
+                        evicted.append(entry.name)
+        return evicted
+
+    def _start_reaper(self):
+        if settings.MODEL_IDLE_TIMEOUT <= 0 or (self._reaper and self._reaper.is_alive()):
+            return
+
+        def reap():
+            while True:
+                time.sleep(max(settings.MODEL_IDLE_TIMEOUT / 4, 1))
+                self.evict_idle()
+
+        self._reaper = threading.Thread(target=reap, name="model-reaper", daemon=True)
+        self._reaper.start()
+
+    def warm_up(self, names: Optional[List[str]] = None, run_inference: Optional[bool] = None) -> Dict[str, float]:
+        """
+        Eagerly loads the given models (default: MODEL_PRELOAD) and, if
+        enabled, runs a tiny inference through each. Returns seconds per model.
+        """
+        from app.core import inference_server
+        if inference_server.enabled():
+            # Models live in the inference server process
+            return {}
+        if names is None:
+            names = self.preload_names()
+        run_inference = settings.MODEL_WARMUP if run_inference is None else run_inference
+        timings = {}
+        for name in names:
+            started = time.perf_counter()
+            try:
+                wrapper = self.get(name)
+                if run_inference:
+                    wrapper.warm_up()
+            except Exception as e:
+                print(f"Warm-up failed for {name}: {e}")
+                continue
+            timings[name] = round(time.perf_counter() - started, 2)
+            print(f"Warmed up {name} in {timings[name]}s")
+        return timings
+
+    def preload_names(self) -> List[str]:
+        value = settings.MODEL_PRELOAD.strip()
+        if value == "all":
+            return self.names()
+        return [name.strip() for name in value.split(",") if name.strip()]
+
+    def report(self) -> Dict[str, Any]:
+        now = time.time()
+        models = []
+        with self._lock:
+            for entry in self._entries.values():
+                loaded = entry.loaded_at is not None
+                models.append({
+                    "name": entry.name,
+                    "loaded": loaded,
+                    "rss_mb": round(entry.rss_bytes / 2**20, 1) if loaded else 0.0,
+                    "load_seconds": entry.load_seconds,
+                    "load_count": entry.load_count,
+                    "idle_seconds": round(now - entry.last_used, 1) if loaded and entry.last_used else None,
+                })
+        return {
+            "process_rss_mb": round(current_rss_bytes() / 2**20, 1),
+            "process_memory": memory_breakdown(),
+            "memory_limit_mb": settings.MODEL_MEMORY_LIMIT_MB,
+            "models": models,
+        }
@@ -0,0 +1,108 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core import index_sequence
+from app.models.document import Document, DocStatus
+from app.models.scan import Scan, ScanStatus
+
+class ScanCache:
+    """
+    Finds a previous completed scan whose result is still valid for a document.
+    A result is reusable when the document text, the indexed corpus and the
+    detector configuration are all unchanged; the key is stored in the scan's
+    report_data under "cache_key".
+    """
+
+    # Scans of the same document checked for a matching key
+    MAX_CANDIDATES = 20
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def corpus_version(self) -> str:
+        """Changes whenever a document is indexed, reprocessed or deleted."""
+        count, max_id, last_update = (
+            self.db.query(
+                func.count(Document.id),
+                func.max(Document.id),
+                func.max(func.coalesce(Document.updated_at, Document.created_at))
+            )
+            .filter(Document.status == DocStatus.INDEXED)
+            .one()
+        )
+        return f"{count}:{max_id}:{last_update}"
+
+    @staticmethod
+    def detector_version(config: Dict[str, Any]) -> str:
+        payload = json.dumps(config, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def build_key(self, doc: Document, detector_config: Dict[str, Any]) -> Dict[str, str]:
+        return {
+            "content_hash": self.content_hash(doc.extracted_text or ""),
+            "corpus_version": self.corpus_version(),
+            "detector_version": self.detector_version(detector_config),
+        }
+
+    def index_high_water_mark(self) -> int:
+        """
+        Index sequence number up to which every indexed chunk is searchable.
+        Chunks written later always carry a higher index_seq, even when their
+        document was uploaded before the mark or is being reindexed.
+        """
+        return index_sequence.high_water_mark(self.db)
+
+    def lookup(self, doc: Document, key: Dict[str, str], exclude_scan_id: Optional[int] = None) -> Optional[Scan]:
+        """A previous scan with exactly this key (same text, corpus and detector)."""
+        return self._find(doc, lambda cached_key: cached_key == key, exclude_scan_id)
+
+    def incremental_base(self, doc: Document, key: Dict[str, str], exclude_scan_id: Optional[int] = None) -> Optional[Scan]:
+        """
+        A previous scan of the same text and detector configuration that
+        recorded an index high-water mark, so only chunks indexed since then
+        need to be searched. (Marks of older scans were document ids and are
+        not comparable, so those scans are never a base.)
+        """
+        def same_text_and_detector(cached_key):
+            return (
+                cached_key.get("content_hash") == key["content_hash"]
+                and cached_key.get("detector_version") == key["detector_version"]
+            )
+
+        scan = self._find(doc, same_text_and_detector, exclude_scan_id)
+        if scan and (scan.report_data or {}).get("index_seq_mark") is not None:
+            return scan
+        return None
+
+    def _find(self, doc: Document, matches_key, exclude_scan_id: Optional[int]) -> Optional[Scan]:
+        query = (
+            self.db.query(Scan)
+            .filter(Scan.document_id == doc.id, Scan.status == ScanStatus.COMPLETED)
+        )
+        if exclude_scan_id is not None:
+            query = query.filter(Scan.id != exclude_scan_id)
+
+        cutoff = None
+        if settings.SCAN_CACHE_TTL_SECONDS > 0:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.SCAN_CACHE_TTL_SECONDS)
+
+        for scan in query.order_by(Scan.id.desc()).limit(self.MAX_CANDIDATES):
+            cached_key = (scan.report_data or {}).get("cache_key")
+            if not cached_key or not matches_key(cached_key):
+                continue
+            if cutoff and scan.created_at:
+                created_at = scan.created_at
+                if created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=timezone.utc)
+                if created_at < cutoff:
+                    continue
+            return scan
+        return None
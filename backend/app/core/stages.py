@@ -0,0 +1,74 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+class Stage:
+    def __init__(self, name: str, func: Callable[..., Any], *args, timeout: Optional[float] = None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.timeout = timeout
+
+class StageResult:
+    def __init__(self, name: str, value: Any = None, error: Optional[Exception] = None, seconds: float = 0.0):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+class StageExecutor:
+    """
+    Runs independent stages concurrently on a thread pool and collects their
+    results. Each stage has its own timeout measured from the start of `run`;
+    a stage that fails or times out yields a StageResult with `error` set
+    instead of raising, so the caller decides how to degrade.
+    Threads can't be interrupted, so a timed-out stage keeps running in the
+    background until it returns; its result is discarded.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+
+    def run(self, stages: List[Stage]) -> Dict[str, StageResult]:
+        if not stages:
+            return {}
+
+        executor = ThreadPoolExecutor(
+            max_workers=self.max_workers or len(stages),
+            thread_name_prefix="stage"
+        )
+        started = time.monotonic()
+        futures = {stage.name: executor.submit(self._timed, stage) for stage in stages}
+        results = {}
+
+        try:
+            for stage in stages:
+                remaining = None
+                if stage.timeout is not None:
+                    remaining = max(stage.timeout - (time.monotonic() - started), 0)
+                try:
+                    results[stage.name] = futures[stage.name].result(timeout=remaining)
+                except FutureTimeoutError:
+                    results[stage.name] = StageResult(
+                        stage.name,
+                        error=TimeoutError(f"Stage '{stage.name}' timed out after {stage.timeout}s"),
+                        seconds=round(time.monotonic() - started, 2)
+                    )
+        finally:
+            # Don't block on stages that timed out
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
+    @staticmethod
+    def _timed(stage: Stage) -> StageResult:
+        started = time.perf_counter()
+        try:
+            value = stage.func(*stage.args)
+            return StageResult(stage.name, value=value, seconds=round(time.perf_counter() - started, 2))
+        except Exception as e:
+            return StageResult(stage.name, error=e, seconds=round(time.perf_counter() - started, 2))
@@ -0,0 +1,60 @@
+import os
+import hashlib
+import tempfile
+from typing import BinaryIO, NamedTuple, Optional
+from app.core.config import settings
+
+class StoredFile(NamedTuple):
+    sha256: str
+    path: str
+    size: int
+
+class UploadStore:
+    """
+    Content-addressed upload storage: a file is stored once under its SHA-256,
+    sharded as <UPLOAD_DIR>/ab/cd/abcd..., so identical uploads share one copy
+    and different files with the same name never overwrite each other.
+    """
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or settings.UPLOAD_DIR
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def save(self, source: BinaryIO) -> StoredFile:
+        """Streams `source` to disk while hashing it, then moves it to its content address."""
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    block = source.read(self.CHUNK_SIZE)
+                    if not block:
+                        break
+                    digest.update(block)
+                    f.write(block)
+                    size += len(block)
+
+            sha256 = digest.hexdigest()
+            path = self.path_for(sha256)
+            if os.path.exists(path):
+                os.remove(tmp_path) # Already stored
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return StoredFile(sha256, path, size)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass # File might already be gone
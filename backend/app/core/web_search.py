@@ -1,11 +1,12 @@
 import logging
 import re
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set
 from bs4 import BeautifulSoup
 from duckduckgo_search import DDGS
 from difflib import SequenceMatcher
 from app.core.crawler import AsyncCrawler
+from app.core.normalize import tokenize
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -99,7 +100,8 @@ class WebSearcher:
         logger.info(f"Scraping {len(urls_to_scrape)} URLs in parallel...")
         scraped_contents = await self.crawler.fetch_multiple(urls_to_scrape)
 
-        # 4. Compare
+        # 4. Compare (the original is tokenized once for all pages)
+        original_words = set(tokenize(text))
         for url, content in scraped_contents.items():
             meta = url_metadata.get(url, {})
             snippet = meta.get("snippet", "")
@@ -107,7 +109,7 @@ class WebSearcher:
             # If scraping failed (empty content), fallback to snippet
             page_text = content if content.strip() else snippet
             
-            similarity = self._calculate_containment(original_text=text, page_text=page_text)
+            similarity = self._calculate_containment(original_words, page_text)
             logger.info(f"URL: {url}, Similarity: {similarity:.4f}")
             
             if similarity > 0.05:
@@ -150,15 +152,14 @@ class WebSearcher:
                 queries.append(s)
         return queries
 
-    def _calculate_containment(self, original_text: str, page_text: str) -> float:
+    def _calculate_containment(self, original_words: Set[str], page_text: str) -> float:
         """
         Calculates Containment Similarity.
         """
         if not page_text:
             return 0.0
             
-        original_words = set(original_text.lower().split())
-        page_words = set(page_text.lower().split())
+        page_words = set(tokenize(page_text))
         
         if not original_words:
             return 0.0
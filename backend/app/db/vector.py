@@ -1,7 +1,7 @@
 # from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from app.core.config import settings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import uuid
 
 class VectorDB:
@@ -9,6 +9,13 @@ class VectorDB:
         self.client = None
         self.collection_name = "plagiascan_chunks"
 
+    # Payload fields that get a Qdrant payload index for server-side filtering
+    INDEXED_PAYLOAD_FIELDS = ("document_id", "index_seq")
+    # Point ids per retrieve request when reading stored vectors back
+    RETRIEVE_BATCH_SIZE = 256
+    # Points per upsert request
+    UPSERT_BATCH_SIZE = 256
+
     def _get_client(self):
         if self.client:
             return self.client
@@ -36,35 +43,174 @@ class VectorDB:
                 collection_name=self.collection_name,
                 vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE)
             )
+        self._ensure_payload_indexes()
 
-    def upsert_chunks(self, document_id: int, chunks: List[str], embeddings: List[List[float]]):
-        client = self._get_client()
-        points = []
-        for i, (chunk, vector) in enumerate(zip(chunks, embeddings)):
-            point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{document_id}_{i}"))
-            points.append(models.PointStruct(
-                id=point_id,
-                vector=vector,
-                payload={
-                    "document_id": document_id,
-                    "chunk_index": i,
-                    "text": chunk
-                }
-            ))
-        
-        client.upsert(
-            collection_name=self.collection_name,
-            points=points
+    def _ensure_payload_indexes(self):
+        """Index payload fields used in search filters (idempotent)"""
+        for field_name in self.INDEXED_PAYLOAD_FIELDS:
+            try:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=models.PayloadSchemaType.INTEGER
+                )
+            except Exception as e:
+                print(f"Failed to create payload index on {field_name}: {e}")
+
+    @staticmethod
+    def _build_filter(
+        must: Optional[Dict[str, Any]] = None,
+        must_not: Optional[Dict[str, Any]] = None
+    ) -> Optional[models.Filter]:
+        """
+        Builds a Qdrant payload filter from {field: value} conditions.
+        A list value matches any of its items and a dict value is a range,
+        e.g. {"document_id": {"gt": 100}}.
+        """
+        def conditions(payload_filter):
+            result = []
+            for key, value in (payload_filter or {}).items():
+                if isinstance(value, dict):
+                    result.append(models.FieldCondition(key=key, range=models.Range(**value)))
+                    continue
+                if isinstance(value, (list, tuple, set)):
+                    match = models.MatchAny(any=list(value))
+                else:
+                    match = models.MatchValue(value=value)
+                result.append(models.FieldCondition(key=key, match=match))
+            return result
+
+        must_conditions = conditions(must)
+        must_not_conditions = conditions(must_not)
+        if not must_conditions and not must_not_conditions:
+            return None
+        return models.Filter(
+            must=must_conditions or None,
+            must_not=must_not_conditions or None
         )
-        print(f"Upserted {len(points)} chunks for document {document_id}")
 
-    def search(self, vector: List[float], limit: int = 5, score_threshold: float = 0.7) -> List[Dict[str, Any]]:
+    def upsert_chunks(
+        self,
+        document_id: int,
+        chunks: List[str],
+        embeddings: List[List[float]],
+        offset: int = 0,
+        index_seq: Optional[int] = None
+    ):
+        """
+        Stores chunks with their vectors; `offset` is the index of the first
+        chunk, so a long document can be upserted a window at a time.
+        `index_seq` is stored on every point for incremental rescans.
+        """
+        client = self._get_client()
+        for start in range(0, len(chunks), self.UPSERT_BATCH_SIZE):
+            points = []
+            for i in range(start, min(start + self.UPSERT_BATCH_SIZE, len(chunks))):
+                chunk_index = offset + i
+                points.append(models.PointStruct(
+                    id=self._point_id(document_id, chunk_index),
+                    vector=embeddings[i],
+                    payload={
+                        "document_id": document_id,
+                        "chunk_index": chunk_index,
+                        "text": chunks[i],
+                        "index_seq": index_seq
+                    }
+                ))
+            
+            client.upsert(
+                collection_name=self.collection_name,
+                points=points
+            )
+        print(f"Upserted {len(chunks)} chunks for document {document_id}")
+
+    def get_chunk_vectors(self, document_id: int, chunks: List[str]) -> List[Optional[List[float]]]:
+        """
+        Reads back the stored vectors of a document's chunks by their
+        deterministic point ids. Returns None for chunks that are missing
+        or whose stored text differs (document re-extracted since indexing).
+        Note: Qdrant stores cosine vectors normalized, which doesn't change scores.
+        """
+        client = self._get_client()
+        vectors: List[Optional[List[float]]] = [None] * len(chunks)
+
+        for start in range(0, len(chunks), self.RETRIEVE_BATCH_SIZE):
+            ids = [
+                self._point_id(document_id, i)
+                for i in range(start, min(start + self.RETRIEVE_BATCH_SIZE, len(chunks)))
+            ]
+            points = client.retrieve(
+                collection_name=self.collection_name,
+                ids=ids,
+                with_payload=True,
+                with_vectors=True
+            )
+            for point in points:
+                i = point.payload.get("chunk_index")
+                if i is None or i >= len(chunks) or point.payload.get("text") != chunks[i]:
+                    continue
+                vectors[i] = list(point.vector)
+
+        return vectors
+
+    def copy_document(self, source_id: int, target_id: int, index_seq: Optional[int] = None) -> int:
+        """
+        Copies a document's stored chunks and vectors to another document id
+        (a duplicate upload), without re-embedding, stamped with `index_seq`.
+        Returns the number of chunks copied.
+        """
         client = self._get_client()
+        query_filter = self._build_filter({"document_id": source_id})
+        copied = 0
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=query_filter,
+                limit=self.RETRIEVE_BATCH_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                client.upsert(
+                    collection_name=self.collection_name,
+                    points=[
+                        models.PointStruct(
+                            id=self._point_id(target_id, point.payload["chunk_index"]),
+                            vector=point.vector,
+                            payload={**point.payload, "document_id": target_id, "index_seq": index_seq}
+                        )
+                        for point in points
+                    ]
+                )
+                copied += len(points)
+            if offset is None:
+                break
+        print(f"Copied {copied} chunks of document {source_id} to document {target_id}")
+        return copied
+
+    def search(
+        self,
+        vector: List[float],
+        limit: int = 5,
+        score_threshold: float = 0.7,
+        must: Optional[Dict[str, Any]] = None,
+        must_not: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Searches for the nearest chunks. `must` / `must_not` are payload filters
+        ({field: value}) applied inside Qdrant, e.g. must_not={"document_id": 3}
+        excludes a document without spending top-k slots on it.
+        """
+        client = self._get_client()
+        query_filter = self._build_filter(must, must_not)
         try:
             # Try using search first (standard API)
             results = client.search(
                 collection_name=self.collection_name,
                 query_vector=vector,
+                query_filter=query_filter,
                 limit=limit,
                 score_threshold=score_threshold
             )
@@ -73,24 +219,93 @@ class VectorDB:
             response = client.query_points(
                 collection_name=self.collection_name,
                 query=vector,
+                query_filter=query_filter,
                 limit=limit,
                 score_threshold=score_threshold,
                 with_payload=True
             )
             results = response.points
 
-        return [
-            {
-                "document_id": hit.payload["document_id"],
-                "chunk_index": hit.payload["chunk_index"],
-                "text": hit.payload["text"],
-                "score": hit.score
-            }
-            for hit in results
-        ]
+        return [self._to_result(hit) for hit in results]
+
+    def search_batch(
+        self,
+        vectors: List[List[float]],
+        limit: int = 5,
+        score_threshold: float = 0.7,
+        batch_size: Optional[int] = None,
+        must: Optional[Dict[str, Any]] = None,
+        must_not: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Searches many vectors using Qdrant's batch endpoints.
+        Vectors are sent in groups of `batch_size` (one round trip per group)
+        and results are returned in the same order as the input vectors.
+        Payload filters work as in `search` and apply to every vector.
+        """
+        if not vectors:
+            return []
+
+        client = self._get_client()
+        query_filter = self._build_filter(must, must_not)
+        batch_size = batch_size or settings.QDRANT_SEARCH_BATCH_SIZE
+        all_results = []
+
+        for start in range(0, len(vectors), batch_size):
+            batch = vectors[start:start + batch_size]
+            try:
+                # Batch search API (older qdrant-client versions)
+                responses = client.search_batch(
+                    collection_name=self.collection_name,
+                    requests=[
+                        models.SearchRequest(
+                            vector=vector,
+                            filter=query_filter,
+                            limit=limit,
+                            score_threshold=score_threshold,
+                            with_payload=True
+                        )
+                        for vector in batch
+                    ]
+                )
+                batch_results = responses
+            except AttributeError:
+                # Universal query API (newer qdrant-client versions)
+                responses = client.query_batch_points(
+                    collection_name=self.collection_name,
+                    requests=[
+                        models.QueryRequest(
+                            query=vector,
+                            filter=query_filter,
+                            limit=limit,
+                            score_threshold=score_threshold,
+                            with_payload=True
+                        )
+                        for vector in batch
+                    ]
+                )
+                batch_results = [response.points for response in responses]
+
+            for results in batch_results:
+                all_results.append([self._to_result(hit) for hit in results])
+
+        return all_results
+
+    @staticmethod
+    def _point_id(document_id: int, chunk_index: int) -> str:
+        return str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{document_id}_{chunk_index}"))
+
+    @staticmethod
+    def _to_result(hit) -> Dict[str, Any]:
+        return {
+            "document_id": hit.payload["document_id"],
+            "chunk_index": hit.payload["chunk_index"],
+            "text": hit.payload["text"],
+            "score": hit.score
+        }
 
     def delete_document(self, document_id: int):
-        """Delete all chunks associated with a document"""
+        """Delete all chunks associated with a document (raises if Qdrant fails)"""
         client = self._get_client()
         try:
             # Create filter for document_id
@@ -112,3 +327,4 @@ class VectorDB:
             print(f"Deleted vectors for document {document_id}")
         except Exception as e:
             print(f"Failed to delete vectors for document {document_id}: {e}")
+            raise
@@ -1,3 +1,6 @@
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
 from app.core.config import settings
 
@@ -8,29 +11,11 @@ app = FastAPI(
 
 @app.on_event("startup")
 def startup_event():
-    import subprocess
-    from app.db.session import engine
-    from app.models import Base
-    
-    try:
-        print("DEBUG: Starting database setup...")
-        
-        # 1. Try Alembic Migrations first (Best Practice)
-        try:
-            print("DEBUG: Running alembic migrations...")
-            subprocess.run(["alembic", "upgrade", "head"], check=True)
-            print("Database migrations completed successfully.")
-        except Exception as e:
-            print(f"Alembic migration failed: {e}")
-            print("DEBUG: Falling back to direct table creation...")
-            
-            # 2. Failsafe: Create tables directly if Alembic failed
-            Base.metadata.create_all(bind=engine)
-            print("DEBUG: Direct table creation completed.")
-            
-    except Exception as e:
-        print(f"Critical Database Setup Failed: {e}")
-        # We don't raise here to allow app to start even if migration fails (e.g. local dev)
+    # Migrations are a separate step (`alembic upgrade head`, the `migrate`
+    # service in docker-compose) instead of a subprocess on every boot.
+    # Heavy stacks (models, Qdrant, parsers) load lazily in the workers;
+    # `python -m app.core.import_profile` shows what startup imports.
+    print(f"API ready {time.perf_counter() - _import_started:.2f}s after app import started")
 
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -61,3 +46,17 @@ def root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+@app.get("/health/models")
+def models_report():
+    from app.core import inference_server
+    from app.core.registry import ModelRegistry
+    if inference_server.enabled():
+        return inference_server.get_client().call("registry", "report")
+    return ModelRegistry.get_instance().report()
+
+@app.get("/health/embedding-cache")
+def embedding_cache_report():
+    from app.core.ml import EmbeddingModel
+    cache = EmbeddingModel.get_instance().cache
+    return cache.stats() if cache else {"enabled": False}
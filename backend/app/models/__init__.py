@@ -1,4 +1,4 @@
 from app.db.session import Base
 from .user import User
-from .document import Document, DocumentChunk
+from .document import Document, DocumentChunk, IndexSequence
 from .scan import Scan, ScanMatch
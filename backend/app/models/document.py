@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Enum, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Enum, DateTime, ForeignKey, Text, JSON, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.session import Base
@@ -23,11 +23,21 @@ class Document(Base):
     status = Column(Enum(DocStatus), default=DocStatus.PENDING)
     extracted_text = Column(Text)
     meta_data = Column(JSON, default={})
+    index_seq = Column(BigInteger, index=True) # Index sequence number of the last write of its chunks
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     user = relationship("User", backref="documents")
 
+class IndexSequence(Base):
+    """Single-row counter of chunk index writes (see app/core/index_sequence.py)."""
+    __tablename__ = "index_sequence"
+
+    id = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+event.listen(IndexSequence.__table__, "after_create", DDL("INSERT INTO index_sequence (id, value) VALUES (1, 0)"))
+
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
     
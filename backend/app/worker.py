@@ -1,9 +1,65 @@
-# Celery removed for local mode
-# from celery import Celery
-# from app.core.config import settings
+import gc
+import os
+import time
+from celery.signals import task_postrun, worker_init, worker_process_init
+from app.core.config import settings
 
-# celery_app = Celery(...)
+# Celery app and queue layout: see app/core/jobs.py
+from app.core.jobs import get_celery_app, PROCESS_DOCUMENT, EMBED_DOCUMENT, INDEX_DOCUMENT, CLONE_DOCUMENT, RUN_SCAN
 
+celery_app = get_celery_app()
+
+_preloaded_before_fork = False
+_memory_logged = False
+
+@worker_init.connect
+def _preload_before_fork(**kwargs):
+    """
+    With MODEL_PRELOAD_BEFORE_FORK, models load and warm up once in the parent
+    worker process; the pool processes forked from it (including ones that
+    replace recycled children) share the weights copy-on-write.
+    """
+    global _preloaded_before_fork
+    if not (settings.MODEL_PRELOAD and settings.MODEL_PRELOAD_BEFORE_FORK):
+        return
+    from app.core.registry import ModelRegistry, memory_breakdown
+    started = time.perf_counter()
+    timings = _warm_up_single_threaded(ModelRegistry.get_instance())
+    # Move everything loaded so far to the permanent generation, so collections
+    # in the children don't write to (and so copy) the shared pages
+    gc.collect()
+    gc.freeze()
+    _preloaded_before_fork = True
+    print(f"Preloaded {timings} in {time.perf_counter() - started:.1f}s before forking: {memory_breakdown()}")
+
+def _warm_up_single_threaded(registry):
+    # Intra-op thread pools started before fork can deadlock the children
+    try:
+        import torch
+    except ImportError:
+        return registry.warm_up()
+    threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        return registry.warm_up()
+    finally:
+        torch.set_num_threads(threads)
+
+@worker_process_init.connect
+def _init_worker_process(**kwargs):
+    # Optional eager model loading (MODEL_PRELOAD / MODEL_WARMUP)
+    if settings.MODEL_PRELOAD and not _preloaded_before_fork:
+        from app.core.registry import ModelRegistry
+        ModelRegistry.get_instance().warm_up()
+
+@task_postrun.connect
+def _log_worker_memory(**kwargs):
+    # Once per worker, after a real task has touched the models
+    global _memory_logged
+    if settings.MODEL_PRELOAD and not _memory_logged:
+        _memory_logged = True
+        from app.core.registry import memory_breakdown
+        print(f"Worker {os.getpid()} memory after first task: {memory_breakdown()}")
 
 from app.db.session import SessionLocal
 from app.models.document import Document, DocStatus
@@ -12,9 +68,40 @@ from app.core.cleaning import TextCleaner
 from app.core.fingerprint import LexicalFingerprint
 from app.core.ml import Chunker, EmbeddingModel
 from app.db.vector import VectorDB
+from app.core.errors import TRANSIENT_ERRORS
+from app.core.checkpoints import CheckpointStore
+from app.core import index_sequence
+from app.core.lsh_index import LshIndex
+
+RETRY_OPTIONS = dict(
+    autoretry_for=TRANSIENT_ERRORS,
+    max_retries=settings.QUEUE_MAX_RETRIES,
+    retry_backoff=settings.QUEUE_RETRY_BACKOFF,
+)
+
+def queue_depth(queue: str) -> int:
+    """Number of jobs waiting in a broker queue (0 if it can't be read)."""
+    if celery_app.conf.task_always_eager:
+        return 0
+    try:
+        with celery_app.connection_for_read() as conn:
+            return conn.default_channel.queue_declare(queue=queue, passive=True).message_count
+    except Exception:
+        return 0
+
+def _wait_for_downstream(task, queue: str):
+    """
+    Backpressure: while the next stage's queue is full, put this job back on
+    its own queue instead of piling more work onto the slower stage.
+    """
+    if queue_depth(queue) >= settings.PIPELINE_MAX_QUEUE_DEPTH:
+        raise task.retry(countdown=settings.PIPELINE_BACKPRESSURE_DELAY, max_retries=None)
 
-# @celery_app.task(name="app.worker.process_document")
-def process_document(document_id: int):
+def _final_attempt(task) -> bool:
+    # Celery stops retrying transient errors once max_retries is reached
+    return task.max_retries is not None and task.request.retries >= task.max_retries
+
+def _run_document_stage(document_id: int, stage, *args, final_attempt: bool = False):
     db = SessionLocal()
     try:
         doc = db.query(Document).filter(Document.id == document_id).first()
@@ -22,74 +109,220 @@ def process_document(document_id: int):
             print(f"Document {document_id} not found")
             return False
 
-        doc.status = DocStatus.PROCESSING
-        db.commit()
-
-        print(f"Extracting text for {doc.filename}...")
         try:
-            # 1. Extraction
-            print(f"DEBUG: Starting extraction for {doc.filename}...")
-            raw_text = TextExtractor.extract(doc.file_path, doc.content_type)
-            print(f"DEBUG: Extraction complete. Length: {len(raw_text)}")
-            
-            cleaned_text = TextCleaner.clean(raw_text)
-            doc.extracted_text = cleaned_text
-            
-            # 2. Lexical Fingerprinting (MinHash)
-            print("DEBUG: Generating fingerprint...")
-            fingerprinter = LexicalFingerprint()
-            signature = fingerprinter.generate_fingerprint(cleaned_text)
-            
-            # Update metadata with signature
-            meta = doc.meta_data or {}
-            meta["minhash_signature"] = signature
-            doc.meta_data = meta
-            
-            # 3. Chunking
-            print("DEBUG: Chunking text...")
-            chunker = Chunker()
-            chunks = chunker.chunk_text(cleaned_text)
-            print(f"DEBUG: Generated {len(chunks)} chunks.")
-            
-            if chunks:
-                # 4. Embedding
-                print("DEBUG: Loading Embedding Model (this might take a while)...")
-                model = EmbeddingModel.get_instance()
-                print("DEBUG: Model loaded. Encoding chunks...")
-                embeddings = model.encode(chunks)
-                print("DEBUG: Encoding complete.")
-                
-                # 5. Indexing
-                print("DEBUG: Indexing to Qdrant...")
-                vdb = VectorDB()
-                vdb.upsert_chunks(doc.id, chunks, embeddings)
-                print("DEBUG: Indexing complete.")
-                
-                doc.status = DocStatus.INDEXED
-            else:
-                print("No text chunks to index.")
-                doc.status = DocStatus.INDEXED 
-                
+            stage(db, doc, *args)
         except Exception as e:
             print(f"Processing failed: {e}")
+            db.rollback()
             doc.status = DocStatus.FAILED
-            doc.meta_data = {"error": str(e)}
+            # Keep the checkpoints: a retry resumes after the last completed stage
+            meta = dict(doc.meta_data or {})
+            meta["error"] = str(e)
+            doc.meta_data = meta
+            transient = isinstance(e, TRANSIENT_ERRORS)
+            if not transient or final_attempt:
+                # Not retried: an index write left in flight would hold scan marks back for good
+                doc.index_seq = None
             import traceback
             traceback.print_exc()
+            if transient:
+                # Let the queue retry the job with backoff
+                db.commit()
+                raise
         
         db.commit()
         return True
     finally:
         db.close()
 
+@celery_app.task(name=PROCESS_DOCUMENT, bind=True, **RETRY_OPTIONS)
+def process_document(self, document_id: int):
+    """Pipeline entry point: extraction stage, then hands off to embedding."""
+    _wait_for_downstream(self, "embedding")
+    return _run_document_stage(document_id, _extract_stage, final_attempt=_final_attempt(self))
+
+@celery_app.task(name=EMBED_DOCUMENT, bind=True, **RETRY_OPTIONS)
+def embed_document(self, document_id: int):
+    _wait_for_downstream(self, "indexing")
+    return _run_document_stage(document_id, _embed_stage, final_attempt=_final_attempt(self))
+
+@celery_app.task(name=INDEX_DOCUMENT, bind=True, **RETRY_OPTIONS)
+def index_document(self, document_id: int):
+    return _run_document_stage(document_id, _index_stage, final_attempt=_final_attempt(self))
+
+@celery_app.task(name=CLONE_DOCUMENT, bind=True, **RETRY_OPTIONS)
+def clone_document(self, document_id: int, source_id: int):
+    """Duplicate upload: reuses the vectors of an identical, indexed document."""
+    return _run_document_stage(document_id, _clone_stage, source_id, final_attempt=_final_attempt(self))
+
+# Every stage skips work it has already checkpointed, so retries and
+# reprocessing resume after the last completed stage and re-running a
+# finished document does nothing.
+
+def _extract_stage(db, doc: Document):
+    checkpoints = CheckpointStore()
+    if checkpoints.is_done(doc, CheckpointStore.INDEXED):
+        doc.status = DocStatus.INDEXED
+        return
+
+    doc.status = DocStatus.PROCESSING
+    db.commit()
+
+    # 1. Extraction
+    if checkpoints.is_done(doc, CheckpointStore.EXTRACTED) and doc.extracted_text is not None:
+        print(f"DEBUG: Reusing extracted text for {doc.filename}.")
+    else:
+        print(f"DEBUG: Starting extraction for {doc.filename}...")
+        # Pages are cleaned as they are extracted; the raw text is never held whole
+        pages = TextExtractor.iter_extract(doc.file_path, doc.content_type)
+        doc.extracted_text = "\n".join(TextCleaner.iter_clean(pages))
+        print(f"DEBUG: Extraction complete. Length: {len(doc.extracted_text)}")
+        checkpoints.mark(doc, CheckpointStore.EXTRACTED)
+        db.commit()
+    
+    # 2. Lexical Fingerprinting (MinHash)
+    if not checkpoints.is_done(doc, CheckpointStore.FINGERPRINTED):
+        print("DEBUG: Generating fingerprint...")
+        fingerprinter = LexicalFingerprint()
+        signature = fingerprinter.generate_fingerprint(doc.extracted_text)
+        
+        # Update metadata with signature
+        meta = dict(doc.meta_data or {})
+        meta["minhash_signature"] = signature
+        doc.meta_data = meta
+        checkpoints.mark(doc, CheckpointStore.FINGERPRINTED)
+        db.commit()
+        _add_to_lsh_index(doc)
+
+    embed_document.delay(doc.id)
+
+def _embed_stage(db, doc: Document):
+    checkpoints = CheckpointStore()
+    if checkpoints.is_done(doc, CheckpointStore.INDEXED):
+        doc.status = DocStatus.INDEXED
+        return
+
+    # Clears FAILED when the queue retries the stage
+    doc.status = DocStatus.PROCESSING
+    db.commit()
+    if checkpoints.is_done(doc, CheckpointStore.EMBEDDED) and checkpoints.embedded_count(doc.id) is not None:
+        index_document.delay(doc.id)
+        return
+
+    # 3. Chunking (streamed to the checkpoint sidecar)
+    count = checkpoints.chunk_count(doc.id) if checkpoints.is_done(doc, CheckpointStore.CHUNKED) else None
+    if count is None:
+        print("DEBUG: Chunking text...")
+        count = checkpoints.save_chunks(doc.id, Chunker().iter_chunks([doc.extracted_text or ""]))
+        checkpoints.mark(doc, CheckpointStore.CHUNKED, count=count)
+        db.commit()
+    print(f"DEBUG: Generated {count} chunks.")
+    
+    if not count:
+        print("No text chunks to index.")
+        checkpoints.mark(doc, CheckpointStore.INDEXED, count=0)
+        checkpoints.clear(doc.id)
+        doc.status = DocStatus.INDEXED
+        return
+
+    # 4. Embedding, a window of chunks at a time, so memory doesn't grow with the document
+    print("DEBUG: Loading Embedding Model (this might take a while)...")
+    model = EmbeddingModel.get_instance()
+    print("DEBUG: Model loaded. Encoding chunks...")
+    windows = checkpoints.iter_chunk_windows(doc.id, settings.PIPELINE_WINDOW_CHUNKS)
+    checkpoints.save_vectors(doc.id, count, (model.encode(window) for window in windows))
+    print("DEBUG: Encoding complete.")
+    if model.cache:
+        stats = model.cache.stats()
+        print(f"DEBUG: Embedding cache hit rate {stats['hit_rate']}, memory {stats['memory']['mb']} MB, disk {stats['disk']['mb']} MB")
+
+    checkpoints.mark(doc, CheckpointStore.EMBEDDED)
+    db.commit()
+
+    index_document.delay(doc.id)
+
+def _index_stage(db, doc: Document):
+    checkpoints = CheckpointStore()
+    if checkpoints.is_done(doc, CheckpointStore.INDEXED):
+        doc.status = DocStatus.INDEXED
+        return
+
+    # Clears FAILED when the queue retries the stage
+    doc.status = DocStatus.PROCESSING
+    db.commit()
+
+    count = checkpoints.embedded_count(doc.id)
+    if count is None:
+        # Sidecar lost (e.g. another host or a wiped volume): redo embedding only
+        print(f"DEBUG: No vector checkpoint for document {doc.id}, re-embedding.")
+        checkpoints.unmark(doc, CheckpointStore.CHUNKED, CheckpointStore.EMBEDDED)
+        db.commit()
+        embed_document.delay(doc.id)
+        return
+
+    # 5. Indexing, a window at a time (point ids are derived from document id and chunk index, so re-upserting is idempotent)
+    print("DEBUG: Indexing to Qdrant...")
+    index_seq = index_sequence.stamp(db, doc)
+    db.commit() # In flight from here on, so scans keep their index mark below it
+    vdb = VectorDB()
+    offset = 0
+    for chunks, vectors in checkpoints.iter_embedded(doc.id, settings.PIPELINE_WINDOW_CHUNKS):
+        vdb.upsert_chunks(doc.id, chunks, vectors.tolist(), offset=offset, index_seq=index_seq)
+        offset += len(chunks)
+    print("DEBUG: Indexing complete.")
+    
+    checkpoints.mark(doc, CheckpointStore.INDEXED, count=count)
+    doc.status = DocStatus.INDEXED
+    db.commit()
+    checkpoints.clear(doc.id)
+
+def _clone_stage(db, doc: Document, source_id: int):
+    # Text and fingerprint were copied on upload; only the vectors are left
+    checkpoints = CheckpointStore()
+    if checkpoints.is_done(doc, CheckpointStore.INDEXED):
+        doc.status = DocStatus.INDEXED
+        return
+
+    doc.status = DocStatus.PROCESSING
+    db.commit()
+    _add_to_lsh_index(doc)
+
+    source = db.query(Document).filter(Document.id == source_id).first()
+    indexed = ((source.meta_data or {}).get("checkpoints") or {}).get(CheckpointStore.INDEXED) if source else None
+    copied = None
+    if indexed is not None:
+        index_seq = index_sequence.stamp(db, doc)
+        db.commit()
+        copied = VectorDB().copy_document(source_id, doc.id, index_seq=index_seq)
+    if copied is None or copied != indexed.get("count"):
+        # Source deleted or reprocessed meanwhile: embed the copied text instead
+        print(f"DEBUG: Can't reuse the vectors of document {source_id}, embedding document {doc.id}.")
+        embed_document.delay(doc.id)
+        return
+
+    checkpoints.mark(doc, CheckpointStore.CHUNKED, count=copied)
+    checkpoints.mark(doc, CheckpointStore.EMBEDDED)
+    checkpoints.mark(doc, CheckpointStore.INDEXED, count=copied)
+    doc.status = DocStatus.INDEXED
+
+def _add_to_lsh_index(doc: Document):
+    # Near-duplicate index for scans; a failed update only costs the scan its shortcut
+    signature = (doc.meta_data or {}).get("minhash_signature")
+    if not settings.LSH_ENABLED or not signature:
+        return
+    try:
+        LshIndex.get_instance().add(doc.id, signature)
+    except (OSError, ValueError) as e:
+        print(f"Failed to add document {doc.id} to the LSH index: {e}")
+
 from app.core.detection import DetectionEngine
 
-# # @celery_app.task(name="app.worker.run_scan_task")
-def run_scan_task(scan_id: int):
+@celery_app.task(name=RUN_SCAN, **RETRY_OPTIONS)
+def run_scan_task(scan_id: int, force: bool = False):
     db = SessionLocal()
     try:
         engine = DetectionEngine(db)
-        engine.run_scan(scan_id)
+        engine.run_scan(scan_id, force=force)
         return True
     finally:
         db.close()
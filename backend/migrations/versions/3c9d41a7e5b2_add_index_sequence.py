@@ -0,0 +1,35 @@
+"""Add index sequence
+
+Revision ID: 3c9d41a7e5b2
+Revises: 1712ce2ef7a6
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9d41a7e5b2'
+down_revision: Union[str, None] = '1712ce2ef7a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('index_seq', sa.BigInteger(), nullable=True))
+    op.create_index(op.f('ix_documents_index_seq'), 'documents', ['index_seq'], unique=False)
+    op.create_table('index_sequence',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO index_sequence (id, value) VALUES (1, 0)")
+
+
+def downgrade() -> None:
+    op.drop_table('index_sequence')
+    op.drop_index(op.f('ix_documents_index_seq'), table_name='documents')
+    op.drop_column('documents', 'index_seq')
@@ -1,19 +1,115 @@
+import os
+import pytest
 from unittest.mock import patch
+from app.core.config import settings
+from app.models.document import Document, DocStatus
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path):
+    with patch.object(settings, "UPLOAD_DIR", str(tmp_path)):
+        yield tmp_path
+
+def _auth_headers(client, email="uploader@example.com"):
+    client.post("/api/v1/auth/register", params={"email": email, "password": "password123"})
+    login_res = client.post("/api/v1/auth/login", data={"username": email, "password": "password123"})
+    return {"Authorization": f"Bearer {login_res.json()['access_token']}"}
 
 def test_upload_file(client):
-    # Mock Celery task to avoid actual execution
-    with patch("app.worker.process_document.delay") as mock_task:
+    # Mock the job queue to avoid actual execution
+    with patch("app.api.v1.endpoints.documents.enqueue") as mock_enqueue:
         file_content = b"This is a test document."
         files = {"file": ("test.txt", file_content, "text/plain")}
         
-        response = client.post("/api/v1/documents/", files=files)
+        response = client.post("/api/v1/documents/", files=files, headers=_auth_headers(client))
         
         assert response.status_code == 200
         data = response.json()
         assert "document_id" in data
         assert data["status"] == "pending"
         
-        mock_task.assert_called_once()
+        mock_enqueue.assert_called_once_with("app.worker.process_document", data["document_id"])
+
+def test_initiate_scan_enqueues_job(client):
+    headers = _auth_headers(client, "scanner@example.com")
+    with patch("app.api.v1.endpoints.documents.enqueue"):
+        files = {"file": ("scan.txt", b"Text to scan.", "text/plain")}
+        document_id = client.post("/api/v1/documents/", files=files, headers=headers).json()["document_id"]
+
+    with patch("app.api.v1.endpoints.scans.enqueue") as mock_enqueue:
+        response = client.post("/api/v1/scans/", json={"document_id": document_id, "force": True}, headers=headers)
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "queued"
+        mock_enqueue.assert_called_once_with("app.worker.run_scan_task", response.json()["scan_id"], True)
+
+def test_identical_upload_reuses_processed_document(client, db, upload_dir):
+    headers = _auth_headers(client, "dedup@example.com")
+    files = {"file": ("essay.txt", b"Same essay, submitted twice.", "text/plain")}
+    with patch("app.api.v1.endpoints.documents.enqueue"):
+        first_id = client.post("/api/v1/documents/", files=files, headers=headers).json()["document_id"]
+    first = db.query(Document).get(first_id)
+    assert first.file_path.startswith(str(upload_dir / first.file_hash[:2] / first.file_hash[2:4]))
+
+    # Processed: the next identical upload is cloned instead of processed again
+    first.status = DocStatus.INDEXED
+    first.extracted_text = "Same essay, submitted twice."
+    first.meta_data = {"minhash_signature": [1, 2, 3], "checkpoints": {"indexed": {"count": 1}}}
+    db.commit()
+
+    with patch("app.api.v1.endpoints.documents.enqueue") as mock_enqueue:
+        files = {"file": ("renamed.txt", b"Same essay, submitted twice.", "text/plain")}
+        second_id = client.post("/api/v1/documents/", files=files, headers=headers).json()["document_id"]
+        mock_enqueue.assert_called_once_with("app.worker.clone_document", second_id, first_id)
+
+    second = db.query(Document).get(second_id)
+    assert (second.file_path, second.file_hash) == (first.file_path, first.file_hash)
+    assert second.extracted_text == first.extracted_text
+    assert second.meta_data["minhash_signature"] == [1, 2, 3]
+    assert set(second.meta_data["checkpoints"]) == {"extracted", "fingerprinted"}
+
+    # The shared file stays until its last document is deleted
+    with patch("app.db.vector.VectorDB"):
+        client.delete(f"/api/v1/documents/{first_id}", headers=headers)
+        assert os.path.exists(second.file_path)
+        client.delete(f"/api/v1/documents/{second_id}", headers=headers)
+        assert not os.path.exists(second.file_path)
+
+def test_forced_reprocess_removes_indexed_chunks(client, db):
+    headers = _auth_headers(client, "reprocess@example.com")
+    with patch("app.api.v1.endpoints.documents.enqueue"):
+        files = {"file": ("draft.txt", b"First draft.", "text/plain")}
+        document_id = client.post("/api/v1/documents/", files=files, headers=headers).json()["document_id"]
+    doc = db.query(Document).get(document_id)
+    doc.status, doc.index_seq = DocStatus.INDEXED, 7
+    doc.meta_data = {"checkpoints": {"indexed": {"count": 12}}}
+    db.commit()
+
+    from qdrant_client import QdrantClient
+    from app.db.vector import VectorDB
+    vdb = VectorDB()
+    vdb.client = QdrantClient(":memory:")
+    vdb._ensure_collection()
+    vector = [1.0] + [0.0] * 383
+    vdb.upsert_chunks(document_id, ["old chunk"] * 3, [vector] * 3)
+    unreachable = QdrantClient(url="http://127.0.0.1:1", timeout=1, check_compatibility=False) # Connection refused
+
+    with patch("app.api.v1.endpoints.documents.enqueue") as mock_enqueue:
+        with patch.object(VectorDB, "_get_client", return_value=unreachable):
+            response = client.post(f"/api/v1/documents/{document_id}/reprocess?force=true", headers=headers)
+        assert response.status_code == 503
+        mock_enqueue.assert_not_called()
+        db.refresh(doc)
+        assert doc.index_seq == 7 and "checkpoints" in doc.meta_data
+
+        with patch.object(VectorDB, "_get_client", return_value=vdb.client):
+            response = client.post(f"/api/v1/documents/{document_id}/reprocess?force=true", headers=headers)
+        assert response.status_code == 200
+        mock_enqueue.assert_called_once_with("app.worker.process_document", document_id)
+        assert vdb.search(vector, limit=5) == []
+
+    db.refresh(doc)
+    assert doc.status == DocStatus.PENDING and doc.index_seq is None
+    assert "checkpoints" not in doc.meta_data
 
 def test_get_document_404(client):
     response = client.get("/api/v1/documents/9999")
@@ -4,10 +4,15 @@ from app.core.detection import DetectionEngine
 from app.models.scan import Scan, ScanStatus
 from app.models.document import Document
 
+@patch("app.core.detection.ScanCache")
 @patch("app.core.detection.VectorDB")
 @patch("app.core.detection.EmbeddingModel")
 @patch("app.core.detection.Chunker")
-def test_run_scan(mock_chunker_cls, mock_emb_cls, mock_vdb_cls):
+def test_run_scan(mock_chunker_cls, mock_emb_cls, mock_vdb_cls, mock_cache_cls):
+    mock_cache_cls.return_value.lookup.return_value = None # Nothing cached
+    mock_cache_cls.return_value.incremental_base.return_value = None
+    mock_cache_cls.return_value.index_high_water_mark.return_value = 2
+
     # Setup Mocks
     mock_chunker = MagicMock()
     mock_chunker.chunk_text.return_value = ["chunk1", "chunk2"]
@@ -18,8 +23,9 @@ def test_run_scan(mock_chunker_cls, mock_emb_cls, mock_vdb_cls):
     mock_emb_cls.get_instance.return_value = mock_emb
 
     mock_vdb = MagicMock()
+    mock_vdb.get_chunk_vectors.return_value = [None, None] # Not indexed yet
     # Return a match for the first chunk, no match for second
-    mock_vdb.search.side_effect = [
+    mock_vdb.search_batch.return_value = [
         [{"document_id": 2, "text": "match", "score": 0.9}], # Result for chunk1
         [] # Result for chunk2
     ]
@@ -35,10 +41,225 @@ def test_run_scan(mock_chunker_cls, mock_emb_cls, mock_vdb_cls):
     mock_db.query.return_value.filter.return_value.first.return_value = mock_scan
 
     # Run Engine
-    engine = DetectionEngine(mock_db)
+    engine = DetectionEngine(mock_db, session_factory=MagicMock())
     engine.run_scan(1)
 
     # Assertions
     assert mock_scan.status == ScanStatus.COMPLETED
     assert mock_scan.overall_score == 50.0 # 1 out of 2 chunks matched
     assert mock_scan.report_data["matched_chunks"] == 1
+
+    assert mock_scan.report_data["cache_key"] == mock_cache_cls.return_value.build_key.return_value
+    mock_vdb.search_batch.assert_called_once()
+    assert mock_vdb.search_batch.call_args.kwargs["must_not"] == {"document_id": 1}
+    mock_vdb.search.assert_not_called()
+
+@patch("app.core.detection.VectorDB")
+@patch("app.core.detection.EmbeddingModel")
+def test_get_embeddings_reuses_stored_vectors(mock_emb_cls, mock_vdb_cls):
+    mock_emb = MagicMock()
+    mock_emb.encode.return_value = [[0.2]]
+    mock_emb_cls.get_instance.return_value = mock_emb
+
+    mock_vdb = MagicMock()
+    mock_vdb.get_chunk_vectors.return_value = [[0.1], None]
+    mock_vdb_cls.return_value = mock_vdb
+
+    engine = DetectionEngine(MagicMock())
+    embeddings = engine._get_embeddings(1, ["chunk1", "chunk2"])
+
+    assert embeddings == [[0.1], [0.2]]
+    mock_emb.encode.assert_called_once_with(["chunk2"])
+
+def test_progress_reporter_throttles_writes():
+    import time
+    from app.core.progress import ProgressReporter
+
+    session_factory = MagicMock()
+    reporter = ProgressReporter(1, session_factory=session_factory, min_interval=0.5)
+    reporter.update(0, "Initializing scan...") # First update is written immediately
+    reporter.update(10, "Chunking document...")
+    reporter.update(30, "Generating embeddings...")
+    assert session_factory.return_value.commit.call_count == 1
+
+    # The latest pending progress is written once the interval has passed
+    time.sleep(0.7)
+    assert session_factory.return_value.commit.call_count == 2
+    written = session_factory.return_value.execute.call_args.args[0].compile().params
+    assert (written["progress"], written["current_step"]) == (30, "Generating embeddings...")
+
+    reporter.update(90, "Finalizing report...")
+    reporter.close()
+    time.sleep(0.7)
+    reporter.flush() # Dropped after close
+    assert session_factory.return_value.commit.call_count == 2
+
+def test_stage_executor_runs_concurrently_with_timeouts():
+    import time
+    from app.core.stages import Stage, StageExecutor
+
+    def slow(value, delay):
+        time.sleep(delay)
+        return value
+
+    def broken():
+        raise RuntimeError("boom")
+
+    started = time.monotonic()
+    results = StageExecutor().run([
+        Stage("a", slow, "a", 0.2),
+        Stage("b", slow, "b", 0.2),
+        Stage("failing", broken),
+        Stage("too_slow", slow, "c", 5, timeout=0.1),
+    ])
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 1 # Slowest finished stage, not the sum
+    assert results["a"].value == "a" and results["b"].value == "b"
+    assert isinstance(results["failing"].error, RuntimeError)
+    assert isinstance(results["too_slow"].error, TimeoutError)
+
+@patch("app.core.detection.VectorDB")
+@patch("app.core.detection.EmbeddingModel")
+def test_windowed_ai_detection_covers_whole_document(mock_emb_cls, mock_vdb_cls):
+    from app.core.ml import text_windows
+
+    text = ("Human written introduction. " * 40) + ("Generated body text here. " * 40)
+    spans = text_windows(text, 500, 500)
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+
+    engine = DetectionEngine(MagicMock())
+    human = {"perplexity": 150.0, "burstiness": 1.0}
+    generated = {"perplexity": 20.0, "burstiness": 0.2}
+    roberta = [0.0 if start < len(text) / 2 else 99.0 for start, _ in spans]
+    scores = [human if start < len(text) / 2 else generated for start, _ in spans]
+    analysis = engine._aggregate_windows(spans, roberta, scores)
+
+    windows = analysis["details"]["windows"]
+    assert len(windows) == len(spans)
+    assert windows[0]["label"] == "Human"
+    assert windows[-1]["raw_roberta_score"] == 99.0
+    assert analysis["details"]["max_window_ai_probability"] > windows[0]["ai_probability"]
+    assert 0 < analysis["details"]["ai_text_fraction"] < 100
+
+@patch("app.core.detection.ScanCache")
+@patch("app.core.detection.VectorDB")
+@patch("app.core.detection.EmbeddingModel")
+@patch("app.core.detection.Chunker")
+def test_run_scan_reuses_cached_result(mock_chunker_cls, mock_emb_cls, mock_vdb_cls, mock_cache_cls):
+    cached = MagicMock()
+    cached.id = 7
+    cached.overall_score = 42.0
+    cached.report_data = {"matched_chunks": 3, "cache_key": {"content_hash": "abc"}}
+    mock_cache_cls.return_value.lookup.return_value = cached
+
+    mock_db = MagicMock()
+    mock_scan = MagicMock()
+    mock_scan.document.extracted_text = "test text"
+    mock_db.query.return_value.filter.return_value.first.return_value = mock_scan
+
+    engine = DetectionEngine(mock_db, session_factory=MagicMock())
+    engine.run_scan(1)
+
+    assert mock_scan.status == ScanStatus.COMPLETED
+    assert mock_scan.overall_score == 42.0
+    assert mock_scan.report_data["cached_from"] == 7
+    mock_chunker_cls.return_value.chunk_text.assert_not_called()
+
+    # Forced rescans bypass the cache
+    mock_cache_cls.return_value.lookup.reset_mock()
+    engine.run_scan(1, force=True)
+    mock_cache_cls.return_value.lookup.assert_not_called()
+
+@patch("app.core.detection.ScanCache")
+@patch("app.core.detection.VectorDB")
+@patch("app.core.detection.EmbeddingModel")
+@patch("app.core.detection.Chunker")
+def test_run_scan_incremental(mock_chunker_cls, mock_emb_cls, mock_vdb_cls, mock_cache_cls):
+    mock_chunker_cls.return_value.chunk_text.return_value = ["chunk1", "chunk2", "chunk3"]
+
+    base = MagicMock()
+    base.id = 7
+    base.report_data = {
+        "index_seq_mark": 5,
+        "ai_detection": {"ai_probability": 12.0, "label": "Human"},
+        "matches": [
+            {"chunk_index": 1, "chunk_text": "chunk2", "best_match": {"source_doc_id": 3, "text": "old", "score": 0.85}},
+            {"chunk_index": 2, "chunk_text": "chunk3", "best_match": {"source_doc_id": 4, "text": "gone", "score": 0.9}},
+        ]
+    }
+    cache = mock_cache_cls.return_value
+    cache.lookup.return_value = None
+    cache.incremental_base.return_value = base
+    cache.index_high_water_mark.return_value = 9
+
+    mock_vdb = mock_vdb_cls.return_value
+    mock_vdb.get_chunk_vectors.return_value = [[0.1], [0.2], [0.3]]
+    mock_vdb.search_batch.return_value = [
+        [{"document_id": 8, "text": "new", "score": 0.95}],
+        [{"document_id": 9, "text": "weaker", "score": 0.81}],
+        [],
+    ]
+
+    mock_db = MagicMock()
+    mock_scan = MagicMock()
+    mock_scan.document.id = 1
+    mock_scan.document.extracted_text = "test text"
+    mock_db.query.return_value.filter.return_value.first.return_value = mock_scan
+
+    engine = DetectionEngine(mock_db, session_factory=MagicMock())
+    with patch.object(engine, "_existing_document_ids", return_value={3}): # Document 4 was deleted
+        engine.run_scan(1)
+
+    assert mock_vdb.search_batch.call_args.kwargs["must"] == {"index_seq": {"gt": 5}}
+    report = mock_scan.report_data
+    assert [m["best_match"]["source_doc_id"] for m in report["matches"]] == [8, 3]
+    assert report["ai_detection"] == base.report_data["ai_detection"]
+    assert report["index_seq_mark"] == 9
+    assert report["incremental_from"] == 7
+
+@patch("app.core.detection.ScanCache")
+@patch("app.core.detection.VectorDB")
+@patch("app.core.detection.EmbeddingModel")
+@patch("app.core.detection.Chunker")
+def test_run_scan_reports_near_duplicate_early(mock_chunker_cls, mock_emb_cls, mock_vdb_cls, mock_cache_cls):
+    mock_cache_cls.return_value.lookup.return_value = None
+
+    mock_db = MagicMock()
+    mock_scan = MagicMock()
+    mock_scan.document.id = 1
+    mock_scan.document.extracted_text = "test text"
+    mock_scan.document.meta_data = {"minhash_signature": [1, 2, 3]}
+    mock_db.query.return_value.filter.return_value.first.return_value = mock_scan
+
+    mock_chunker_cls.return_value.chunk_text.return_value = ["chunk"] * 32
+    ai_analysis = {"ai_probability": 0.1, "is_likely_ai": False}
+
+    engine = DetectionEngine(mock_db, session_factory=MagicMock())
+    with patch("app.core.lsh_index.LshIndex.get_instance") as mock_index, \
+         patch.object(engine, "_existing_document_ids", return_value={5, 6}), \
+         patch.object(engine, "_detect_ai_content", return_value=ai_analysis) as mock_ai:
+        # Document 4 was deleted
+        mock_index.return_value.query.return_value = [(4, 1.0), (5, 0.96875), (6, 0.9140625)]
+        engine.run_scan(1)
+
+        assert mock_index.return_value.query.call_args.kwargs["exclude"] == {1}
+        assert mock_scan.status == ScanStatus.COMPLETED
+        assert mock_scan.overall_score == 96.88
+        report = mock_scan.report_data
+        assert report["near_duplicate_of"] == {"source_doc_id": 5, "estimated_similarity": 0.96875}
+        assert report["score_estimated"] is True
+        assert [d["source_doc_id"] for d in report["near_duplicates"]] == [5, 6]
+        assert (report["total_chunks"], report["matched_chunks"], report["matches"]) == (32, 0, [])
+        assert report["ai_detection"] == ai_analysis
+        mock_ai.assert_called_once_with("test text")
+        assert "cache_key" not in report # Never reused as a cached or incremental base
+        mock_emb_cls.return_value.encode.assert_not_called()
+        mock_vdb_cls.return_value.search_batch.assert_not_called()
+
+        # Forced rescans run the full search
+        mock_index.return_value.query.reset_mock()
+        mock_vdb_cls.return_value.search_batch.return_value = [[]]
+        engine.run_scan(1, force=True)
+        mock_index.return_value.query.assert_not_called()
+        mock_vdb_cls.return_value.search_batch.assert_called_once()
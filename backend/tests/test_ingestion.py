@@ -15,8 +15,123 @@ def test_normalization():
     norm = TextCleaner.normalize_for_matching(raw)
     assert norm == "hello world"
 
+def test_canonical_tokens():
+    import re
+    from app.core.normalize import tokenize
+    text = "Naïve “quoted” CAFÉ—text, code_name\tΟΔΟΣ İstanbul 3.14!"
+    # The tokenization MinHash fingerprints have always used
+    expected = re.sub(r'[^\w\s]', '', text.lower()).split()
+    assert tokenize(text) == expected
+    assert TextCleaner.normalize_for_matching(text) == " ".join(expected)
+
+def test_matching_and_containment_drop_all_punctuation():
+    # Both used to handle only some punctuation: matching removed ASCII
+    # punctuation, containment split the lowercased text as is
+    from app.core.web_search import WebSearcher
+    text = "Naïve “quoted” café—text, snake_case ¿qué?"
+    assert TextCleaner.normalize_for_matching(text) == "naïve quoted cafétext snake_case qué"
+
+    searcher = WebSearcher.__new__(WebSearcher) # No search client needed
+    assert searcher._calculate_containment({"naïve", "quoted", "qué"}, "NAÏVE, “Quoted” ¿qué?") == 1.0
+
+def test_streaming_clean_matches_clean():
+    text = "  First   line \n\n\tsecond\x07 line\nthird line  "
+    pieces = [text[:5], text[5:5], text[5:17], text[17:]]
+    assert "\n".join(TextCleaner.iter_clean(pieces)) == TextCleaner.clean(text)
+
 # Mocking file operations would be better, but for now we'll skip actual file reading
 # unless we create temp files.
 def test_extractor_file_not_found():
     with pytest.raises(FileNotFoundError):
         TextExtractor.extract("non_existent_file.txt", "text/plain")
+
+def _write_pdf(path, pages):
+    from reportlab.pdfgen import canvas
+    pdf = canvas.Canvas(str(path))
+    for i in range(pages):
+        if i % 10 != 9: # leave some pages blank
+            pdf.drawString(72, 720, f"Page {i} of the dissertation.")
+        pdf.showPage()
+    pdf.save()
+
+def test_pdf_pages_stream_in_order_across_process_pool(tmp_path):
+    from unittest.mock import patch
+    from app.core.config import settings
+
+    path = tmp_path / "thesis.pdf"
+    _write_pdf(path, 60)
+
+    with patch.object(settings, "PDF_WORKERS", 1):
+        serial = list(TextExtractor.iter_pdf_pages(str(path)))
+    with patch.object(settings, "PDF_WORKERS", 2), \
+         patch.object(settings, "PDF_PARALLEL_MIN_PAGES", 10), \
+         patch.object(settings, "PDF_PAGES_PER_TASK", 7):
+        parallel = list(TextExtractor.iter_pdf_pages(str(path)))
+        text = TextExtractor.extract(str(path), "application/pdf")
+
+    assert len(parallel) == 60
+    assert parallel == serial
+    assert "Page 0 " in parallel[0] and "Page 58 " in parallel[58] and parallel[59] == ""
+    assert text == "".join(page + "\n" for page in serial if page)
+
+def _extract_in_worker(path, queue):
+    from app.core import ingestion
+    pages = list(TextExtractor.iter_pdf_pages(path))
+    queue.put((pages, ingestion._pool is not None and not ingestion._pool_unavailable))
+
+def test_pdf_pool_runs_inside_daemonic_celery_worker(tmp_path):
+    # Celery's prefork workers are daemonic, and multiprocessing refuses them children
+    import billiard
+    from unittest.mock import patch
+    from app.core.config import settings
+
+    path = tmp_path / "thesis.pdf"
+    _write_pdf(path, 30)
+    with patch.object(settings, "PDF_WORKERS", 1):
+        serial = list(TextExtractor.iter_pdf_pages(str(path)))
+
+    ctx = billiard.get_context("fork")
+    queue = ctx.Queue()
+    with patch.object(settings, "PDF_WORKERS", 2), \
+         patch.object(settings, "PDF_PARALLEL_MIN_PAGES", 10), \
+         patch.object(settings, "PDF_PAGES_PER_TASK", 7):
+        worker = ctx.Process(target=_extract_in_worker, args=(str(path), queue), daemon=True)
+        worker.start()
+        pages, pooled = queue.get(timeout=120)
+        worker.join(30)
+
+    assert pooled
+    assert pages == serial
+
+def test_scanned_pdf_pages_fall_back_to_cached_ocr(tmp_path):
+    from unittest.mock import patch
+    from PIL import Image
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+    from app.core import ocr
+    from app.core.config import settings
+
+    path = tmp_path / "scan.pdf"
+    scan = Image.new("L", (40, 40), 255)
+    pdf = canvas.Canvas(str(path))
+    pdf.drawString(72, 720, "Typed cover page.")
+    pdf.showPage()
+    pdf.showPage() # blank: no text layer and nothing to OCR
+    pdf.drawImage(ImageReader(scan), 72, 600, 40, 40)
+    pdf.showPage()
+    pdf.save()
+
+    calls = []
+    def image_to_string(image, **kwargs):
+        calls.append(image.size)
+        return "Scanned page text."
+
+    with patch.object(settings, "OCR_CACHE_DIR", str(tmp_path / "ocr")), \
+         patch.object(ocr, "_rasterize", lambda file_path, index: scan), \
+         patch("pytesseract.image_to_string", image_to_string):
+        first = TextExtractor.extract(str(path), "application/pdf")
+        second = TextExtractor.extract(str(path), "application/pdf")
+
+    assert first == second
+    assert first.startswith("Typed cover page.") and first.endswith("Scanned page text.\n")
+    assert calls == [(40, 40)] # the second run was served from the cache
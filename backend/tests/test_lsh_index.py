@@ -0,0 +1,74 @@
+import numpy as np
+from unittest.mock import patch
+from app.core.config import settings
+from app.core.lsh_index import LshIndex
+
+def _signature(rng, num_perm=128):
+    return rng.integers(0, 2**32 - 1, size=num_perm, dtype=np.uint64).tolist()
+
+def _near_copy(signature, changed, rng):
+    copy = list(signature)
+    for i in rng.choice(len(copy), size=changed, replace=False):
+        copy[i] = int(rng.integers(0, 2**32 - 1))
+    return copy
+
+def test_query_finds_near_duplicates_across_instances(tmp_path):
+    rng = np.random.default_rng(0)
+    signatures = {document_id: _signature(rng) for document_id in range(1, 51)}
+    index = LshIndex(str(tmp_path))
+    for document_id, signature in signatures.items():
+        index.add(document_id, signature)
+
+    query = _near_copy(signatures[7], 8, rng) # ~94% of the values agree
+    reader = LshIndex(str(tmp_path)) # e.g. the API reading what a worker wrote
+    results = reader.query(query)
+    assert results[0][0] == 7 and results[0][1] >= 120 / 128
+    assert reader.query(query, threshold=0.99) == []
+    assert reader.query(signatures[7], exclude={7}) == []
+    assert reader.query(_signature(rng)) == []
+
+    # Re-adding replaces the old signature, removing drops the document
+    index.add(7, signatures[8])
+    assert sorted(reader.query(signatures[8])) == [(7, 1.0), (8, 1.0)]
+    index.remove(8)
+    assert reader.query(signatures[8]) == [(7, 1.0)]
+    assert reader.stats()["documents"] == 49
+
+def test_delta_is_compacted_into_main_segment(tmp_path):
+    rng = np.random.default_rng(1)
+    signatures = {document_id: _signature(rng) for document_id in range(1, 31)}
+    with patch.object(settings, "LSH_DELTA_MAX", 8):
+        index = LshIndex(str(tmp_path))
+        for document_id, signature in signatures.items():
+            index.add(document_id, signature)
+        index.remove(3)
+
+    stats = LshIndex(str(tmp_path)).stats()
+    assert stats["documents"] == 29 and stats["main_rows"] >= 24 and stats["delta_rows"] < 8
+    reader = LshIndex(str(tmp_path))
+    for document_id, signature in signatures.items():
+        expected = [] if document_id == 3 else [(document_id, 1.0)]
+        assert reader.query(signature) == expected
+
+def test_compacting_without_a_delta(tmp_path):
+    # rebuild() compacts at the end, also when the last add() just compacted
+    rng = np.random.default_rng(2)
+    signatures = {document_id: _signature(rng) for document_id in range(1, 4)}
+    index = LshIndex(str(tmp_path))
+    for document_id, signature in signatures.items():
+        index.add(document_id, signature)
+    index.compact()
+    index.compact()
+    index.remove(2)
+    index.compact() # Tombstones only
+    index.compact()
+
+    assert LshIndex(str(tmp_path)).stats()["documents"] == 2
+    assert LshIndex(str(tmp_path)).query(signatures[1]) == [(1, 1.0)]
+    assert LshIndex(str(tmp_path)).query(signatures[2]) == []
+
+def test_empty_signatures_are_not_indexed(tmp_path):
+    index = LshIndex(str(tmp_path))
+    index.add(1, [2**32 - 1] * 128) # MinHash of a text without shingles
+    assert index.stats() == {"documents": 0}
+    assert not LshIndex.indexable([])
@@ -1,7 +1,9 @@
+import os
 import pytest
 from unittest.mock import MagicMock, patch
 from app.core.ml import Chunker, EmbeddingModel
 from app.core.fingerprint import LexicalFingerprint
+from app.core.config import settings
 
 def test_chunker():
     chunker = Chunker(chunk_size=10, overlap=2)
@@ -10,6 +12,12 @@ def test_chunker():
     assert len(chunks) > 0
     assert "Hello" in chunks[0]
 
+def test_streaming_chunker_matches_chunk_text():
+    chunker = Chunker(chunk_size=40, overlap=8)
+    text = " ".join(f"word{i}" for i in range(200))
+    pieces = [text[i:i + 37] for i in range(0, len(text), 37)]
+    assert list(chunker.iter_chunks(pieces)) == chunker.chunk_text(text)
+
 def test_fingerprint():
     fp = LexicalFingerprint(num_perm=16)
     text1 = "The quick brown fox jumps over the lazy dog"
@@ -23,6 +31,31 @@ def test_fingerprint():
     assert sig1 == sig2
     assert sig1 != sig3
 
+def test_fingerprint_matches_datasketch():
+    from datasketch import MinHash
+    from app.core.normalize import tokenize
+    texts = [
+        "The quick brown fox jumps over the lazy dog. " * 50,
+        "Naïve café résumés — “quoted” ΣΟΦΙΑ and code_names 3.14 " + " ".join(f"w{i}" for i in range(3000)),
+        "two words",
+        "",
+    ]
+    for num_perm in (16, 128):
+        expected = []
+        for text in texts:
+            try:
+                m = MinHash(num_perm=num_perm, scheme="legacy") # Stored signatures predate datasketch 2.0
+            except TypeError:
+                m = MinHash(num_perm=num_perm)
+            words = tokenize(text)
+            for i in range(len(words) - 2):
+                m.update(" ".join(words[i:i+3]).encode("utf8"))
+            expected.append(m.hashvalues.tolist())
+
+        fp = LexicalFingerprint(num_perm=num_perm)
+        assert [fp.generate_fingerprint(text) for text in texts] == expected
+        assert fp.generate_fingerprints(texts) == expected
+
 @patch("app.core.ml.SentenceTransformer")
 def test_embedding_model(mock_st):
     mock_output = MagicMock()
@@ -49,3 +82,355 @@ def test_vector_db(mock_client_cls):
     vdb.upsert_chunks(1, ["chunk1"], [[0.1, 0.2]])
     
     mock_client.upsert.assert_called_once()
+
+def test_vector_db_search_filters():
+    from qdrant_client import QdrantClient
+    from app.db.vector import VectorDB
+
+    vdb = VectorDB()
+    vdb.client = QdrantClient(":memory:")
+    vdb._ensure_collection()
+
+    vector = [1.0] + [0.0] * 383
+    vdb.upsert_chunks(1, ["own chunk"], [vector])
+    vdb.upsert_chunks(2, ["other chunk"], [vector])
+
+    results = vdb.search(vector, limit=1, must_not={"document_id": 1})
+    assert [r["document_id"] for r in results] == [2]
+
+    batch = vdb.search_batch([vector, vector], limit=5, must={"document_id": [1]})
+    assert [[r["document_id"] for r in hits] for hits in batch] == [[1], [1]]
+
+def test_vector_db_get_chunk_vectors():
+    from qdrant_client import QdrantClient
+    from app.db.vector import VectorDB
+
+    vdb = VectorDB()
+    vdb.client = QdrantClient(":memory:")
+    vdb._ensure_collection()
+
+    vector = [1.0] + [0.0] * 383
+    vdb.upsert_chunks(1, ["chunk1", "chunk2"], [vector, vector])
+
+    vectors = vdb.get_chunk_vectors(1, ["chunk1", "edited chunk2", "chunk3"])
+    assert vectors[0] == vector
+    assert vectors[1] is None # Stored text differs
+    assert vectors[2] is None # Never indexed
+
+def test_model_registry_lazy_load_and_eviction():
+    from app.core.registry import ManagedModel, ModelRegistry
+
+    class FakeModel(ManagedModel):
+        def __init__(self, name):
+            self.registry_name = name
+            self.loads = 0
+
+        def _load(self):
+            self.loads += 1
+            return object()
+
+    registry = ModelRegistry()
+    first, second = FakeModel("first"), FakeModel("second")
+    registry.register("first", lambda: first)
+    registry.register("second", lambda: second)
+
+    with patch("app.core.registry.ModelRegistry.get_instance", return_value=registry):
+        assert not first.is_loaded
+        registry.get("first")
+        registry.get("first")
+        assert first.loads == 1 # Loaded once, reused afterwards
+
+        registry.warm_up(["second"], run_inference=False)
+        assert second.is_loaded
+
+        report = {m["name"]: m for m in registry.report()["models"]}
+        assert report["first"]["loaded"] and report["second"]["loaded"]
+
+        assert registry.evict_idle(max_idle_seconds=0.000001) == ["first", "second"]
+        assert not first.is_loaded and not second.is_loaded
+
+        registry.get("first")
+        assert first.loads == 2
+
+def test_micro_batcher_merges_concurrent_requests():
+    import threading
+    from app.core.batching import MicroBatcher
+
+    calls = []
+    def batch_fn(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    batcher = MicroBatcher(batch_fn, max_batch=100, max_wait_ms=200)
+    requests = [[f"job{i}-a", f"job{i}-bb"] for i in range(8)]
+    results = [None] * len(requests)
+
+    def worker(i):
+        results[i] = batcher.run(requests[i])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(requests))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Every caller gets its own slice back, from far fewer forward passes
+    for texts, vectors in zip(requests, results):
+        assert vectors == [[float(len(t))] for t in texts]
+    assert len(calls) < len(requests)
+    assert batcher.stats["items"] == 16
+
+    def failing(texts):
+        raise RuntimeError("model crashed")
+    with pytest.raises(RuntimeError):
+        MicroBatcher(failing, max_wait_ms=0).run(["x"])
+
+def test_embedding_cache_tiers(tmp_path):
+    from app.core.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache("test-model", directory=str(tmp_path), memory_items=2)
+    assert cache.get_many(["a", "b"]) == [None, None]
+    cache.put_many(["a", "b", "c"], [[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]])
+    assert cache.get_many(["a", "c"]) == [[1.0, 0.0], [0.5, 0.5]]
+
+    # A fresh process only has the memory-mapped disk tier
+    other = EmbeddingCache("test-model", directory=str(tmp_path), memory_items=2)
+    assert other.get_many(["b", "d"]) == [[0.0, 1.0], None]
+    other.put_many(["d"], [[0.25, 0.75]])
+    assert cache.get_many(["d"]) == [[0.25, 0.75]]
+
+    # Keys include the model name
+    assert EmbeddingCache("other-model", directory=str(tmp_path)).get_many(["a"]) == [None]
+
+    # Counters reach the shared index when a process flushes them
+    assert cache.stats()["lookups"] == 5
+    other.stats()
+    stats = cache.stats()
+    assert stats["disk"]["items"] == 4
+    assert stats["memory"]["items"] == 2
+    assert stats["misses"] == 3 and stats["hit_rate"] == round(4 / 7, 4)
+
+def test_embedding_cache_batches_beyond_sqlite_variable_limit(tmp_path):
+    from app.core.embedding_cache import EmbeddingCache
+
+    import sqlite3
+    cache = EmbeddingCache("test-model", directory=str(tmp_path), memory_items=0)
+    # SQLite's default limit; some builds raise it
+    cache._connection().setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    texts = [f"chunk {i}" for i in range(2500)]
+    vectors = [[float(i), 1.0] for i in range(2500)]
+    cache.put_many(texts, vectors)
+    cache.put_many(texts[:1500], vectors[:1500]) # Known keys aren't stored twice
+    assert cache.get_many(texts) == vectors
+    assert cache.stats()["disk"]["items"] == 2500
+
+def test_embedding_cache_stats_without_disk_tier_and_when_full(tmp_path):
+    from app.core.embedding_cache import EmbeddingCache
+
+    # Disk tier off: counters stay in this process
+    cache = EmbeddingCache("test-model", directory=str(tmp_path), disk_items=0)
+    assert cache.get_many(["a", "b", "c", "d"]) == [None] * 4
+    cache.put_many(["a"], [[1.0, 0.0]])
+    assert cache.get_many(["a"]) == [[1.0, 0.0]]
+    stats = cache.stats()
+    assert (stats["lookups"], stats["misses"], stats["hit_rate"]) == (5, 4, 0.2)
+    assert stats["disk"]["full"] is False
+
+    # A full disk tier keeps its vectors and reports the ones it turned away
+    cache = EmbeddingCache("test-model", directory=str(tmp_path), memory_items=0, disk_items=2)
+    cache.put_many(["a", "b", "c"], [[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]])
+    assert cache.get_many(["a", "b", "c"]) == [[1.0, 0.0], [0.0, 1.0], None]
+    stats = cache.stats()
+    assert stats["disk"]["items"] == 2 and stats["disk"]["full"] is True
+    assert stats["disk"]["rejected"] == 1
+
+def test_embedding_model_encode_uses_cache(tmp_path):
+    from app.core.embedding_cache import EmbeddingCache
+
+    model = EmbeddingModel()
+    model._cache = EmbeddingCache(model.model_name, directory=str(tmp_path))
+    with patch.object(model, "_encode_uncached", side_effect=lambda texts, batch_size=None: [[float(len(t))] for t in texts]) as encode:
+        assert model.encode(["prompt", "essay one", "prompt"]) == [[6.0], [9.0], [6.0]]
+        assert model.encode(["prompt", "essay two"]) == [[6.0], [9.0]]
+    assert [c.args[0] for c in encode.call_args_list] == [["prompt", "essay one"], ["essay two"]]
+
+def test_onnx_parity_check():
+    import numpy as np
+    from app.core.onnx_backend import ParityError, check_parity
+
+    reference = np.array([[1.0, 0.0], [0.6, 0.8]])
+    assert check_parity(reference, reference * 1.01, 0.001) < 1e-9
+    with pytest.raises(ParityError):
+        check_parity(reference, np.array([[0.0, 1.0], [0.6, 0.8]]), 0.02)
+    with pytest.raises(ParityError):
+        check_parity(np.array([[0.9, 0.1]]), np.array([[0.8, 0.2]]), 0.05, metric="abs")
+
+def test_onnx_sentence_encoder_export(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("sentence_transformers")
+    import numpy as np
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling, Transformer
+    from app.core import onnx_backend
+
+    # Tiny random BERT, so no download is needed
+    words = {w.strip(".,'").lower() for s in onnx_backend.PARITY_SAMPLES for w in s.split()}
+    (tmp_path / "vocab.txt").write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + sorted(words)))
+    tokenizer = BertTokenizerFast(vocab_file=str(tmp_path / "vocab.txt"))
+    config = BertConfig(vocab_size=tokenizer.vocab_size, hidden_size=32, num_hidden_layers=1,
+                        num_attention_heads=2, intermediate_size=64, max_position_embeddings=128)
+    BertModel(config).save_pretrained(tmp_path / "bert")
+    tokenizer.save_pretrained(tmp_path / "bert")
+    transformer = Transformer(str(tmp_path / "bert"), max_seq_length=64)
+    st_model = SentenceTransformer(modules=[transformer, Pooling(transformer.get_word_embedding_dimension()), Normalize()])
+
+    directory = str(tmp_path / "onnx")
+    assert onnx_backend.build_sentence_encoder(st_model, directory) <= 0.02
+    encoder = onnx_backend.OnnxSentenceEncoder(directory)
+    texts = ["the quick brown fox", "plagiarism is the representation of another author's language"]
+    assert np.allclose(encoder.encode(texts, batch_size=1), st_model.encode(texts), atol=0.05)
+
+    # A failed parity check leaves nothing behind for the runtime to load
+    with pytest.raises(onnx_backend.ParityError):
+        onnx_backend.build_sentence_encoder(st_model, str(tmp_path / "strict"), tolerance=0.0)
+    assert not onnx_backend.is_exported(str(tmp_path / "strict"))
+    # ... and a failed re-export keeps the current one
+    with pytest.raises(onnx_backend.ParityError):
+        onnx_backend.build_sentence_encoder(st_model, directory, tolerance=0.0)
+    assert onnx_backend.is_exported(directory)
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".")] # No staging left behind
+
+    # Workers exporting on first use at once: one exports, the others load its export
+    import threading
+    builds = []
+    def build(target):
+        builds.append(target)
+        return onnx_backend.build_sentence_encoder(st_model, target)
+    loaded = []
+    with patch.object(settings, "ONNX_MODEL_DIR", str(tmp_path / "shared")):
+        threads = [
+            threading.Thread(target=lambda: loaded.append(onnx_backend.load("embedding", "tiny-bert", build)))
+            for _ in range(3)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert len(builds) == 1
+    assert len(loaded) == 3 and all(isinstance(m, onnx_backend.OnnxSentenceEncoder) for m in loaded)
+
+def test_inference_server_round_trip(tmp_path):
+    import threading
+    from app.core.inference_server import InferenceClient, InferenceServer, RemoteInferenceError, RemoteModel
+    from app.core.registry import ManagedModel, ModelRegistry
+
+    batches = []
+    class FakeClassifier(ManagedModel):
+        registry_name = "fake_classifier"
+        def _load(self):
+            return object()
+        def classify(self, text):
+            return {"label": "Fake", "score": 0.9}
+        def classify_batch(self, texts, batch_size=8):
+            batches.append(len(texts))
+            return [{"label": "Real", "score": len(t) / 100} for t in texts]
+
+    classifier = FakeClassifier()
+    registry = ModelRegistry()
+    registry.register("ai_classifier", lambda: classifier)
+    server = InferenceServer(str(tmp_path / "inference.sock"), registry=registry)
+    authkey = patch.object(settings, "INFERENCE_SERVER_AUTHKEY", "test-secret")
+    authkey.start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = InferenceClient(server.address, timeout=10)
+        for _ in range(50):
+            if (tmp_path / "inference.sock").exists():
+                break
+            threading.Event().wait(0.05)
+
+        remote = RemoteModel("ai_classifier", client)
+        assert not remote.is_loaded # Asking doesn't load the model
+        assert remote.classify("text") == {"label": "Fake", "score": 0.9}
+        assert remote.is_loaded
+
+        # Window batches from concurrent clients share forward passes on the server
+        results = {}
+        def scan(i):
+            results[i] = RemoteModel("ai_classifier", client).classify_batch(["x" * i, "y" * i])
+        threads = [threading.Thread(target=scan, args=(i,)) for i in range(1, 7)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results[3] == [{"label": "Real", "score": 0.03}] * 2
+        assert sum(batches) == 12 and len(batches) < 6
+
+        with pytest.raises(AttributeError):
+            remote.unload
+        with pytest.raises(RemoteInferenceError):
+            client.call("ai_classifier", "_load")
+    finally:
+        server.close()
+        thread.join(timeout=5)
+        authkey.stop()
+
+def test_llm_check_loads_on_first_use_locally_and_remotely(tmp_path):
+    import threading
+    from app.core.detection import DetectionEngine
+    from app.core.inference_server import InferenceClient, InferenceServer, RemoteModel
+    from app.core.registry import ManagedModel, ModelRegistry
+
+    class FakeLLM(ManagedModel):
+        registry_name = "llm"
+        def __init__(self, available=True):
+            self.available = available
+        def _load(self):
+            return object() if self.available else None
+        def analyze_text(self, text):
+            if not self.load():
+                return {"error": "LLM not loaded"}
+            return {"is_ai": False, "analysis": text}
+
+    engine = DetectionEngine.__new__(DetectionEngine) # _run_llm needs no search stack
+    local = ModelRegistry()
+    local.register("llm", lambda: FakeLLM())
+    with patch("app.core.detection.ModelRegistry") as mock_registry_cls:
+        mock_registry_cls.get_instance.return_value = local
+        assert engine._run_llm("essay") == {"is_ai": False, "analysis": "essay"}
+
+        local.register("llm", lambda: FakeLLM(available=False))
+        assert engine._run_llm("essay") == {} # Not installed: skipped, as before
+
+    # With the inference server, the server loads the model on the first call
+    remote_llm = FakeLLM()
+    registry = ModelRegistry()
+    registry.register("llm", lambda: remote_llm)
+    server = InferenceServer(str(tmp_path / "inference.sock"), registry=registry)
+    with patch.object(settings, "INFERENCE_SERVER_AUTHKEY", "test-secret"):
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            for _ in range(50):
+                if (tmp_path / "inference.sock").exists():
+                    break
+                threading.Event().wait(0.05)
+            client = InferenceClient(server.address, timeout=10)
+            with patch("app.core.detection.ModelRegistry") as mock_registry_cls:
+                mock_registry_cls.get_instance.return_value.get.side_effect = lambda name: RemoteModel(name, client)
+                assert not remote_llm.is_loaded
+                assert engine._run_llm("essay") == {"is_ai": False, "analysis": "essay"}
+                assert remote_llm.is_loaded
+        finally:
+            server.close()
+            thread.join(timeout=5)
+
+def test_inference_server_requires_authkey():
+    from app.core import inference_server
+    with patch.object(settings, "INFERENCE_SERVER_SOCKET", "/tmp/unused.sock"), \
+         patch.object(settings, "INFERENCE_SERVER_AUTHKEY", None):
+        assert inference_server.main() == 2
+        with pytest.raises(RuntimeError):
+            inference_server.InferenceClient().call("embedding", "encode", ["text"])
@@ -0,0 +1,7 @@
+from app.core.import_profile import profile
+
+def test_api_import_skips_heavy_stacks():
+    # Models, Qdrant, parsers and Celery load in workers or on first use, not at API boot
+    report = profile("app.main")
+    assert report["heavy"] == []
+    assert report["modules"][0]["module"] == "app.main"
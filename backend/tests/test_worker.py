@@ -0,0 +1,276 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.session import Base
+from app.models.document import Document, DocStatus
+from app.models.user import User
+from app import worker
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(autouse=True)
+def checkpoint_dir(tmp_path):
+    with patch.object(worker.settings, "CHECKPOINT_DIR", str(tmp_path)):
+        yield tmp_path
+
+@pytest.fixture(autouse=True)
+def lsh_index(tmp_path_factory):
+    index = worker.LshIndex(str(tmp_path_factory.mktemp("lsh")))
+    with patch.object(worker.LshIndex, "get_instance", return_value=index):
+        yield index
+
+@pytest.fixture
+def eager_queue():
+    conf = worker.celery_app.conf
+    previous = conf.task_always_eager, conf.broker_url
+    # Eager tasks still open a producer, so use the in-memory transport
+    conf.task_always_eager, conf.broker_url = True, "memory://"
+    yield
+    conf.task_always_eager, conf.broker_url = previous
+
+def _create_document(session_factory) -> int:
+    db = session_factory()
+    user = User(email="worker@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    doc = Document(user_id=user.id, filename="essay.txt", file_path="essay.txt", content_type="text/plain")
+    db.add(doc)
+    db.commit()
+    document_id = doc.id
+    db.close()
+    return document_id
+
+@patch("app.worker.VectorDB")
+@patch("app.worker.EmbeddingModel")
+@patch("app.worker.TextExtractor")
+def test_pipeline_runs_all_stages(mock_extractor, mock_emb_cls, mock_vdb_cls, session_factory, lsh_index, eager_queue):
+    mock_extractor.iter_extract.return_value = ["The quick brown fox jumps over the lazy dog. " * 30]
+    mock_emb_cls.get_instance.return_value.encode.side_effect = lambda chunks: [[0.1]] * len(chunks)
+    document_id = _create_document(session_factory)
+
+    with patch("app.worker.SessionLocal", session_factory):
+        worker.process_document.delay(document_id)
+
+    db = session_factory()
+    doc = db.query(Document).get(document_id)
+    assert doc.status == DocStatus.INDEXED
+    assert doc.meta_data["minhash_signature"]
+    assert lsh_index.query(doc.meta_data["minhash_signature"]) == [(document_id, 1.0)]
+    upserted_id, chunks, embeddings = mock_vdb_cls.return_value.upsert_chunks.call_args.args
+    assert upserted_id == document_id and len(chunks) == len(embeddings) > 1
+    assert doc.meta_data["checkpoints"]["indexed"] == {"count": len(chunks)}
+
+@patch("app.worker.VectorDB")
+@patch("app.worker.EmbeddingModel")
+@patch("app.worker.TextExtractor")
+def test_pipeline_embeds_and_indexes_in_windows(mock_extractor, mock_emb_cls, mock_vdb_cls, session_factory, eager_queue):
+    pages = [f"Page {i}: the quick brown fox jumps over the lazy dog. " * 12 for i in range(10)]
+    mock_extractor.iter_extract.return_value = pages
+    encode = mock_emb_cls.get_instance.return_value.encode
+    encode.side_effect = lambda chunks: [[float(len(chunk))] for chunk in chunks]
+    document_id = _create_document(session_factory)
+
+    with patch("app.worker.SessionLocal", session_factory), \
+         patch.object(worker.settings, "PIPELINE_WINDOW_CHUNKS", 4):
+        worker.process_document.delay(document_id)
+
+    chunks = worker.Chunker().chunk_text(worker.TextCleaner.clean("".join(pages)))
+    assert len(chunks) > 8
+    assert all(len(call.args[0]) <= 4 for call in encode.call_args_list)
+    upserts = mock_vdb_cls.return_value.upsert_chunks.call_args_list
+    assert [call.kwargs["offset"] for call in upserts] == list(range(0, len(chunks), 4))
+    assert sum((call.args[1] for call in upserts), []) == chunks
+    assert sum((call.args[2] for call in upserts), []) == [[float(len(chunk))] for chunk in chunks]
+
+@patch("app.worker.VectorDB")
+@patch("app.worker.EmbeddingModel")
+@patch("app.worker.TextExtractor")
+def test_pipeline_resumes_from_checkpoint(mock_extractor, mock_emb_cls, mock_vdb_cls, session_factory, checkpoint_dir, eager_queue):
+    mock_extractor.iter_extract.return_value = ["The quick brown fox jumps over the lazy dog. " * 30]
+    encode = mock_emb_cls.get_instance.return_value.encode
+    encode.side_effect = ValueError("model crashed")
+    document_id = _create_document(session_factory)
+
+    with patch("app.worker.SessionLocal", session_factory):
+        worker.process_document.delay(document_id)
+        db = session_factory()
+        doc = db.query(Document).get(document_id)
+        assert doc.status == DocStatus.FAILED
+        assert set(doc.meta_data["checkpoints"]) == {"extracted", "fingerprinted", "chunked"}
+        assert doc.meta_data["minhash_signature"]
+        db.close()
+
+        # Reprocessing resumes at embedding instead of extracting again
+        statuses = []
+        def encode_and_record_status(chunks):
+            check = session_factory()
+            statuses.append(check.query(Document).get(document_id).status)
+            check.close()
+            return [[0.1]] * len(chunks)
+        encode.side_effect = encode_and_record_status
+        worker.embed_document.delay(document_id) # As the queue's retry of the failed stage would
+        assert statuses and set(statuses) == {DocStatus.PROCESSING}
+        worker.process_document.delay(document_id)
+        assert mock_extractor.iter_extract.call_count == 1
+        assert mock_vdb_cls.return_value.upsert_chunks.call_count == 1
+        assert list(checkpoint_dir.iterdir()) == []
+
+        # A finished document is a no-op
+        worker.process_document.delay(document_id)
+        assert encode.call_count == 2
+        assert mock_vdb_cls.return_value.upsert_chunks.call_count == 1
+
+    db = session_factory()
+    doc = db.query(Document).get(document_id)
+    assert doc.status == DocStatus.INDEXED
+    assert "error" not in doc.meta_data
+
+@patch("app.worker.VectorDB")
+@patch("app.worker.EmbeddingModel")
+@patch("app.worker.TextExtractor")
+def test_duplicate_upload_reuses_source_vectors(mock_extractor, mock_emb_cls, mock_vdb_cls, session_factory, eager_queue):
+    mock_extractor.iter_extract.return_value = ["The quick brown fox jumps over the lazy dog. " * 30]
+    mock_emb_cls.get_instance.return_value.encode.side_effect = lambda chunks: [[0.1]] * len(chunks)
+    source_id = _create_document(session_factory)
+    db = session_factory()
+    duplicate = Document(
+        user_id=1, filename="copy.txt", file_path="essay.txt", content_type="text/plain",
+        extracted_text="".join(mock_extractor.iter_extract.return_value)
+    )
+    db.add(duplicate)
+    db.commit()
+    duplicate_id = duplicate.id
+    db.close()
+
+    with patch("app.worker.SessionLocal", session_factory):
+        worker.process_document.delay(source_id)
+        chunk_count = len(mock_vdb_cls.return_value.upsert_chunks.call_args.args[1])
+        mock_vdb_cls.return_value.copy_document.return_value = chunk_count
+        worker.clone_document.delay(duplicate_id, source_id)
+        db = session_factory()
+        doc = db.query(Document).get(duplicate_id)
+        assert doc.status == DocStatus.INDEXED
+        assert doc.meta_data["checkpoints"]["indexed"] == {"count": chunk_count}
+        assert mock_emb_cls.get_instance.return_value.encode.call_count == 1
+
+        # A stale source (vectors changed since) falls back to embedding
+        mock_vdb_cls.return_value.copy_document.return_value = 0
+        doc.meta_data = {}
+        db.commit()
+        db.close()
+        worker.clone_document.delay(duplicate_id, source_id)
+
+    # Every write of the duplicate's chunks takes a new index sequence number
+    mock_vdb_cls.return_value.copy_document.assert_called_with(source_id, duplicate_id, index_seq=3)
+    assert mock_vdb_cls.return_value.upsert_chunks.call_args.kwargs["index_seq"] == 4
+    assert mock_extractor.iter_extract.call_count == 1
+    assert mock_emb_cls.get_instance.return_value.encode.call_count == 2
+    db = session_factory()
+    assert db.query(Document).get(duplicate_id).status == DocStatus.INDEXED
+    assert db.query(Document).get(duplicate_id).index_seq == 4
+
+def test_index_mark_follows_indexing_order(session_factory):
+    from app.core import index_sequence
+    db = session_factory()
+    user = User(email="mark@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    older, newer = (Document(user_id=user.id, filename=name, file_path=name) for name in ("a.txt", "b.txt"))
+    db.add_all([older, newer])
+    db.commit()
+    assert index_sequence.high_water_mark(db) == 0
+
+    # The newer document is indexed first; the older one fails mid-write and awaits a retry
+    index_sequence.stamp(db, newer)
+    newer.status = DocStatus.INDEXED
+    index_sequence.stamp(db, older)
+    older.status = DocStatus.FAILED
+    db.commit()
+    assert (newer.index_seq, older.index_seq) == (1, 2)
+    assert index_sequence.high_water_mark(db) == 1
+
+    # The retry writes above every mark taken so far, and releases the mark once indexed
+    index_sequence.stamp(db, older)
+    db.commit()
+    assert older.index_seq == 3 and index_sequence.high_water_mark(db) == 2
+    older.status = DocStatus.INDEXED
+    db.commit()
+    assert index_sequence.high_water_mark(db) == 3
+    db.close()
+
+@patch("app.worker.VectorDB")
+@patch("app.worker.EmbeddingModel")
+@patch("app.worker.TextExtractor")
+def test_permanently_failed_index_write_releases_the_mark(mock_extractor, mock_emb_cls, mock_vdb_cls, session_factory, eager_queue):
+    from app.core import index_sequence
+    mock_extractor.iter_extract.return_value = ["The quick brown fox jumps over the lazy dog. " * 30]
+    mock_emb_cls.get_instance.return_value.encode.side_effect = lambda chunks: [[0.1]] * len(chunks)
+    upsert = mock_vdb_cls.return_value.upsert_chunks
+    document_id = _create_document(session_factory)
+
+    with patch("app.worker.SessionLocal", session_factory):
+        # Not retried: the stamp is cleared with the failure
+        upsert.side_effect = ValueError("bad payload")
+        worker.process_document.delay(document_id)
+        db = session_factory()
+        doc = db.query(Document).get(document_id)
+        assert doc.status == DocStatus.FAILED and doc.index_seq is None
+        assert index_sequence.high_water_mark(db) == 1
+        db.close()
+
+        # Transient errors keep the stamp while the queue will retry them
+        upsert.side_effect = ConnectionError("qdrant down")
+        with pytest.raises(ConnectionError):
+            worker._run_document_stage(document_id, worker._index_stage, final_attempt=False)
+        db = session_factory()
+        assert db.query(Document).get(document_id).index_seq == 2
+        assert index_sequence.high_water_mark(db) == 1
+        db.close()
+
+        # ... and drop it on the last attempt
+        with pytest.raises(ConnectionError):
+            worker._run_document_stage(document_id, worker._index_stage, final_attempt=True)
+
+    db = session_factory()
+    doc = db.query(Document).get(document_id)
+    assert doc.status == DocStatus.FAILED and doc.index_seq is None
+    assert index_sequence.high_water_mark(db) == 3
+    db.close()
+
+    task = MagicMock(max_retries=3)
+    task.request.retries = 2
+    assert not worker._final_attempt(task)
+    task.request.retries = 3
+    assert worker._final_attempt(task)
+
+def test_stage_waits_while_downstream_queue_is_full():
+    task = MagicMock()
+    task.retry.return_value = RuntimeError("retry")
+    with patch("app.worker.queue_depth", return_value=10_000):
+        with pytest.raises(RuntimeError):
+            worker._wait_for_downstream(task, "embedding")
+    assert task.retry.call_args.kwargs["max_retries"] is None
+
+def test_preload_before_fork_freezes_loaded_models():
+    registry = MagicMock()
+    registry.warm_up.return_value = {"embedding": 1.5}
+    with patch.object(worker.settings, "MODEL_PRELOAD", "embedding"), \
+         patch.object(worker.settings, "MODEL_PRELOAD_BEFORE_FORK", True), \
+         patch("app.core.registry.ModelRegistry.get_instance", return_value=registry), \
+         patch("app.worker.gc.freeze") as freeze, \
+         patch.object(worker, "_preloaded_before_fork", False):
+        worker._preload_before_fork()
+        registry.warm_up.assert_called_once()
+        freeze.assert_called_once()
+
+        # Forked pool processes reuse the parent's models instead of loading their own
+        worker._init_worker_process()
+        registry.warm_up.assert_called_once()
@@ -42,6 +42,7 @@ CREATE TABLE IF NOT EXISTS documents (
     status doc_status NOT NULL DEFAULT 'pending',
     extracted_text TEXT, -- Store extracted text (or link to file)
     meta_data JSONB NOT NULL DEFAULT '{}'::jsonb,
+    index_seq BIGINT, -- Index sequence number of the last write of its chunks
     created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
     updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
 );
@@ -51,6 +52,15 @@ BEFORE UPDATE ON documents
 FOR EACH ROW
 EXECUTE FUNCTION trg_set_timestamp();
 
+CREATE INDEX IF NOT EXISTS ix_documents_index_seq ON documents(index_seq);
+
+-- Single-row counter of chunk index writes, in indexing order (incremental rescans)
+CREATE TABLE IF NOT EXISTS index_sequence (
+    id INTEGER PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO index_sequence (id, value) VALUES (1, 0) ON CONFLICT DO NOTHING;
+
 -- Document chunks (for embedding / vector indexing)
 CREATE TABLE IF NOT EXISTS document_chunks (
     id SERIAL PRIMARY KEY,
@@ -127,6 +127,20 @@ export default function Report() {
                                 </div>
                             )}
 
+                            {/* Near-Duplicate Card (LSH estimate, no chunk-level search) */}
+                            {scan.report?.near_duplicate_of && (
+                                <div className="bg-gradient-to-br from-red-50 to-orange-50 rounded-2xl p-8 mb-6 border-2 border-red-200">
+                                    <p className="text-sm font-medium text-gray-600 mb-2">Near-Duplicate Document</p>
+                                    <p className="text-2xl font-bold text-red-700">
+                                        Copy of Document ID {scan.report.near_duplicate_of.source_doc_id}
+                                    </p>
+                                    <p className="text-sm text-gray-600 mt-2">
+                                        Estimated similarity: {(scan.report.near_duplicate_of.estimated_similarity * 100).toFixed(1)}%
+                                        (MinHash estimate, no chunk-by-chunk search was run)
+                                    </p>
+                                </div>
+                            )}
+
                             <div className="mb-6">
                                 <h2 className="text-xl font-semibold mb-4 text-gray-800">Summary</h2>
                                 <div className="grid grid-cols-2 gap-4">
@@ -136,7 +150,7 @@ export default function Report() {
                                     </div>
                                     <div className="bg-gradient-to-br from-red-50 to-pink-50 p-6 rounded-xl border border-red-200">
                                         <p className="text-sm text-gray-600 mb-1">Matched Chunks</p>
-                                        <p className="text-3xl font-bold text-red-600">{scan.report?.matched_chunks || 0}</p>
+                                        <p className="text-3xl font-bold text-red-600">{scan.report?.score_estimated ? 'n/a' : (scan.report?.matched_chunks || 0)}</p>
                                     </div>
                                 </div>
                             </div>